@@ -0,0 +1,182 @@
+# ai_executor.py
+#
+# Runs the CPU-bound AI pipeline off the asyncio event loop:
+#   predict_alerts → compute_indices → build_recommendations → evaluate_light
+#
+# Usage (FastAPI / demo):
+#   await start_ai_executor()
+#   result = await evaluate_reading(sensor, profile, hour)
+#   await stop_ai_executor()
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from inference import predict_alerts, predict_alerts_for_form, get_model_registry
+from indices import compute_indices
+from recommendation import build_recommendations
+from smart_light import evaluate_light
+
+
+AI_EXECUTOR_WORKERS = int(os.getenv("AI_EXECUTOR_WORKERS", "2"))
+AI_EXECUTOR_MAX_PENDING = int(os.getenv("AI_EXECUTOR_MAX_PENDING", "256"))
+AI_EXECUTOR_QUEUE_TIMEOUT = float(os.getenv("AI_EXECUTOR_QUEUE_TIMEOUT", "5"))
+
+
+class AIExecutorBusy(RuntimeError):
+    """
+    Raised when the bounded queue stays full longer than queue_timeout.
+    """
+
+
+def evaluate_reading_sync(
+    sensor: Dict,
+    profile: Dict,
+    hour: Optional[int] = None,
+    user_intent: Optional[str] = None,
+    follow_routine: bool = True,
+    form_id: Optional[str] = None,
+) -> Dict:
+    """
+    The whole per-reading AI evaluation (runs inside a worker thread).
+    form_id, when given, reuses that form's cached profile features.
+    """
+    if form_id is not None:
+        flags = predict_alerts_for_form(form_id, sensor, profile)
+    else:
+        flags = predict_alerts(sensor, profile)
+
+    indices = compute_indices(sensor, profile)
+    recommendations = build_recommendations(flags, indices, sensor, profile)
+
+    light_action = evaluate_light(
+        sensor,
+        profile,
+        flags,
+        hour=hour,
+        user_intent=user_intent,
+        follow_routine=follow_routine,
+    )
+
+    return {
+        "flags": flags,
+        "indices": indices,
+        "recommendations": recommendations,
+        "light_action": light_action,
+    }
+
+
+class AIEvaluationExecutor:
+    """
+    Thread pool + bounded number of in-flight evaluations.
+
+    Threads (not processes): the compiled trees and index math are tiny,
+    so pickling sensor/profile dicts to another process would cost more
+    than the work itself. The bound keeps a burst of readings from queueing
+    unlimited work (and memory) behind the pool.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = AI_EXECUTOR_WORKERS,
+        max_pending: int = AI_EXECUTOR_MAX_PENDING,
+        queue_timeout: float = AI_EXECUTOR_QUEUE_TIMEOUT,
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+
+    async def start(self) -> None:
+        if self._pool is not None:
+            return
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ai-eval")
+
+        # load (and compile) the model in a worker, not on the loop
+        registry = get_model_registry()
+        try:
+            await asyncio.get_running_loop().run_in_executor(pool, registry.get)
+        except BaseException:
+            # a failed load leaves the executor stopped, not half started
+            pool.shutdown(wait=False)
+            raise
+
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._pool = pool
+        registry.start_watcher()
+
+        print(f"🧠 AI executor started ({self.max_workers} workers, max {self.max_pending} pending)")
+
+    async def stop(self) -> None:
+        if self._pool is None:
+            return
+
+        pool = self._pool
+        self._pool = None
+        get_model_registry().stop_watcher()
+
+        # let in-flight evaluations finish without blocking the loop
+        await asyncio.get_running_loop().run_in_executor(None, pool.shutdown, True)
+        print("🧠 AI executor stopped")
+
+    async def evaluate_reading(
+        self,
+        sensor: Dict,
+        profile: Dict,
+        hour: Optional[int] = None,
+        *,
+        user_intent: Optional[str] = None,
+        follow_routine: bool = True,
+        form_id: Optional[str] = None,
+    ) -> Dict:
+        if self._pool is None:
+            raise RuntimeError("AI executor is not running. Call start() first.")
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise AIExecutorBusy(f"AI executor queue full ({self.max_pending} pending)")
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._pool,
+                lambda: evaluate_reading_sync(
+                    sensor,
+                    profile,
+                    hour,
+                    user_intent=user_intent,
+                    follow_routine=follow_routine,
+                    form_id=form_id,
+                ),
+            )
+        finally:
+            self.pending -= 1
+            self._slots.release()
+
+
+# -----------------------------
+# Process-wide executor
+# -----------------------------
+AI_EXECUTOR = AIEvaluationExecutor()
+
+
+async def start_ai_executor() -> None:
+    await AI_EXECUTOR.start()
+
+
+async def stop_ai_executor() -> None:
+    await AI_EXECUTOR.stop()
+
+
+async def evaluate_reading(sensor: Dict, profile: Dict, hour: Optional[int] = None, **kwargs) -> Dict:
+    return await AI_EXECUTOR.evaluate_reading(sensor, profile, hour, **kwargs)
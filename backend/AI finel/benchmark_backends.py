@@ -0,0 +1,117 @@
+# benchmark_backends.py
+#
+# CPU latency / throughput comparison of the alert-model backends:
+#   sklearn  (joblib + pandas row)
+#   compiled (tree_compiler)
+#   onnx     (onnxruntime)
+#
+# Example:
+#   python benchmark_backends.py --rows 20000 --single 2000
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from inference import INFERENCE_BACKENDS, build_model_registry, build_feature_matrix, pairs_to_columns
+from synthetic_data import generate_dataset
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def _sample_pairs(X, n: int):
+    """
+    Rebuild (sensor, profile) dicts from synthetic feature rows.
+    """
+    pairs = []
+    for row in X.head(n).to_dict(orient="records"):
+        sensor = {k: row[k] for k in ["blink_rate_bpm", "blue_lux", "focus_minutes", "ambient_lux", "humidity", "temperature"]}
+        profile = {k: row[k] for k in [
+            "min_safe_blink_bpm", "max_safe_blue", "max_safe_focus_min",
+            "has_eye_surgery", "has_dry_eye_condition", "wears_protective_glasses",
+        ]}
+        pairs.append((sensor, profile))
+    return pairs
+
+
+def _predict_single(snapshot, sensor, profile):
+    if snapshot.runtime is not None:
+        return snapshot.runtime.predict_alerts(sensor, profile)
+
+    from inference import build_feature_row
+    X = build_feature_row(sensor, profile, snapshot.meta["feature_columns"])
+    return snapshot.model.predict(X)[0]
+
+
+def _predict_matrix(snapshot, X):
+    if snapshot.runtime is not None:
+        return snapshot.runtime.predict_matrix(X)
+
+    import pandas as pd
+    return snapshot.model.predict(pd.DataFrame(X, columns=snapshot.meta["feature_columns"], copy=False))
+
+
+def bench_backend(backend: str, pairs, X_matrix) -> dict:
+    registry = build_model_registry(backend)
+
+    t0 = time.perf_counter()
+    snapshot = registry.get()
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    # warm-up
+    _predict_single(snapshot, *pairs[0])
+
+    latencies = []
+    for sensor, profile in pairs:
+        t0 = time.perf_counter()
+        _predict_single(snapshot, sensor, profile)
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    _predict_matrix(snapshot, X_matrix)
+    batch_s = time.perf_counter() - t0
+
+    lat_us = np.array(latencies) * 1e6
+    return {
+        "backend": backend,
+        "load_ms": load_ms,
+        "p50_us": float(np.percentile(lat_us, 50)),
+        "p99_us": float(np.percentile(lat_us, 99)),
+        "batch_rows_per_s": X_matrix.shape[0] / max(batch_s, 1e-9),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare alert-model inference backends")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows for the batch throughput test")
+    parser.add_argument("--single", type=int, default=2000, help="Readings for the single-row latency test")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=list(INFERENCE_BACKENDS),
+        default=list(INFERENCE_BACKENDS),
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    windows = max(1, args.rows // 50)
+    X, _ = generate_dataset(n_profiles=50, windows_per_profile=windows)
+    pairs = _sample_pairs(X, args.single)
+    X_matrix = build_feature_matrix(pairs_to_columns(_sample_pairs(X, args.rows)), list(X.columns))
+
+    print(f"{'backend':<10} {'load ms':>9} {'p50 us':>9} {'p99 us':>9} {'batch rows/s':>14}")
+    for backend in args.backends:
+        try:
+            r = bench_backend(backend, pairs, X_matrix)
+        except (ImportError, FileNotFoundError) as e:
+            print(f"{backend:<10} skipped: {e}")
+            continue
+
+        print(
+            f"{r['backend']:<10} {r['load_ms']:>9.2f} {r['p50_us']:>9.1f} "
+            f"{r['p99_us']:>9.1f} {r['batch_rows_per_s']:>14,.0f}"
+        )
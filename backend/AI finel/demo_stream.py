@@ -29,14 +29,14 @@ from typing import Dict, Generator
 
 from database import db
 
-from inference import predict_alerts
-from indices import compute_indices
-from recommendation import build_recommendations
-from smart_light import evaluate_light, apply_to_smart_light
+from ai_executor import start_ai_executor, stop_ai_executor, evaluate_reading
+from index_stream import INDEX_STREAMS
+from smart_light import apply_to_smart_light
 from notification_manager import NotificationManager
 
 from chart_metrics_controller import create_chart_metric
 from notification_controller import create_notification
+from eye_health_form_controller import get_ai_profile
 
 from led_controller import (
     apply_light_action_to_led,
@@ -372,6 +372,16 @@ async def run_demo(
         print("Stopping demo because linked active device was not found.")
         return
 
+    # Thresholds compiled from the user's eye-health form (persona only simulates sensors)
+    try:
+        profile = await get_ai_profile(device_context["form_id"])
+        print(f"AI profile from form {device_context['form_id']}: {profile}")
+    except Exception as e:
+        print(f"⚠️ Could not load AI profile from form ({e}) → using persona profile")
+
+    # Load the alert model once + run AI evaluation off the event loop
+    await start_ai_executor()
+
     notification_manager = NotificationManager(
         persistence_required=persistence_required,
         cooldown_minutes=cooldown_minutes,
@@ -391,6 +401,9 @@ async def run_demo(
     print(f"Real delay = {delay_seconds} seconds")
     print("=" * 70)
 
+    # Smoothed indices continue from the last stored snapshot
+    await INDEX_STREAMS.load(db.index_snapshots, device_context["deviceId"])
+
     last_led_scene = None
 
     for step, simulated_time, sensor in generate_live_readings(
@@ -399,19 +412,26 @@ async def run_demo(
     ):
         print(f"\n[{step}/{total_readings}] Simulated time: {simulated_time.isoformat()}")
 
-        flags = predict_alerts(sensor, profile)
-        indices = compute_indices(sensor, profile)
-        recommendations = build_recommendations(flags, indices, sensor, profile)
-
-        light_action = evaluate_light(
+        evaluation = await evaluate_reading(
             sensor,
             profile,
-            flags,
-            hour=simulated_time.hour,
+            simulated_time.hour,
             user_intent=None,
             follow_routine=FOLLOW_ROUTINE,
+            form_id=device_context["form_id"],
         )
 
+        flags = evaluation["flags"]
+        raw_indices = evaluation["indices"]
+        recommendations = evaluation["recommendations"]
+        light_action = evaluation["light_action"]
+
+        # One noisy reading should not trigger an alert → use the smoothed indices
+        indices = INDEX_STREAMS.update(device_context["deviceId"], raw_indices, simulated_time)
+
+        if INDEX_STREAMS.should_persist(device_context["deviceId"]):
+            await INDEX_STREAMS.save(db.index_snapshots, device_context["deviceId"])
+
         chart_payload = sensor_to_chart_metric(
             sensor=sensor,
             device_context=device_context,
@@ -457,7 +477,10 @@ async def run_demo(
         print("Indices:")
         for key in ["DEI", "BLI", "EFI"]:
             item = indices[key]
-            print(f"  - {key}: {item['score']}/100 ({item['level']}) ratio={item['ratio']}")
+            print(
+                f"  - {key}: {item['score']}/100 ({item['level']}) ratio={item['ratio']} "
+                f"raw={item['raw_score']} trend={item['trend']:+}/min"
+            )
 
         print("Top recommendations:")
         for rec in recommendations[:3]:
@@ -485,6 +508,8 @@ async def run_demo(
 
         await asyncio.sleep(delay_seconds)
 
+    await INDEX_STREAMS.flush(db.index_snapshots)
+    await stop_ai_executor()
     print("\nDemo finished.")
 
 
@@ -0,0 +1,338 @@
+# index_stream.py
+#
+# Streaming (time-weighted) DEI / BLI / EFI per device.
+#
+# compute_indices() scores one reading, so a single noisy sample can swing
+# an index by a whole level. IndexTracker keeps an EWMA of each index ratio
+# (O(1) state, weighted by the time between readings, not their count) plus
+# a smoothed trend, and returns the same shape as compute_indices():
+#
+#   {"DEI": {"score", "level", "ratio", "raw_score", "trend"}, ...}
+#
+# trend = smoothed score change per minute (+ = getting worse).
+#
+# A compact snapshot per device is stored in MongoDB (index_snapshots)
+# so a restart continues from the last smoothed values.
+#
+# The registry keeps at most INDEX_STREAM_MAX_DEVICES trackers and drops
+# devices idle for INDEX_STREAM_IDLE_TIMEOUT seconds (unsaved state is
+# kept as a snapshot until the next flush(), at most
+# INDEX_STREAM_MAX_EVICTED of them: past that the oldest unsaved state
+# is dropped and the device restarts from its last stored snapshot).
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from indices import _ratio_to_score, _score_level
+
+INDEX_NAMES = ("DEI", "BLI", "EFI")
+
+# Readings older than a few half-lives barely count any more
+DEFAULT_HALF_LIFE_MINUTES = 10.0
+
+# Floor for dt (duplicate / same-second readings still move the average a bit)
+MIN_DT_MINUTES = 1.0 / 60.0
+
+SNAPSHOT_VERSION = 1
+
+INDEX_STREAM_MAX_DEVICES = int(os.getenv("INDEX_STREAM_MAX_DEVICES", "10000"))
+INDEX_STREAM_IDLE_TIMEOUT = float(os.getenv("INDEX_STREAM_IDLE_TIMEOUT", "1800"))  # seconds
+INDEX_STREAM_MAX_EVICTED = int(os.getenv("INDEX_STREAM_MAX_EVICTED", "1000"))
+
+
+def _to_datetime(value) -> datetime:
+    if value is None:
+        return datetime.utcnow()
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+
+
+class IndexTracker:
+    """
+    EWMA state of one device.
+    """
+
+    __slots__ = ("device_id", "half_life_minutes", "_tau", "ratios", "trends", "last_ts", "count")
+
+    def __init__(self, device_id: str, half_life_minutes: float = DEFAULT_HALF_LIFE_MINUTES):
+        self.device_id = device_id
+        self.half_life_minutes = float(half_life_minutes)
+        self._tau = self.half_life_minutes / math.log(2)
+
+        self.ratios: Dict[str, float] = {}
+        self.trends: Dict[str, float] = {}
+        self.last_ts: Optional[datetime] = None
+        self.count = 0
+
+    def update(self, indices: Dict, timestamp=None) -> Dict:
+        """
+        Fold one compute_indices() result into the running state.
+        Out-of-order readings are blended with the minimum weight.
+        """
+        ts = _to_datetime(timestamp)
+
+        if self.last_ts is None or not self.ratios:
+            for name in INDEX_NAMES:
+                self.ratios[name] = float(indices[name]["ratio"])
+                self.trends[name] = 0.0
+            self.last_ts = ts
+            self.count = 1
+            return self.smoothed(indices)
+
+        dt = max((ts - self.last_ts).total_seconds() / 60.0, MIN_DT_MINUTES)
+        alpha = 1.0 - math.exp(-dt / self._tau)
+
+        for name in INDEX_NAMES:
+            prev = self.ratios[name]
+            value = prev + alpha * (float(indices[name]["ratio"]) - prev)
+            slope = (value - prev) / dt
+
+            self.ratios[name] = value
+            self.trends[name] += alpha * (slope - self.trends[name])
+
+        if ts > self.last_ts:
+            self.last_ts = ts
+        self.count += 1
+
+        return self.smoothed(indices)
+
+    def smoothed(self, raw: Optional[Dict] = None) -> Dict:
+        result = {}
+        for name in INDEX_NAMES:
+            ratio = self.ratios.get(name)
+            if ratio is None:
+                continue
+
+            score = _ratio_to_score(ratio)
+            item = {
+                "score": score,
+                "level": _score_level(score),
+                "ratio": round(ratio, 3),
+                "trend": round(self.trends[name] * 50.0, 3),   # same scale as score
+            }
+            if raw is not None:
+                item["raw_score"] = raw[name]["score"]
+            result[name] = item
+        return result
+
+    # -----------------------------
+    # Snapshot (compact, JSON/BSON friendly)
+    # -----------------------------
+    def to_snapshot(self) -> Dict:
+        return {
+            "deviceId": self.device_id,
+            "v": SNAPSHOT_VERSION,
+            "half_life": self.half_life_minutes,
+            "ts": self.last_ts,
+            "n": self.count,
+            "state": {name: [self.ratios[name], self.trends[name]] for name in self.ratios},
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict, half_life_minutes: Optional[float] = None) -> "IndexTracker":
+        tracker = cls(
+            snapshot["deviceId"],
+            half_life_minutes if half_life_minutes is not None else snapshot.get("half_life", DEFAULT_HALF_LIFE_MINUTES),
+        )
+        if snapshot.get("v") != SNAPSHOT_VERSION:
+            return tracker   # unknown layout → cold start
+
+        for name, (ratio, trend) in snapshot.get("state", {}).items():
+            if name in INDEX_NAMES:
+                tracker.ratios[name] = float(ratio)
+                tracker.trends[name] = float(trend)
+
+        tracker.last_ts = _to_datetime(snapshot["ts"]) if snapshot.get("ts") is not None else None
+        tracker.count = int(snapshot.get("n", 0))
+        return tracker
+
+
+# -----------------------------
+# Per-device trackers
+# -----------------------------
+class IndexStreamRegistry:
+    """
+    device_id → IndexTracker, with write-back of changed snapshots.
+
+    Snapshots are saved every `persist_every` updates (and on flush()),
+    not per reading. Trackers are evicted LRU / when idle, after an
+    update (never while one is being folded in).
+    """
+
+    def __init__(
+        self,
+        half_life_minutes: float = DEFAULT_HALF_LIFE_MINUTES,
+        persist_every: int = 10,
+        max_devices: int = INDEX_STREAM_MAX_DEVICES,
+        idle_timeout: float = INDEX_STREAM_IDLE_TIMEOUT,
+        max_evicted: int = INDEX_STREAM_MAX_EVICTED,
+        clock=time.monotonic,
+    ):
+        self.half_life_minutes = half_life_minutes
+        self.persist_every = persist_every
+        self.max_devices = max_devices
+        self.idle_timeout = idle_timeout
+        self.max_evicted = max_evicted
+        self.clock = clock
+        self.dropped = 0    # unsaved snapshots dropped over max_evicted
+
+        self._trackers: "OrderedDict[str, IndexTracker]" = OrderedDict()   # LRU order
+        self._last_used: Dict[str, float] = {}
+        self._dirty: Dict[str, int] = {}
+        self._evicted: "OrderedDict[str, Dict]" = OrderedDict()    # deviceId -> unsaved snapshot (oldest first)
+        self._lock = threading.Lock()
+
+    def _get_locked(self, device_id: str) -> IndexTracker:
+        tracker = self._trackers.get(device_id)
+        if tracker is None:
+            # evicted before it was saved → continue from that state
+            pending = self._evicted.pop(device_id, None)
+            if pending is not None:
+                tracker = IndexTracker.from_snapshot(pending, self.half_life_minutes)
+                self._dirty[device_id] = self.persist_every
+            else:
+                tracker = IndexTracker(device_id, self.half_life_minutes)
+            self._trackers[device_id] = tracker
+        else:
+            self._trackers.move_to_end(device_id)
+        self._last_used[device_id] = self.clock()
+        return tracker
+
+    def get(self, device_id: str) -> IndexTracker:
+        with self._lock:
+            return self._get_locked(device_id)
+
+    def update(self, device_id: str, indices: Dict, timestamp=None) -> Dict:
+        with self._lock:
+            tracker = self._get_locked(device_id)
+            smoothed = tracker.update(indices, timestamp)
+            self._dirty[device_id] = self._dirty.get(device_id, 0) + 1
+            self._evict_locked()
+        return smoothed
+
+    def should_persist(self, device_id: str) -> bool:
+        return self._dirty.get(device_id, 0) >= self.persist_every
+
+    def drop(self, device_id: str) -> None:
+        with self._lock:
+            self._trackers.pop(device_id, None)
+            self._last_used.pop(device_id, None)
+            self._dirty.pop(device_id, None)
+            self._evicted.pop(device_id, None)
+
+    # -----------------------------
+    # Eviction (LRU bound + idle devices)
+    # -----------------------------
+    def _evict_one_locked(self, device_id: str) -> None:
+        tracker = self._trackers.pop(device_id)
+        self._last_used.pop(device_id, None)
+        if self._dirty.pop(device_id, None) and tracker.last_ts is not None:
+            self._evicted[device_id] = tracker.to_snapshot()
+            while len(self._evicted) > self.max_evicted:
+                self._evicted.popitem(last=False)
+                self.dropped += 1
+
+    def _evict_locked(self) -> None:
+        while len(self._trackers) > self.max_devices:
+            self._evict_one_locked(next(iter(self._trackers)))
+
+        if self.idle_timeout <= 0:
+            return
+        deadline = self.clock() - self.idle_timeout
+        # LRU order → the idle ones are at the front
+        while self._trackers:
+            oldest = next(iter(self._trackers))
+            if self._last_used[oldest] > deadline:
+                break
+            self._evict_one_locked(oldest)
+
+    def sweep(self) -> int:
+        """
+        Evict idle devices now. Returns how many trackers were dropped.
+        """
+        with self._lock:
+            before = len(self._trackers)
+            self._evict_locked()
+            return before - len(self._trackers)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._trackers
+
+    def __len__(self) -> int:
+        return len(self._trackers)
+
+    # -----------------------------
+    # MongoDB persistence (collection = db.index_snapshots)
+    # -----------------------------
+    async def load(self, collection, device_id: str) -> IndexTracker:
+        """
+        Restore a device from its stored snapshot (no-op if already in memory).
+        """
+        with self._lock:
+            if device_id in self._trackers or device_id in self._evicted:
+                return self._get_locked(device_id)
+
+        doc = await collection.find_one({"deviceId": device_id})
+        tracker = (
+            IndexTracker.from_snapshot(doc, self.half_life_minutes)
+            if doc else IndexTracker(device_id, self.half_life_minutes)
+        )
+
+        with self._lock:
+            if device_id not in self._trackers:
+                self._trackers[device_id] = tracker
+            return self._get_locked(device_id)
+
+    async def save(self, collection, device_id: str) -> None:
+        with self._lock:
+            tracker = self._trackers.get(device_id)
+            if tracker is not None:
+                if tracker.last_ts is None:
+                    return
+                snapshot = tracker.to_snapshot()
+                saved = self._dirty.get(device_id, 0)
+            else:
+                snapshot = self._evicted.get(device_id)
+                if snapshot is None:
+                    return
+
+        # a failed write leaves the device dirty / its snapshot pending
+        await collection.replace_one({"deviceId": device_id}, snapshot, upsert=True)
+
+        with self._lock:
+            if tracker is None:
+                if self._evicted.get(device_id) is snapshot:
+                    del self._evicted[device_id]
+            elif device_id in self._dirty:
+                # updates folded in during the write stay counted
+                left = self._dirty[device_id] - saved
+                if left > 0:
+                    self._dirty[device_id] = left
+                else:
+                    del self._dirty[device_id]
+
+    async def flush(self, collection) -> int:
+        """
+        Save every device changed since its last save (evicted ones
+        included). Returns how many.
+        """
+        with self._lock:
+            dirty = list(self._dirty) + list(self._evicted)
+
+        for device_id in dirty:
+            await self.save(collection, device_id)
+        return len(dirty)
+
+
+# -----------------------------
+# Process-wide registry
+# -----------------------------
+INDEX_STREAMS = IndexStreamRegistry()
@@ -1,6 +1,8 @@
 # indices.py
 from typing import Dict
 
+import numpy as np
+
 def _clamp(x: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, x))
 
@@ -93,42 +95,124 @@ def compute_indices(sensor: Dict, profile: Dict) -> Dict:
             "ratio": round(efi_ratio, 3),
         },
     }
+
+
+# -----------------------------
+# Vectorized version (N readings)
+# -----------------------------
+LEVELS = np.array(["LOW", "MODERATE", "HIGH", "VERY_HIGH"])
+
+
+def _round3(x: np.ndarray) -> np.ndarray:
     """
-    Returns dict:
-      {
-        "DEI": {"score": int, "level": str, "ratio": float},
-        "BLI": {"score": int, "level": str, "ratio": float},
-        "EFI": {"score": int, "level": str, "ratio": float},
-      }
+    Same result as Python round(x, 3) element-wise.
+    np.round scales by 1000 first, which can disagree on values that sit
+    on a .0005 boundary, so only those few are redone with round().
     """
-    blink = float(sensor["blink_rate_bpm"])
-    blue  = float(sensor["blue_lux"])
-    focus = float(sensor["focus_minutes"])
+    out = np.round(x, 3)
+    scaled = x * 1000.0
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        out[near_tie] = [round(v, 3) for v in x[near_tie].tolist()]
+    return out
 
-    min_blink = float(profile["min_safe_blink_bpm"])
-    max_blue  = float(profile["max_safe_blue"])
-    max_focus = float(profile["max_safe_focus_min"])
 
-    # Ratios (personalized)
-    # DEI: higher ratio means blink is lower than safe → dryness risk higher
-    dei_ratio = min_blink / max(blink, 0.1)
+def _ratio_to_score_batch(ratio: np.ndarray) -> np.ndarray:
+    # np.rint rounds half to even, like Python round()
+    return np.rint(np.clip(ratio * 50.0, 0.0, 100.0)).astype(np.int64)
 
-    # Optional: dry-eye condition increases sensitivity slightly
-    if int(profile.get("has_dry_eye_condition", 0)) == 1:
-        dei_ratio *= 1.10
 
-    # BLI: higher ratio means blue exposure above safe limit
-    bli_ratio = blue / max(max_blue, 0.1)
+def _score_level_batch(score: np.ndarray) -> np.ndarray:
+    return LEVELS[(score >= 40).astype(np.int64) + (score >= 60) + (score >= 80)]
 
-    # EFI: higher ratio means continuous focus above safe limit
-    efi_ratio = focus / max(max_focus, 0.1)
 
-    dei_score = _ratio_to_score(dei_ratio)
-    bli_score = _ratio_to_score(bli_ratio)
-    efi_score = _ratio_to_score(efi_ratio)
+def _pairs_to_index_columns(pairs) -> Dict:
+    columns = {k: [] for k in [
+        "blink_rate_bpm", "blue_lux", "focus_minutes", "humidity", "temperature",
+        "min_safe_blink_bpm", "max_safe_blue", "max_safe_focus_min",
+        "has_dry_eye_condition", "has_eye_surgery",
+    ]}
 
-    return {
-        "DEI": {"score": dei_score, "level": _score_level(dei_score), "ratio": round(dei_ratio, 3)},
-        "BLI": {"score": bli_score, "level": _score_level(bli_score), "ratio": round(bli_ratio, 3)},
-        "EFI": {"score": efi_score, "level": _score_level(efi_score), "ratio": round(efi_ratio, 3)},
-    }
\ No newline at end of file
+    for sensor, profile in pairs:
+        columns["blink_rate_bpm"].append(sensor["blink_rate_bpm"])
+        columns["blue_lux"].append(sensor["blue_lux"])
+        columns["focus_minutes"].append(sensor["focus_minutes"])
+        columns["humidity"].append(sensor.get("humidity", 45))
+        columns["temperature"].append(sensor.get("temperature", 24))
+        columns["min_safe_blink_bpm"].append(profile["min_safe_blink_bpm"])
+        columns["max_safe_blue"].append(profile["max_safe_blue"])
+        columns["max_safe_focus_min"].append(profile["max_safe_focus_min"])
+        columns["has_dry_eye_condition"].append(profile.get("has_dry_eye_condition", 0))
+        columns["has_eye_surgery"].append(profile.get("has_eye_surgery", 0))
+
+    return columns
+
+
+def compute_indices_batch(data) -> Dict:
+    """
+    compute_indices for N readings at once (NumPy masks, no Python branches).
+
+    data: list of (sensor, profile) pairs, or a dict of column arrays with the
+          sensor/profile keys (humidity, temperature, has_* are optional;
+          profile values may be scalars).
+
+    Returns the same structure as compute_indices, with arrays:
+      {"DEI": {"score": int[], "level": str[], "ratio": float[]}, "BLI": ..., "EFI": ...}
+    Element i is identical to compute_indices(sensor_i, profile_i).
+    """
+    columns = data if isinstance(data, dict) else _pairs_to_index_columns(data)
+
+    def col(name, default=None):
+        if name not in columns:
+            return np.float64(default)
+        return np.asarray(columns[name], dtype=np.float64)
+
+    blink = col("blink_rate_bpm")
+    blue = col("blue_lux")
+    focus = col("focus_minutes")
+    humidity = col("humidity", 45)
+    temperature = col("temperature", 24)
+
+    min_blink = col("min_safe_blink_bpm")
+    max_blue = col("max_safe_blue")
+    max_focus = col("max_safe_focus_min")
+
+    n = np.broadcast(blink, blue, focus, humidity, temperature, min_blink, max_blue, max_focus).shape
+
+    # Base ratios
+    dei_ratio = np.broadcast_to(min_blink / np.maximum(blink, 0.1), n).astype(np.float64)
+    bli_ratio = np.broadcast_to(blue / np.maximum(max_blue, 0.1), n).astype(np.float64)
+    efi_ratio = np.broadcast_to(focus / np.maximum(max_focus, 0.1), n).astype(np.float64)
+
+    # Research-inspired DEI modifiers (same thresholds as compute_indices)
+    humidity_factor = np.select(
+        [humidity < 20, humidity < 30, humidity < 40],
+        [1.30, 1.20, 1.10],
+        default=1.0,
+    )
+    temperature_factor = np.select(
+        [temperature > 30, temperature > 27],
+        [1.12, 1.07],
+        default=1.0,
+    )
+    combo_factor = np.where((humidity < 30) & (temperature > 28), 1.05, 1.0)
+
+    dry_eye = np.asarray(columns.get("has_dry_eye_condition", 0), dtype=np.float64).astype(np.int64) == 1
+    surgery = np.asarray(columns.get("has_eye_surgery", 0), dtype=np.float64).astype(np.int64) == 1
+    dry_eye_factor = np.where(dry_eye, 1.10, 1.0)
+    surgery_factor = np.where(surgery, 1.05, 1.0)
+
+    # same multiplication order as the scalar version → bit-identical ratios
+    dei_ratio = dei_ratio * (humidity_factor * temperature_factor * combo_factor * dry_eye_factor * surgery_factor)
+    dei_ratio = np.broadcast_to(dei_ratio, n)
+
+    result = {}
+    for name, ratio in [("DEI", dei_ratio), ("BLI", bli_ratio), ("EFI", efi_ratio)]:
+        score = _ratio_to_score_batch(ratio)
+        result[name] = {
+            "score": score,
+            "level": _score_level_batch(score),
+            "ratio": _round3(np.array(ratio, dtype=np.float64)),
+        }
+
+    return result
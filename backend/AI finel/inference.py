@@ -1,14 +1,30 @@
 import os
 import json
 import joblib
+import numpy as np
 import pandas as pd
 
+from model_registry import ModelRegistry
+from tree_compiler import compile_model
+from onnx_backend import OnnxAlertModel
+from profile_features import SENSOR_COLUMNS, PROFILE_COLUMNS, PROFILE_FEATURE_CACHE
+
 # -----------------------------
 # Paths (robust)
 # -----------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "models", "dt_alerts.joblib")
 META_PATH = os.path.join(BASE_DIR, "models", "dt_alerts_meta.json")
+ONNX_PATH = os.path.join(BASE_DIR, "models", "dt_alerts.onnx")
+
+# -----------------------------
+# Inference backend (config)
+# -----------------------------
+#   compiled → joblib trees compiled to Python/NumPy (default)
+#   sklearn  → joblib model.predict (reference)
+#   onnx     → models/dt_alerts.onnx via onnxruntime (pickle-free)
+INFERENCE_BACKENDS = ("compiled", "sklearn", "onnx")
+INFERENCE_BACKEND = os.getenv("AI_INFERENCE_BACKEND", "compiled").lower()
 
 
 def load_model():
@@ -24,6 +40,47 @@ def load_model():
     return model, meta
 
 
+def load_onnx_model():
+    if not os.path.exists(ONNX_PATH) or not os.path.exists(META_PATH):
+        raise FileNotFoundError(
+            "ONNX model not found. Please run: python train_model.py\n"
+            f"Expected:\n- {ONNX_PATH}\n- {META_PATH}"
+        )
+
+    with open(META_PATH, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    model = OnnxAlertModel(ONNX_PATH, meta["feature_columns"], meta["label_columns"])
+    return model, meta
+
+
+# -----------------------------
+# Process-wide model cache
+# -----------------------------
+# load_model() unpickles from disk; the registry calls it once and
+# then serves the same (model, meta) until the files change.
+# compile_model() turns the trees into plain Python/NumPy (snapshot.runtime),
+# so the live path skips sklearn + pandas validation entirely.
+def build_model_registry(backend: str = INFERENCE_BACKEND) -> ModelRegistry:
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from: {list(INFERENCE_BACKENDS)}")
+
+    if backend == "onnx":
+        # OnnxAlertModel is already the fast predictor
+        return ModelRegistry([ONNX_PATH, META_PATH], load_onnx_model, prepare=lambda model, meta: model)
+
+    if backend == "sklearn":
+        return ModelRegistry([MODEL_PATH, META_PATH], load_model)
+
+    return ModelRegistry([MODEL_PATH, META_PATH], load_model, prepare=compile_model)
+
+
+MODEL_REGISTRY = build_model_registry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return MODEL_REGISTRY
+
+
 def build_feature_row(sensor: dict, profile: dict, feature_columns: list) -> pd.DataFrame:
     """
     Build one-row X with the exact same columns used in training.
@@ -33,18 +90,11 @@ def build_feature_row(sensor: dict, profile: dict, feature_columns: list) -> pd.
     row = {}
 
     # sensors
-    for k in ["blink_rate_bpm", "blue_lux", "focus_minutes", "ambient_lux", "humidity", "temperature"]:
+    for k in SENSOR_COLUMNS:
         row[k] = sensor[k]
 
     # profile thresholds + flags
-    for k in [
-        "min_safe_blink_bpm",
-        "max_safe_blue",
-        "max_safe_focus_min",
-        "has_eye_surgery",
-        "has_dry_eye_condition",
-        "wears_protective_glasses",
-    ]:
+    for k in PROFILE_COLUMNS:
         row[k] = profile[k]
 
     # engineered deltas (must match training!)
@@ -59,12 +109,101 @@ def build_feature_row(sensor: dict, profile: dict, feature_columns: list) -> pd.
 
 
 def predict_alerts(sensor: dict, profile: dict) -> dict:
-    model, meta = load_model()
+    snapshot = MODEL_REGISTRY.get()
+    if snapshot.runtime is not None:
+        return snapshot.runtime.predict_alerts(sensor, profile)
+
+    model, meta = snapshot.model, snapshot.meta
     X = build_feature_row(sensor, profile, meta["feature_columns"])
     pred = model.predict(X)[0]  # e.g. [1,0,1]
     return {name: int(pred[i]) for i, name in enumerate(meta["label_columns"])}
 
 
+def predict_alerts_for_form(form_id, sensor: dict, profile: dict) -> dict:
+    """
+    Same as predict_alerts, but reuses the cached profile half of the
+    feature row for this form (see profile_features.py).
+    """
+    snapshot = MODEL_REGISTRY.get()
+    runtime = snapshot.runtime
+
+    if runtime is None or not hasattr(runtime, "predict_row"):
+        return predict_alerts(sensor, profile)
+
+    meta = snapshot.meta
+    block = PROFILE_FEATURE_CACHE.get(form_id, profile, meta["feature_columns"])
+    pred = runtime.predict_row(block.fill(sensor))
+    return {name: int(pred[i]) for i, name in enumerate(meta["label_columns"])}
+
+
+# -----------------------------
+# Batch inference
+# -----------------------------
+def pairs_to_columns(pairs) -> dict:
+    """
+    [(sensor, profile), ...] -> {column: [values...]} for build_feature_matrix.
+    """
+    columns = {k: [] for k in SENSOR_COLUMNS + PROFILE_COLUMNS}
+
+    for sensor, profile in pairs:
+        for k in SENSOR_COLUMNS:
+            columns[k].append(sensor[k])
+        for k in PROFILE_COLUMNS:
+            columns[k].append(profile[k])
+
+    return columns
+
+
+def build_feature_matrix(columns: dict, feature_columns: list) -> np.ndarray:
+    """
+    Build one contiguous float64 X (n_rows x n_features) in feature_columns order.
+
+    columns: {name: array-like} for every SENSOR_COLUMNS + PROFILE_COLUMNS key.
+             Profile values may also be scalars (one user over many readings).
+    """
+    values = {k: np.asarray(columns[k], dtype=np.float64) for k in SENSOR_COLUMNS + PROFILE_COLUMNS}
+
+    n_rows = max((v.shape[0] for v in values.values() if v.ndim == 1), default=1)
+
+    # engineered deltas (must match training!)
+    values["blink_deficit"] = values["min_safe_blink_bpm"] - values["blink_rate_bpm"]
+    values["blue_excess"] = values["blue_lux"] - values["max_safe_blue"]
+    values["focus_excess"] = values["focus_minutes"] - values["max_safe_focus_min"]
+
+    X = np.empty((n_rows, len(feature_columns)), dtype=np.float64)
+    for j, name in enumerate(feature_columns):
+        X[:, j] = values[name]
+
+    return X
+
+
+def predict_alerts_batch(data) -> dict:
+    """
+    Predict FR18–FR20 flags for many readings with one model.predict call.
+
+    data: list of (sensor, profile) pairs, or a dict of column arrays
+          (same keys as the sensor/profile dicts).
+
+    Returns {label: np.ndarray[int]} with one entry per input row.
+    """
+    snapshot = MODEL_REGISTRY.get()
+    model, meta = snapshot.model, snapshot.meta
+
+    columns = data if isinstance(data, dict) else pairs_to_columns(data)
+    X = build_feature_matrix(columns, meta["feature_columns"])
+
+    if X.shape[0] == 0:
+        return {name: np.empty(0, dtype=int) for name in meta["label_columns"]}
+
+    if snapshot.runtime is not None:
+        return snapshot.runtime.predict_matrix(X)
+
+    # wrap without copying so sklearn sees the training feature names
+    pred = model.predict(pd.DataFrame(X, columns=meta["feature_columns"], copy=False))
+
+    return {name: pred[:, i].astype(int) for i, name in enumerate(meta["label_columns"])}
+
+
 def main():
     from indices import compute_indices
     from recommendation import build_recommendations
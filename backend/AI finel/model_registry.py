@@ -0,0 +1,182 @@
+# model_registry.py
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+# -----------------------------
+# One loaded version of the model artifacts
+# -----------------------------
+@dataclass(frozen=True)
+class ModelSnapshot:
+    model: Any
+    meta: Dict
+    stat_key: Tuple            # (mtime_ns, size) per file, cheap change check
+    content_hash: str          # sha256 over all files, confirms a real change
+    loaded_at: float
+    runtime: Any = None        # optional fast predictor built from model + meta
+
+
+def _stat_key(paths) -> Tuple:
+    key = []
+    for path in paths:
+        st = os.stat(path)
+        key.append((st.st_mtime_ns, st.st_size))
+    return tuple(key)
+
+
+def _content_hash(paths) -> str:
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Keeps the alert model + meta in memory, once per process.
+
+    - get() never touches the disk after the first load.
+    - refresh_if_changed() compares mtime/size first, then the content hash,
+      and swaps the whole snapshot in one assignment (readers never see
+      a new model with old meta).
+    - start_watcher() runs refresh_if_changed() in a daemon thread, so the
+      unpickle never happens on the asyncio event loop.
+    - prepare(model, meta), if given, builds snapshot.runtime at load time
+      (e.g. compiled trees); a failing prepare leaves runtime = None.
+    """
+
+    def __init__(
+        self,
+        paths,
+        loader: Callable[[], Tuple[Any, Dict]],
+        prepare: Optional[Callable[[Any, Dict], Any]] = None,
+    ):
+        self.paths = list(paths)
+        self.loader = loader
+        self.prepare = prepare
+
+        self._snapshot: Optional[ModelSnapshot] = None
+        self._load_lock = threading.Lock()
+
+        self._watch_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ----------------------------------------------------
+    # Loading
+    # ----------------------------------------------------
+    def _load_snapshot(self) -> ModelSnapshot:
+        stat_key = _stat_key(self.paths)
+        content_hash = _content_hash(self.paths)
+        model, meta = self.loader()
+
+        runtime = None
+        if self.prepare is not None:
+            try:
+                runtime = self.prepare(model, meta)
+            except Exception as e:
+                print(f"[ModelRegistry] prepare failed, falling back to raw model: {e}")
+
+        return ModelSnapshot(
+            model=model,
+            meta=meta,
+            stat_key=stat_key,
+            content_hash=content_hash,
+            loaded_at=time.time(),
+            runtime=runtime,
+        )
+
+    def get(self) -> ModelSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self._load_lock:
+            if self._snapshot is None:
+                self._snapshot = self._load_snapshot()
+            return self._snapshot
+
+    def refresh_if_changed(self) -> bool:
+        """
+        Returns True when a new snapshot was swapped in.
+        """
+        current = self._snapshot
+        if current is None:
+            self.get()
+            return True
+
+        try:
+            stat_key = _stat_key(self.paths)
+        except FileNotFoundError:
+            # train_model.py may be rewriting the files, keep serving the old model
+            return False
+
+        if stat_key == current.stat_key:
+            return False
+
+        with self._load_lock:
+            current = self._snapshot
+
+            try:
+                content_hash = _content_hash(self.paths)
+            except FileNotFoundError:
+                return False
+
+            if content_hash == current.content_hash:
+                # touched but not changed → remember the new stat so we stop hashing
+                self._snapshot = ModelSnapshot(
+                    model=current.model,
+                    meta=current.meta,
+                    stat_key=stat_key,
+                    content_hash=content_hash,
+                    loaded_at=current.loaded_at,
+                    runtime=current.runtime,
+                )
+                return False
+
+            try:
+                new_snapshot = self._load_snapshot()
+            except Exception as e:
+                print(f"[ModelRegistry] Reload failed, keeping current model: {e}")
+                return False
+
+            self._snapshot = new_snapshot
+
+        print(f"[ModelRegistry] Model reloaded (sha256={new_snapshot.content_hash[:12]})")
+        return True
+
+    # ----------------------------------------------------
+    # Background hot-reload
+    # ----------------------------------------------------
+    def start_watcher(self, interval_seconds: float = 5.0) -> None:
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+
+        self._stop_event.clear()
+
+        def _run():
+            while not self._stop_event.wait(interval_seconds):
+                try:
+                    self.refresh_if_changed()
+                except Exception as e:
+                    print(f"[ModelRegistry] Watcher error: {e}")
+
+        self._watch_thread = threading.Thread(
+            target=_run,
+            name="model-registry-watcher",
+            daemon=True,
+        )
+        self._watch_thread.start()
+
+    def stop_watcher(self) -> None:
+        self._stop_event.set()
+
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout=1.0)
+            self._watch_thread = None
@@ -0,0 +1,97 @@
+# onnx_backend.py
+#
+# Pickle-free alert model:
+#   - export_onnx()      → used by train_model.py (needs skl2onnx)
+#   - OnnxAlertModel     → onnxruntime predictor (needs onnxruntime)
+#
+# OnnxAlertModel has the same predict_alerts / predict_matrix interface
+# as tree_compiler.CompiledAlertModel, so inference.py can swap them.
+
+from typing import Dict, List
+
+import numpy as np
+
+from tree_compiler import feature_row_from_dicts
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+ONNX_INPUT_NAME = "input"
+ONNX_LABEL_OUTPUT = "label"
+
+
+def _require_onnxruntime():
+    if ort is None:
+        raise ImportError(
+            "onnxruntime is not installed. Run this command:\n"
+            "pip install onnxruntime"
+        )
+
+
+# -----------------------------
+# Export (training time)
+# -----------------------------
+def export_onnx(model, n_features: int, path: str, target_opset: int = 17) -> None:
+    try:
+        from skl2onnx import to_onnx
+        from skl2onnx.common.data_types import FloatTensorType
+    except ImportError:
+        raise ImportError(
+            "skl2onnx is not installed. Run this command:\n"
+            "pip install skl2onnx"
+        )
+
+    onx = to_onnx(
+        model,
+        initial_types=[(ONNX_INPUT_NAME, FloatTensorType([None, n_features]))],
+        options={id(model): {"zipmap": False}},   # plain label tensor, no dict output
+        target_opset=target_opset,
+    )
+
+    with open(path, "wb") as f:
+        f.write(onx.SerializeToString())
+
+
+# -----------------------------
+# Inference (runtime)
+# -----------------------------
+class OnnxAlertModel:
+    """
+    onnxruntime session over the exported tree model.
+
+    One session per process is enough: InferenceSession.run is thread-safe,
+    so worker threads can share it.
+    """
+
+    def __init__(self, path: str, feature_columns: List[str], label_columns: List[str], intra_op_threads: int = 1):
+        _require_onnxruntime()
+
+        options = ort.SessionOptions()
+        # tiny trees: thread fan-out costs more than it saves
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.feature_columns = list(feature_columns)
+        self.label_columns = list(label_columns)
+
+    def _run(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.session.run([ONNX_LABEL_OUTPUT], {ONNX_INPUT_NAME: X})[0]
+
+    def row_from_dicts(self, sensor: Dict, profile: Dict) -> List[float]:
+        return feature_row_from_dicts(sensor, profile, self.feature_columns)
+
+    def predict_row(self, x) -> tuple:
+        return tuple(self._run(np.array([x]))[0])
+
+    def predict_alerts(self, sensor: Dict, profile: Dict) -> Dict[str, int]:
+        pred = self.predict_row(self.row_from_dicts(sensor, profile))
+        return {name: int(pred[i]) for i, name in enumerate(self.label_columns)}
+
+    def predict_matrix(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        pred = self._run(X)
+        return {name: pred[:, i].astype(int) for i, name in enumerate(self.label_columns)}
@@ -0,0 +1,223 @@
+# profile_compiler.py
+#
+# Eye-health form (EyeHealthFormModel document) → AI personalization profile:
+#   min_safe_blink_bpm, max_safe_blue, max_safe_focus_min,
+#   has_eye_surgery, has_dry_eye_condition, wears_protective_glasses
+#
+# The form doesn't ask about protective (blue-filter) glasses, and
+# uses_glasses means prescription glasses, so wears_protective_glasses
+# is always 0 (the model's "no protection" default) until it does.
+#
+# The profile is computed once per form version, stored on the form
+# document (form["ai_profile"]) and kept in an in-memory LRU cache, so the
+# live pipeline never re-derives it per reading. Cached profiles expire
+# after PROFILE_CACHE_TTL seconds: an edit made through another process
+# (whose invalidate_profile() doesn't reach this one) is picked up then.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from profile_features import invalidate_profile_features
+
+# Bump when the mapping below changes → stored profiles get recompiled
+PROFILE_COMPILER_VERSION = 1
+
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))
+
+# Age at which the mapping changes (see compile_profile)
+AGE_THRESHOLD = 50
+
+# Form fields the mapping reads (anything else never changes the profile)
+PROFILE_SOURCE_FIELDS = [
+    "date_of_birth",
+    "previous_eye_conditions",
+    "chronic_diseases",
+    "uses_contact_lenses",
+    "eye_surgery_history",
+    "screen_time_hours",
+    "lighting_conditions",
+    "current_eye_symptoms",
+]
+
+# Baseline = "normal" persona in demo_stream.py
+BASE_MIN_SAFE_BLINK = 12
+BASE_MAX_SAFE_BLUE = 550
+BASE_MAX_SAFE_FOCUS = 45
+
+# Same ranges the model was trained on (synthetic_data.generate_profiles)
+BLINK_RANGE = (8, 18)
+BLUE_RANGE = (200, 800)
+FOCUS_RANGE = (20, 60)
+
+NO_SURGERY_VALUES = {"", "none", "no", "n/a", "na", "لا"}
+DIM_LIGHTING_WORDS = ("dim", "dark", "low")
+
+
+def _clamp(x: float, lo: float, hi: float) -> float:
+    return max(lo, min(hi, x))
+
+
+def _lower_list(values) -> list:
+    return [str(v).strip().lower() for v in (values or [])]
+
+
+def _age_years(date_of_birth) -> Optional[int]:
+    if isinstance(date_of_birth, str):
+        try:
+            date_of_birth = datetime.fromisoformat(date_of_birth)
+        except ValueError:
+            return None
+
+    if not isinstance(date_of_birth, datetime):
+        return None
+
+    return int((datetime.utcnow() - date_of_birth.replace(tzinfo=None)).days // 365)
+
+
+def _age_band(date_of_birth) -> Optional[str]:
+    age = _age_years(date_of_birth)
+    if age is None:
+        return None
+    return "senior" if age >= AGE_THRESHOLD else "adult"
+
+
+def profile_version(form: Dict) -> str:
+    """
+    Stable hash of the fields that feed the profile (+ compiler version).
+    The birth date enters as its age band, so the version changes when
+    the user crosses AGE_THRESHOLD.
+    """
+    source = {k: form.get(k) for k in PROFILE_SOURCE_FIELDS}
+    source["date_of_birth"] = _age_band(form.get("date_of_birth"))
+    source["_compiler"] = PROFILE_COMPILER_VERSION
+    raw = json.dumps(source, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def compile_profile(form: Dict) -> Dict:
+    """
+    Research-inspired mapping (same direction as the demo personas):
+    - dry eye / dryness symptoms → higher safe blink, lower blue + focus limits
+    - eye surgery history        → slightly stricter limits (post-LASIK persona)
+    - contacts, diabetes, age 50+ → mild dry-eye risk (higher safe blink)
+    - long screen time, dim light → lower blue / focus limits
+    """
+    conditions = _lower_list(form.get("previous_eye_conditions"))
+    chronic = _lower_list(form.get("chronic_diseases"))
+    symptoms = _lower_list(form.get("current_eye_symptoms"))
+
+    surgery = str(form.get("eye_surgery_history") or "").strip().lower()
+    lighting = str(form.get("lighting_conditions") or "").strip().lower()
+    screen_hours = float(form.get("screen_time_hours") or 0)
+
+    has_dry_eye = int(
+        any("dry" in c for c in conditions)
+        or any("dry" in s for s in symptoms)
+    )
+    has_surgery = int(surgery not in NO_SURGERY_VALUES)
+
+    min_blink = BASE_MIN_SAFE_BLINK
+    max_blue = BASE_MAX_SAFE_BLUE
+    max_focus = BASE_MAX_SAFE_FOCUS
+
+    if has_dry_eye:
+        min_blink += 3
+        max_blue -= 120
+        max_focus -= 20
+
+    if has_surgery:
+        min_blink += 2
+        max_blue -= 70
+        max_focus -= 10
+
+    if form.get("uses_contact_lenses"):
+        min_blink += 1
+
+    if any("diabet" in c for c in chronic):
+        min_blink += 1
+
+    if _age_band(form.get("date_of_birth")) == "senior":
+        min_blink += 1
+
+    if screen_hours >= 8:
+        max_blue -= 30
+        max_focus -= 5
+
+    if any(word in lighting for word in DIM_LIGHTING_WORDS):
+        max_blue -= 50
+
+    if any(s in ("eye strain", "blurred vision") for s in symptoms):
+        max_focus -= 5
+
+    return {
+        "min_safe_blink_bpm": int(_clamp(min_blink, *BLINK_RANGE)),
+        "max_safe_blue": int(_clamp(max_blue, *BLUE_RANGE)),
+        "max_safe_focus_min": int(_clamp(max_focus, *FOCUS_RANGE)),
+        "has_eye_surgery": has_surgery,
+        "has_dry_eye_condition": has_dry_eye,
+        "wears_protective_glasses": 0,      # not on the form (see top)
+        "version": profile_version(form),
+        "compiled_at": datetime.utcnow(),
+    }
+
+
+def is_profile_current(form: Dict) -> bool:
+    stored = form.get("ai_profile")
+    return bool(stored) and stored.get("version") == profile_version(form)
+
+
+# -----------------------------
+# In-memory LRU (form_id → profile), entries expire after ttl seconds
+# -----------------------------
+class ProfileCache:
+    def __init__(self, max_size: int = 10000, ttl: float = PROFILE_CACHE_TTL, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._profiles: "OrderedDict[str, tuple]" = OrderedDict()   # form_id -> (profile, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, form_id) -> Optional[Dict]:
+        key = str(form_id)
+        with self._lock:
+            entry = self._profiles.get(key)
+            if entry is None:
+                return None
+            if self.ttl > 0 and self.clock() >= entry[1]:
+                # re-read from the form (may have been edited by another process)
+                del self._profiles[key]
+                return None
+            self._profiles.move_to_end(key)
+            return entry[0]
+
+    def put(self, form_id, profile: Dict) -> None:
+        key = str(form_id)
+        with self._lock:
+            self._profiles[key] = (profile, self.clock() + self.ttl)
+            self._profiles.move_to_end(key)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def invalidate(self, form_id) -> None:
+        with self._lock:
+            self._profiles.pop(str(form_id), None)
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+
+PROFILE_CACHE = ProfileCache()
+
+
+def invalidate_profile(form_id) -> None:
+    """
+    Drop every cached view of this form (profile + precomputed feature block).
+    """
+    PROFILE_CACHE.invalidate(form_id)
+    invalidate_profile_features(form_id)
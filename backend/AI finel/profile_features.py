@@ -0,0 +1,172 @@
+# profile_features.py
+#
+# Half of the alert feature vector depends only on the user's profile
+# (thresholds + health flags). ProfileFeatureBlock fills those columns ONCE
+# per eye-health form; each reading then only writes the 6 sensor columns
+# and the 3 engineered deltas into a preallocated row.
+#
+# The cache is keyed by form_id; a hit is only used while the profile
+# passed in still has the version the block was built from, so a form
+# edited in another process can't keep serving an old block. Editing the
+# form also drops the block here (eye_health_form_controller).
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+
+# -----------------------------
+# Input columns (training schema)
+# -----------------------------
+SENSOR_COLUMNS = ["blink_rate_bpm", "blue_lux", "focus_minutes", "ambient_lux", "humidity", "temperature"]
+
+PROFILE_COLUMNS = [
+    "min_safe_blink_bpm",
+    "max_safe_blue",
+    "max_safe_focus_min",
+    "has_eye_surgery",
+    "has_dry_eye_condition",
+    "wears_protective_glasses",
+]
+
+
+def profile_key(profile: Dict):
+    """
+    What a cached block must match: the compiled profile's version
+    (profile_compiler), else the profile values themselves.
+    """
+    version = profile.get("version")
+    if version is not None:
+        return version
+    return tuple(profile.get(name) for name in PROFILE_COLUMNS)
+
+
+class ProfileFeatureBlock:
+    """
+    Precomputed profile part of one feature row (meta["feature_columns"] order).
+    """
+
+    __slots__ = (
+        "form_id",
+        "profile_key",
+        "feature_columns",
+        "template",
+        "sensor_slots",
+        "blink_deficit_slot",
+        "blue_excess_slot",
+        "focus_excess_slot",
+        "min_safe_blink",
+        "max_safe_blue",
+        "max_safe_focus",
+        "_local",
+    )
+
+    def __init__(self, form_id, profile: Dict, feature_columns: Sequence[str]):
+        self.form_id = form_id
+        self.profile_key = profile_key(profile)
+        self.feature_columns = tuple(feature_columns)
+        index = {name: i for i, name in enumerate(self.feature_columns)}
+
+        self.template = [0.0] * len(self.feature_columns)
+        for name in PROFILE_COLUMNS:
+            if name in index:
+                self.template[index[name]] = float(profile[name])
+
+        self.sensor_slots = [(index[name], name) for name in SENSOR_COLUMNS if name in index]
+        self.blink_deficit_slot = index.get("blink_deficit")
+        self.blue_excess_slot = index.get("blue_excess")
+        self.focus_excess_slot = index.get("focus_excess")
+
+        self.min_safe_blink = float(profile["min_safe_blink_bpm"])
+        self.max_safe_blue = float(profile["max_safe_blue"])
+        self.max_safe_focus = float(profile["max_safe_focus_min"])
+
+        # one buffer per worker thread (the AI executor runs readings in parallel)
+        self._local = threading.local()
+
+    def fill(self, sensor: Dict) -> list:
+        """
+        Write one reading into this thread's row buffer and return it.
+        The buffer is reused by the next fill() on the same thread.
+        """
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self.template.copy()
+            self._local.row = row
+
+        for i, name in self.sensor_slots:
+            row[i] = float(sensor[name])
+
+        # engineered deltas (must match training!)
+        if self.blink_deficit_slot is not None:
+            row[self.blink_deficit_slot] = self.min_safe_blink - float(sensor["blink_rate_bpm"])
+        if self.blue_excess_slot is not None:
+            row[self.blue_excess_slot] = float(sensor["blue_lux"]) - self.max_safe_blue
+        if self.focus_excess_slot is not None:
+            row[self.focus_excess_slot] = float(sensor["focus_minutes"]) - self.max_safe_focus
+
+        return row
+
+
+class ProfileFeatureCache:
+    """
+    form_id → ProfileFeatureBlock (LRU bounded).
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._blocks: "OrderedDict[str, ProfileFeatureBlock]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, form_id, profile: Dict, feature_columns: Sequence[str]) -> ProfileFeatureBlock:
+        """
+        A block is rebuilt when the profile's version (or the model's
+        columns) no longer match the cached one.
+        """
+        key = str(form_id)
+        version = profile_key(profile)
+
+        with self._lock:
+            block = self._blocks.get(key)
+            if (
+                block is not None
+                and block.profile_key == version
+                and block.feature_columns == tuple(feature_columns)
+            ):
+                self._blocks.move_to_end(key)
+                return block
+
+        block = ProfileFeatureBlock(key, profile, feature_columns)
+
+        with self._lock:
+            self._blocks[key] = block
+            self._blocks.move_to_end(key)
+            while len(self._blocks) > self.max_size:
+                self._blocks.popitem(last=False)
+
+        return block
+
+    def peek(self, form_id) -> Optional[ProfileFeatureBlock]:
+        with self._lock:
+            return self._blocks.get(str(form_id))
+
+    def invalidate(self, form_id) -> None:
+        with self._lock:
+            self._blocks.pop(str(form_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+
+# -----------------------------
+# Process-wide cache
+# -----------------------------
+PROFILE_FEATURE_CACHE = ProfileFeatureCache()
+
+
+def invalidate_profile_features(form_id) -> None:
+    PROFILE_FEATURE_CACHE.invalidate(form_id)
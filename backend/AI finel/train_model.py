@@ -9,10 +9,12 @@ from sklearn.multioutput import MultiOutputClassifier
 from sklearn.metrics import classification_report
 
 from synthetic_data import generate_dataset, FEATURE_COLUMNS, LABEL_COLUMNS
+from onnx_backend import export_onnx
 
 MODEL_DIR = "models"
 MODEL_PATH = os.path.join(MODEL_DIR, "dt_alerts.joblib")
 META_PATH = os.path.join(MODEL_DIR, "dt_alerts_meta.json")
+ONNX_PATH = os.path.join(MODEL_DIR, "dt_alerts.onnx")
 
 
 def main():
@@ -54,6 +56,13 @@ def main():
     with open(META_PATH, "w", encoding="utf-8") as f:
         json.dump(meta, f, indent=2)
 
+    # 5) Export pickle-free ONNX copy (AI_INFERENCE_BACKEND=onnx)
+    try:
+        export_onnx(model, n_features=len(FEATURE_COLUMNS), path=ONNX_PATH)
+        print(f"Saved ONNX to:  {ONNX_PATH}")
+    except ImportError as e:
+        print(f"[ONNX] Skipped export: {e}")
+
     print(f"\nSaved model to: {MODEL_PATH}")
     print(f"Saved meta to:  {META_PATH}")
 
@@ -0,0 +1,238 @@
+# tree_compiler.py
+#
+# Turns the trained MultiOutputClassifier(DecisionTreeClassifier) into:
+#   - generated Python branch code for ONE row  (live path, microseconds)
+#   - flat NumPy node arrays for N rows         (vectorized traversal)
+#
+# Neither path needs sklearn / pandas at predict time.
+#
+# Run directly to check equivalence against sklearn:
+#   python tree_compiler.py
+
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+TREE_LEAF = -1
+
+
+# -----------------------------
+# Flat tree (one label)
+# -----------------------------
+@dataclass
+class FlatTree:
+    feature: np.ndarray      # int64, feature index per node (-2 on leaves)
+    threshold: np.ndarray    # float64, go left when x <= threshold
+    left: np.ndarray         # int64, -1 on leaves
+    right: np.ndarray        # int64, -1 on leaves
+    leaf_value: np.ndarray   # predicted class per node (only used on leaves)
+    max_depth: int
+
+
+def _float32_safe_threshold(threshold: float) -> float:
+    """
+    sklearn casts X to float32 before comparing with the (float64) threshold.
+    Return t64 such that  x <= t64  <=>  float32(x) <= threshold
+    so the compiled code can compare plain Python floats.
+    """
+    t = np.float64(threshold)
+    f = np.float32(t)
+    if np.float64(f) > t:
+        f = np.nextafter(f, np.float32(-np.inf))
+
+    # every float64 below this midpoint rounds down to f (or lower)
+    up = np.nextafter(f, np.float32(np.inf))
+    if not np.isfinite(up):
+        return float(np.inf)
+    mid = (np.float64(f) + np.float64(up)) / 2.0
+
+    # exact tie rounds to the even mantissa
+    f_is_even = (np.array(f, dtype=np.float32).view(np.uint32) & 1) == 0
+    if f_is_even:
+        return float(mid)
+    return float(np.nextafter(mid, -np.inf))
+
+
+def flatten_tree(estimator) -> FlatTree:
+    tree = estimator.tree_
+    classes = np.asarray(estimator.classes_)
+
+    # value: (n_nodes, n_outputs=1, n_classes) → majority class per node
+    leaf_value = classes[np.argmax(tree.value[:, 0, :], axis=1)]
+
+    threshold = np.array(
+        [
+            _float32_safe_threshold(t) if left != TREE_LEAF else 0.0
+            for t, left in zip(tree.threshold, tree.children_left)
+        ],
+        dtype=np.float64,
+    )
+
+    return FlatTree(
+        feature=np.asarray(tree.feature, dtype=np.int64),
+        threshold=threshold,
+        left=np.asarray(tree.children_left, dtype=np.int64),
+        right=np.asarray(tree.children_right, dtype=np.int64),
+        leaf_value=leaf_value,
+        max_depth=int(tree.max_depth),
+    )
+
+
+# -----------------------------
+# Code generation (single row)
+# -----------------------------
+def _emit_node(tree: FlatTree, node: int, out_var: str, depth: int, lines: List[str]) -> None:
+    pad = "    " * depth
+
+    if tree.left[node] == TREE_LEAF:
+        lines.append(f"{pad}{out_var} = {tree.leaf_value[node].item()!r}")
+        return
+
+    lines.append(f"{pad}if x[{int(tree.feature[node])}] <= {float(tree.threshold[node])!r}:")
+    _emit_node(tree, int(tree.left[node]), out_var, depth + 1, lines)
+    lines.append(f"{pad}else:")
+    _emit_node(tree, int(tree.right[node]), out_var, depth + 1, lines)
+
+
+def generate_source(trees: Sequence[FlatTree], label_columns: Sequence[str]) -> str:
+    """
+    Python source of `predict_row(x)`:
+      x: sequence of floats in meta["feature_columns"] order
+      returns: tuple of predicted classes in label_columns order
+    """
+    lines = ["def predict_row(x):"]
+
+    for i, (tree, label) in enumerate(zip(trees, label_columns)):
+        lines.append(f"    # {label}")
+        _emit_node(tree, 0, f"o{i}", 1, lines)
+
+    outputs = ", ".join(f"o{i}" for i in range(len(trees)))
+    lines.append(f"    return ({outputs},)")
+
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Compiled model
+# -----------------------------
+def feature_row_from_dicts(sensor: Dict, profile: Dict, feature_columns: Sequence[str]) -> List[float]:
+    """
+    Plain-list equivalent of inference.build_feature_row (no pandas).
+    """
+    values = {**profile, **sensor}
+
+    # engineered deltas (must match training!)
+    values["blink_deficit"] = profile["min_safe_blink_bpm"] - sensor["blink_rate_bpm"]
+    values["blue_excess"] = sensor["blue_lux"] - profile["max_safe_blue"]
+    values["focus_excess"] = sensor["focus_minutes"] - profile["max_safe_focus_min"]
+
+    return [float(values[k]) for k in feature_columns]
+
+
+class CompiledAlertModel:
+    """
+    Drop-in replacement for model.predict on the alert trees.
+
+    predict_alerts(sensor, profile) → {label: int}       (generated code)
+    predict_matrix(X)               → {label: ndarray}   (NumPy traversal)
+    """
+
+    def __init__(self, trees: List[FlatTree], feature_columns: List[str], label_columns: List[str]):
+        self.trees = trees
+        self.feature_columns = list(feature_columns)
+        self.label_columns = list(label_columns)
+
+        self.source = generate_source(trees, self.label_columns)
+        namespace: Dict = {}
+        exec(compile(self.source, "<dt_alerts compiled>", "exec"), namespace)
+        self.predict_row = namespace["predict_row"]
+
+    def row_from_dicts(self, sensor: Dict, profile: Dict) -> List[float]:
+        return feature_row_from_dicts(sensor, profile, self.feature_columns)
+
+    def predict_alerts(self, sensor: Dict, profile: Dict) -> Dict[str, int]:
+        pred = self.predict_row(self.row_from_dicts(sensor, profile))
+        return {name: int(pred[i]) for i, name in enumerate(self.label_columns)}
+
+    def predict_matrix(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(X.shape[0])
+        result = {}
+
+        for tree, label in zip(self.trees, self.label_columns):
+            node = np.zeros(X.shape[0], dtype=np.int64)
+
+            for _ in range(tree.max_depth):
+                left = tree.left[node]
+                internal = left != TREE_LEAF
+                if not internal.any():
+                    break
+
+                go_left = X[rows, tree.feature[node]] <= tree.threshold[node]
+                node = np.where(internal, np.where(go_left, left, tree.right[node]), node)
+
+            result[label] = tree.leaf_value[node].astype(int)
+
+        return result
+
+
+def compile_model(model, meta: Dict) -> CompiledAlertModel:
+    """
+    model: MultiOutputClassifier of DecisionTreeClassifier (as saved by train_model.py)
+    """
+    estimators = getattr(model, "estimators_", None)
+    if not estimators:
+        raise TypeError("Expected a fitted MultiOutputClassifier with estimators_")
+
+    for est in estimators:
+        if not hasattr(est, "tree_"):
+            raise TypeError(f"Cannot compile {type(est).__name__}: not a decision tree")
+
+    trees = [flatten_tree(est) for est in estimators]
+    return CompiledAlertModel(trees, meta["feature_columns"], meta["label_columns"])
+
+
+# -----------------------------
+# Equivalence check vs sklearn
+# -----------------------------
+def check_equivalence(model, meta: Dict, X=None) -> Dict[str, Dict[str, int]]:
+    """
+    Compare sklearn model.predict with both compiled paths.
+    X defaults to synthetic_data.generate_dataset() features.
+
+    Returns {label: {"rows": n, "row_mismatches": k, "matrix_mismatches": k}}
+    """
+    if X is None:
+        from synthetic_data import generate_dataset
+        X, _ = generate_dataset()
+
+    compiled = compile_model(model, meta)
+
+    X_df = X[meta["feature_columns"]]
+    expected = model.predict(X_df)
+    X_np = X_df.to_numpy(dtype=np.float64)
+
+    by_matrix = compiled.predict_matrix(X_np)
+    by_row = np.array([compiled.predict_row(row) for row in X_np.tolist()])
+
+    report = {}
+    for i, label in enumerate(meta["label_columns"]):
+        report[label] = {
+            "rows": int(X_np.shape[0]),
+            "row_mismatches": int(np.sum(by_row[:, i] != expected[:, i])),
+            "matrix_mismatches": int(np.sum(by_matrix[label] != expected[:, i])),
+        }
+
+    return report
+
+
+if __name__ == "__main__":
+    from inference import load_model
+
+    model, meta = load_model()
+    print(compile_model(model, meta).source)
+
+    for label, r in check_equivalence(model, meta).items():
+        status = "OK" if r["row_mismatches"] == 0 and r["matrix_mismatches"] == 0 else "MISMATCH"
+        print(f"- {label}: {status} ({r['rows']} rows, row={r['row_mismatches']}, matrix={r['matrix_mismatches']})")
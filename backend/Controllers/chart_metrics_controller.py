@@ -34,6 +34,38 @@ async def create_chart_metric(metric: ChartMetricsModel):
         "id": str(result.inserted_id),
         "message": "Chart metric created successfully"
     }
+
+
+# Add many chart metrics records in one round trip (watcher micro-batches)
+async def create_chart_metrics_many(metrics):
+
+    now = datetime.utcnow()
+    metric_dicts = []
+
+    for metric in metrics:
+        metric_dict = metric.dict() if hasattr(metric, "dict") else metric
+
+        metric_dict["created_at"] = now
+        metric_dict["updated_at"] = now
+
+        if not metric_dict.get("timestamp"):
+            metric_dict["timestamp"] = now
+
+        metric_dicts.append(metric_dict)
+
+    if not metric_dicts:
+        return {"success": True, "ids": [], "message": "No chart metrics to create"}
+
+    result = await db.chart_metrics.insert_many(metric_dicts)
+
+    if len(result.inserted_ids) != len(metric_dicts):
+        raise HTTPException(status_code=500, detail="Error inserting chart metrics")
+
+    return {
+        "success": True,
+        "ids": [str(i) for i in result.inserted_ids],
+        "message": f"{len(result.inserted_ids)} chart metrics created successfully"
+    }
     
 
 # ---------------------------------------------------------
@@ -2,6 +2,7 @@ from fastapi import HTTPException
 from database import db
 from datetime import datetime
 from Models.devices_model import DevicesModel
+from monitoring.device_registry import DEVICE_REGISTRY
 
 
 # --------------------------------------------------
@@ -34,6 +35,9 @@ async def add_device(payload: DevicesModel):
     if not result.inserted_id:
         raise HTTPException(status_code=500, detail="Error adding device")
 
+    # a "not found" may be cached for this id
+    DEVICE_REGISTRY.invalidate(payload.deviceId)
+
     device_doc["id"] = str(result.inserted_id)
     device_doc.pop("_id", None)
 
@@ -105,6 +109,9 @@ async def link_device(deviceId: str, user_id: str, form_id: str):
         }
     )
 
+    DEVICE_REGISTRY.invalidate_where(user_id=user_id, form_id=form_id)
+    DEVICE_REGISTRY.invalidate(deviceId)
+
     return {
         "success": True,
         "message": "Device linked successfully",
@@ -142,6 +149,8 @@ async def unlink_device(deviceId: str, user_id: str, form_id: str):
         }
     )
 
+    DEVICE_REGISTRY.invalidate(deviceId)
+
     return {
         "success": True,
         "message": "Device unlinked successfully",
@@ -195,6 +204,8 @@ async def control_device_power(payload: DevicesModel):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Linked device not found")
 
+    DEVICE_REGISTRY.invalidate(payload.deviceId)
+
     return {
         "success": True,
         "power": payload.power,
@@ -248,6 +259,8 @@ async def delete_device(deviceId: str, user_id: str, form_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Error deleting device")
 
+    DEVICE_REGISTRY.invalidate(deviceId)
+
     return {
         "success": True,
         "message": "Device deleted successfully",
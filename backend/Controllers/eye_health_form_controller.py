@@ -8,6 +8,8 @@ from Models.eye_health_form_model import EyeHealthFormModel
 from database import db
 from datetime import datetime
 from bson import ObjectId
+from monitoring.device_registry import DEVICE_REGISTRY
+from profile_compiler import compile_profile, is_profile_current, invalidate_profile, PROFILE_CACHE
 
 
 # --------------- Create eye health form ---------------
@@ -42,6 +44,7 @@ async def create_eye_health_form(form: EyeHealthFormModel):
     form_dict["updated_at"] = now
     form_dict["is_active"] = True  # make the new form active by default
     form_dict["main_account_id"] = ObjectId(form.main_account_id) # Convert to ObjectId for MongoDB storage
+    form_dict["ai_profile"] = compile_profile(form_dict) # AI thresholds, compiled once per form version
 
     # 4- insert form
     result = await db.eye_health_forms.insert_one(form_dict)
@@ -229,6 +232,7 @@ async def delete_eye_health_form(main_account_id: str, form_id: str):
 
     # 4) delete it
     await db.eye_health_forms.delete_one({"_id": ObjectId(form_id)})
+    invalidate_profile(form_id)
 
     # 5) if deleted form was active -> activate main form
     if was_active:
@@ -253,6 +257,7 @@ async def delete_eye_health_form(main_account_id: str, form_id: str):
         "user_id": main_account_id,
         "form_id": form_id
     })
+    DEVICE_REGISTRY.invalidate_where(user_id=main_account_id, form_id=form_id)
 
     return {"success": True, "message": "Sub-account deleted successfully"}
 
@@ -416,6 +421,17 @@ async def update_eye_health_form(form_id: str, main_account_id: str, payload: di
         "main_account_id": ObjectId(main_account_id)
     })
 
+    # recompile AI thresholds only if a profile-relevant field changed
+    if not is_profile_current(updated_form):
+        updated_form["ai_profile"] = compile_profile(updated_form)
+        await db.eye_health_forms.update_one(
+            {"_id": ObjectId(form_id)},
+            {"$set": {"ai_profile": updated_form["ai_profile"]}}
+        )
+
+    # cached AI profile + feature block for this form are now stale
+    invalidate_profile(form_id)
+
     updated_form["id"] = str(updated_form["_id"])
     updated_form["main_account_id"] = str(updated_form["main_account_id"])
     updated_form.pop("_id", None)
@@ -424,4 +440,30 @@ async def update_eye_health_form(form_id: str, main_account_id: str, payload: di
         "success": True,
         "message": "Eye health form updated successfully",
         "data": updated_form
-    }    
\ No newline at end of file
+    }
+
+
+# --------------- Get AI personalization profile (by form_id) ---------------
+async def get_ai_profile(form_id: str):
+    """
+    Thresholds + flags used by inference / compute_indices.
+    Served from the in-memory LRU; compiled and stored on the form only
+    when missing or out of date.
+    """
+    cached = PROFILE_CACHE.get(form_id)
+    if cached is not None:
+        return cached
+
+    form = await db.eye_health_forms.find_one({"_id": ObjectId(form_id)})
+    if not form:
+        raise HTTPException(status_code=404, detail="Form not found")
+
+    if not is_profile_current(form):
+        form["ai_profile"] = compile_profile(form)
+        await db.eye_health_forms.update_one(
+            {"_id": ObjectId(form_id)},
+            {"$set": {"ai_profile": form["ai_profile"]}}
+        )
+
+    PROFILE_CACHE.put(form_id, form["ai_profile"])
+    return form["ai_profile"]
@@ -8,6 +8,8 @@ from database import db
 from datetime import datetime, timedelta
 from bson import ObjectId
 from firebase.firebase_client import send_push_notification, USER_FCM_TOKEN
+from monitoring.device_registry import DEVICE_REGISTRY
+from monitoring.live_channels import LIVE_CHANNELS, notification_push
 
 
 async def create_notification(notification):
@@ -29,13 +31,9 @@ async def create_notification(notification):
     notification_dict["updated_at"] = now
 
     # link notification to linked + powered device only
-    link = await db.devices.find_one({
-        "deviceId": notification_dict["deviceId"],
-        "is_linked": True,
-        "power": True
-    })
+    link = await DEVICE_REGISTRY.get(notification_dict["deviceId"])
 
-    if not link:
+    if not link or link.get("is_linked") is not True or link.get("power") is not True:
         raise HTTPException(status_code=400, detail="Device is not linked or inactive")
 
     notification_dict["user_id"] = link.get("user_id")
@@ -48,6 +46,9 @@ async def create_notification(notification):
     notification_dict["id"] = str(result.inserted_id)
     notification_dict.pop("_id", None)
 
+    # glasses streaming over /api/readings/ws get the alert on that connection
+    await LIVE_CHANNELS.publish(notification_dict["deviceId"], notification_push(notification_dict))
+
     try:
         user_id = (notification_dict.get("user_id") or "").strip()
         user_token = None
@@ -65,17 +66,7 @@ async def create_notification(notification):
             title = notification_dict.get("title", "Smart Glasses Alert")
             body = notification_dict.get("message", "")
 ###############
-            send_push_notification(
-                user_token,
-                title,
-                body,
-                {
-                    "metric_name": notification_dict.get("metric_name", ""),
-                    "critical_value": str(notification_dict.get("critical_value", "")),
-                    "user_id": notification_dict.get("user_id", ""),
-                    "form_id": notification_dict.get("form_id", ""),
-                },
-            )
+            send_push_notification(user_token, title, body, _push_data(notification_dict))
             print("📨 Push notification sent to Firebase!")
         else:
             print("⚠️ No FCM token found for this user. Skipping push.")
@@ -86,6 +77,49 @@ async def create_notification(notification):
         "message": "Notification created successfully",
         "data": notification_dict,
     }
+
+
+def _push_data(notification):
+    return {
+        "metric_name": notification.get("metric_name", ""),
+        "critical_value": str(notification.get("critical_value", "")),
+        "user_id": notification.get("user_id", ""),
+        "form_id": notification.get("form_id", ""),
+    }
+
+
+async def push_notifications_many(notifications):
+    """
+    FCM push for notifications already stored in one batch (watcher):
+    one users query for all of them instead of one per notification.
+    """
+    user_oids = set()
+    for notification in notifications:
+        try:
+            user_oids.add(ObjectId((notification.get("user_id") or "").strip()))
+        except Exception:
+            continue
+    if not user_oids:
+        return
+
+    tokens = {}
+    async for user_doc in db.users.find({"_id": {"$in": list(user_oids)}}, {"fcm_token": 1}):
+        if user_doc.get("fcm_token"):
+            tokens[str(user_doc["_id"])] = user_doc["fcm_token"]
+
+    for notification in notifications:
+        user_token = tokens.get((notification.get("user_id") or "").strip())
+        if not user_token:
+            continue
+        try:
+            send_push_notification(
+                user_token,
+                notification.get("title", "Smart Glasses Alert"),
+                notification.get("message", ""),
+                _push_data(notification),
+            )
+        except Exception as e:
+            print("❌ Error sending push:", e)
     
     
 
@@ -134,6 +168,7 @@ async def update_notification_read_status(notification_id: str, is_read: bool, u
                 }
             }
         )
+        DEVICE_REGISTRY.invalidate(notification["deviceId"])
 
     # تجهيز البيانات للرد
     notification["isRead"] = is_read
@@ -1,34 +1,243 @@
 from database import db
 from Models.readings_model import ReadingModel
-from datetime import datetime
+from Models.readings_codec import ReadingDecodeError, decode_readings
+from datetime import datetime, timezone
+from bson import ObjectId
 from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from monitoring.partitions import partition_of
+from monitoring.reading_store import store_readings
+from monitoring.direct_pipeline import DIRECT_PIPELINE
+from monitoring.device_registry import DEVICE_REGISTRY
+from monitoring.write_behind import WRITE_BEHIND
+from monitoring.rate_limit import READINGS_RATE_LIMITER
+from monitoring.sampling import sampling_advice
+from collections import Counter
+import math
 import os
 
-collection_name = os.getenv("MONGODB_COLLECTION", "raw_readings")
+# Max readings per POST /api/readings/batch
+READINGS_BATCH_MAX = int(os.getenv("READINGS_BATCH_MAX", "1000"))
 
-async def create_reading(reading: ReadingModel):
+
+def is_device_active(device):
+    return bool(device) and device.get("is_linked") is True and device.get("power") is True
+
+
+def retry_after(wait):
+    # Retry-After value (whole seconds, capped at an hour)
+    return math.ceil(min(wait, 3600))
+
+
+def too_many_readings(wait):
+    return HTTPException(
+        status_code=429,
+        detail="Too many readings from this device",
+        headers={"Retry-After": str(retry_after(wait))}
+    )
+
+
+def with_sampling(response, device):
+    # next sampling / upload interval for the glasses (adaptive sampling)
+    advice = sampling_advice(device)
+    if advice is not None:
+        response["sampling"] = advice
+    return response
+
+
+def build_reading_doc(reading: ReadingModel, device, direct: bool):
     doc = reading.dict()
 
     if doc["timestamp"] is None:
         doc["timestamp"] = datetime.utcnow()
+    elif doc["timestamp"].tzinfo is not None:
+        # naive UTC like the stored readings ("Z" / offset timestamps from clients),
+        # the direct pipeline computes with this doc as is
+        doc["timestamp"] = doc["timestamp"].astimezone(timezone.utc).replace(tzinfo=None)
 
-    # device must be linked and powered on
-    device = await db.devices.find_one({
-        "deviceId": reading.deviceId,
-        "is_linked": True,
-        "power": True
-    })
+    doc["user_id"] = device["user_id"]
+    doc["form_id"] = device["form_id"]
 
-    if not device:
+    # watcher workers consume readings by partition (hash of deviceId)
+    doc["partition"] = partition_of(reading.deviceId)
+
+    # direct mode: this process runs the reading itself, the change stream
+    # only runs it if the in-process run didn't happen (see direct_pipeline)
+    doc["direct"] = direct
+
+    return doc
+
+
+async def create_reading(reading: ReadingModel):
+    # per-device token bucket, before any DB work → a flooding device is shed cheaply
+    wait = READINGS_RATE_LIMITER.acquire(reading.deviceId)
+    if wait:
+        raise too_many_readings(wait)
+
+    # device must be linked and powered on (served from the device cache)
+    device = await DEVICE_REGISTRY.get(reading.deviceId)
+
+    if not is_device_active(device):
         raise HTTPException(status_code=404, detail="Device not found, not linked, or inactive")
 
-    doc["user_id"] = device["user_id"]
-    doc["form_id"] = device["form_id"]
+    direct = DIRECT_PIPELINE.accepts(reading.deviceId)
+    doc = build_reading_doc(reading, device, direct)
+
+    # write-behind: answer now, the reading is stored with the next batch
+    if WRITE_BEHIND.running:
+        doc["_id"] = ObjectId()
+        await WRITE_BEHIND.submit(doc, device)
+        return JSONResponse(status_code=202, content=with_sampling({
+            "success": True,
+            "queued": True,
+            "inserted_id": str(doc["_id"])
+        }, device))
+
+    # claimed before the insert → the watcher can't run it a second time
+    DIRECT_PIPELINE.claim([doc])
+    failed = await store_readings(db, [doc])
+    if failed:
+        DIRECT_PIPELINE.unclaim(doc)
+        raise HTTPException(status_code=500, detail=f"Error inserting reading: {failed[0]}")
 
-    result = await db[collection_name].insert_one(doc)
+    if direct:
+        await DIRECT_PIPELINE.submit(doc, device)
 
-    return {
+    return with_sampling({
         "success": True,
-        "inserted_id": str(result.inserted_id)
+        "inserted_id": str(doc["_id"])
+    }, device)
+
+
+# ---------------------------------------------------------
+# Bulk ingestion (offline buffers / gateways / WebSocket)
+# ---------------------------------------------------------
+async def insert_reading_docs(pending, retry=False):
+    """
+    pending: [(doc, device), ...] built by build_reading_doc.
+    One unordered write (documents or buckets, see reading_store).
+    Returns {position: error} for failed docs; the others are handed
+    to the direct pipeline when it runs.
+    retry=True: the docs already carry their _id, a duplicate key means
+    an earlier attempt stored it.
+    """
+    docs = [doc for doc, _ in pending]
+    DIRECT_PIPELINE.claim(docs)
+    try:
+        failed = await store_readings(db, docs, retry=retry)
+    except Exception:
+        for doc in docs:
+            DIRECT_PIPELINE.unclaim(doc)
+        raise
+
+    for position, (doc, device) in enumerate(pending):
+        if not doc.get("direct"):
+            continue
+        if position in failed:
+            DIRECT_PIPELINE.unclaim(doc)
+        else:
+            await DIRECT_PIPELINE.submit(doc, device)
+
+    return failed
+
+
+async def create_readings_batch(items):
+    """
+    items: raw reading dicts, or the output of decode_readings() (ReadingModel /
+    ReadingDecodeError). Every item gets a result (same order):
+      {"index", "success", "inserted_id"} or {"index", "success": False, "error"}
+    Readings over the device's rate limit also carry "retry_after" (seconds);
+    a batch shed entirely is answered 429 + Retry-After.
+    """
+    if len(items) > READINGS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {READINGS_BATCH_MAX} readings per batch")
+
+    results = [None] * len(items)
+
+    # 1) validate every item in one pass
+    readings = []
+    for index, item in enumerate(items):
+        if isinstance(item, ReadingModel):
+            readings.append((index, item))       # binary format, already typed
+            continue
+        if isinstance(item, ReadingDecodeError):
+            results[index] = {"index": index, "success": False, "error": f"Invalid reading: {item}"}
+            continue
+        try:
+            readings.append((index, ReadingModel(**item)))
+        except (ValidationError, TypeError) as e:
+            results[index] = {"index": index, "success": False, "error": f"Invalid reading: {e}"}
+
+    # per-device token bucket, one token per reading, before any DB work
+    quota = {}
+    for device_id, count in Counter(reading.deviceId for _, reading in readings).items():
+        quota[device_id] = READINGS_RATE_LIMITER.acquire_many(device_id, count)
+
+    admitted = []
+    for index, reading in readings:
+        left, wait = quota[reading.deviceId]
+        if left:
+            quota[reading.deviceId] = (left - 1, wait)
+            admitted.append((index, reading))
+        else:
+            results[index] = {
+                "index": index,
+                "success": False,
+                "error": "Too many readings from this device",
+                "retry_after": retry_after(wait),
+            }
+
+    if items and len(readings) == len(items) and not admitted:
+        raise too_many_readings(max(wait for _, wait in quota.values()))
+    readings = admitted
+
+    # 2) resolve the distinct devices (device cache, one query for misses)
+    devices = await DEVICE_REGISTRY.get_many(list({reading.deviceId for _, reading in readings}))
+
+    pending = []
+    for index, reading in readings:
+        device = devices.get(reading.deviceId)
+        if not is_device_active(device):
+            results[index] = {"index": index, "success": False, "error": "Device not found, not linked, or inactive"}
+            continue
+        direct = DIRECT_PIPELINE.accepts(reading.deviceId)
+        pending.append((index, build_reading_doc(reading, device, direct), device))
+
+    # 3) unordered insert: one bad document does not stop the rest
+    failed = await insert_reading_docs([(doc, device) for _, doc, device in pending])
+
+    for position, (index, doc, _) in enumerate(pending):
+        if position in failed:
+            results[index] = {"index": index, "success": False, "error": failed[position]}
+        else:
+            results[index] = {"index": index, "success": True, "inserted_id": str(doc["_id"])}
+
+    inserted = sum(1 for r in results if r["success"])
+
+    response = {
+        "success": inserted == len(items),
+        "inserted": inserted,
+        "rejected": len(items) - inserted,
+        "results": results
     }
-    
\ No newline at end of file
+
+    # gateways upload for several devices → one advice per device
+    advice = {device_id: sampling_advice(device) for device_id, device in devices.items() if is_device_active(device)}
+    if advice and None not in advice.values():
+        response["sampling"] = advice
+
+    return response
+
+
+async def create_readings_binary(payload: bytes):
+    """
+    msgpack body (Models/readings_codec.py): one reading or an array of readings.
+    Same per-item results as create_readings_batch.
+    """
+    try:
+        items = decode_readings(payload)
+    except ReadingDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await create_readings_batch(items)
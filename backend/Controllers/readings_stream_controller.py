@@ -0,0 +1,326 @@
+"""
+Purpose:
+    WebSocket ingestion channel for glasses (/api/readings/ws).
+
+Trust model:
+    Like POST /api/readings, the channel identifies a device by its deviceId only,
+    and it also pushes that device's live alerts. Expose it to the glasses / gateways
+    network only (internal channel), or set READINGS_WS_TOKEN: every hello must then
+    carry that shared token.
+
+Protocol (JSON messages):
+    client → {"type": "hello", "deviceId": "...", "form_id": "...", "token": "..."}   (first message)
+    server → {"type": "ready", "deviceId": "...", "credits": N, "sampling": {...}}
+    client → {"type": "reading", "seq": 1, "timestamp": "...", "data": {...}}
+    server → {"type": "ack", "seqs": [...], "failed": [{"seq", "error"}], "grant": k}
+             (a batch that could not be written is acked with every seq in "failed" → resend;
+              readings over the device's rate limit are failed with "retry_after" seconds)
+    server → {"type": "notification", ...}                               (live alerts)
+    server → {"type": "sampling", "interval_ms", "upload_interval_ms", "reason"}
+
+    Readings may also be sent as binary frames (msgpack, Models/readings_codec.py):
+    [first_seq, [reading, ...]], acked the same way.
+
+    The client may have at most N readings without an ack (credits);
+    every ack grants back the credits of the readings it covers.
+    Readings not acked when the connection drops are not stored: the
+    client resends them on its next connection.
+
+    Live pushes (alerts, sampling) go through a bounded outbox
+    (READINGS_WS_OUTBOX_SIZE); a client that lets it fill up is
+    disconnected (WS_CLOSE_TOO_SLOW) instead of slowing the publisher.
+"""
+import asyncio
+import hmac
+import json
+import os
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from Models.readings_model import ReadingModel
+from Models.readings_codec import ReadingDecodeError, decode_reading_frame
+from Controllers.readings_controller import build_reading_doc, insert_reading_docs, is_device_active, retry_after, with_sampling
+from monitoring.device_registry import DEVICE_REGISTRY
+from monitoring.direct_pipeline import DIRECT_PIPELINE
+from monitoring.live_channels import LIVE_CHANNELS
+from monitoring.rate_limit import READINGS_RATE_LIMITER
+
+READINGS_WS_CREDITS = int(os.getenv("READINGS_WS_CREDITS", "64"))
+READINGS_WS_BATCH_SIZE = int(os.getenv("READINGS_WS_BATCH_SIZE", "32"))
+READINGS_WS_FLUSH_MS = int(os.getenv("READINGS_WS_FLUSH_MS", "200"))
+READINGS_WS_HELLO_TIMEOUT = float(os.getenv("READINGS_WS_HELLO_TIMEOUT", "10"))
+READINGS_WS_TOKEN = os.getenv("READINGS_WS_TOKEN", "")
+READINGS_WS_OUTBOX_SIZE = int(os.getenv("READINGS_WS_OUTBOX_SIZE", "32"))
+
+# Close codes (application range 4000-4999)
+WS_CLOSE_HELLO_TIMEOUT = 4408
+WS_CLOSE_DEVICE_INACTIVE = 4403
+WS_CLOSE_BAD_HELLO = 4400
+WS_CLOSE_UNAUTHORIZED = 4401
+WS_CLOSE_TOO_SLOW = 4429
+
+
+class OutboxFull(Exception):
+    pass
+
+
+class ReadingStreamSession:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        credits: int = READINGS_WS_CREDITS,
+        batch_size: int = READINGS_WS_BATCH_SIZE,
+        flush_ms: int = READINGS_WS_FLUSH_MS,
+        token: str = READINGS_WS_TOKEN,
+        outbox_size: int = READINGS_WS_OUTBOX_SIZE,
+    ):
+        self.websocket = websocket
+        self.token = token
+        self.outbox = asyncio.Queue(outbox_size)
+        self._sender = None
+        self._closing = None
+        self.credits = credits
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+
+        self.device_id = None
+        self.device = None
+        self.pending = []            # [(seq, doc)]
+        self.flush_deadline = None
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: dict):
+        # readings acks and live alerts share the socket → one writer at a time
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def push(self, message: dict):
+        """
+        Live channel entry point: queue only, the sender task writes it.
+        """
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            # client not reading → drop it rather than hold up the alerts
+            if self._closing is None:
+                self._closing = asyncio.create_task(
+                    self.websocket.close(code=WS_CLOSE_TOO_SLOW, reason="Too slow to receive pushes")
+                )
+            raise OutboxFull(self.device_id)
+
+    async def _drain(self):
+        while True:
+            message = await self.outbox.get()
+            try:
+                await self.send(message)
+            except Exception:
+                LIVE_CHANNELS.unregister(self.device_id, self.push)
+                return
+
+    async def receive(self):
+        """
+        Next message: dict for text (JSON) frames, bytes for binary frames.
+        """
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+
+        if message.get("bytes") is not None:
+            return message["bytes"]
+        try:
+            decoded = json.loads(message.get("text") or "")
+        except ValueError:
+            decoded = None
+        return decoded if isinstance(decoded, dict) else {"type": None}
+
+    # ------------------------------
+    # Handshake: bind deviceId + device context once
+    # ------------------------------
+    async def bind(self, hello: dict) -> bool:
+        device_id = hello.get("deviceId") if isinstance(hello, dict) else None
+
+        if not device_id or hello.get("type") != "hello":
+            await self.websocket.close(code=WS_CLOSE_BAD_HELLO, reason="Expected hello with deviceId")
+            return False
+
+        if self.token and not hmac.compare_digest(str(hello.get("token") or ""), self.token):
+            await self.websocket.close(code=WS_CLOSE_UNAUTHORIZED, reason="Invalid token")
+            return False
+
+        device = await DEVICE_REGISTRY.get(device_id)
+        form_id = hello.get("form_id")
+
+        if not is_device_active(device) or (form_id and device.get("form_id") != form_id):
+            await self.websocket.close(code=WS_CLOSE_DEVICE_INACTIVE, reason="Device not found, not linked, or inactive")
+            return False
+
+        self.device_id = device_id
+        self.device = device
+        self._sender = asyncio.create_task(self._drain())
+        LIVE_CHANNELS.register(device_id, self.push)
+
+        await self.send(with_sampling({"type": "ready", "deviceId": device_id, "credits": self.credits}, device))
+        return True
+
+    # ------------------------------
+    # Incoming messages
+    # ------------------------------
+    async def handle(self, message: dict):
+        kind = message.get("type")
+
+        if kind == "ping":
+            await self.send({"type": "pong"})
+            return
+
+        if kind != "reading":
+            await self.send({"type": "error", "error": f"Unknown message type: {kind}"})
+            return
+
+        seq = message.get("seq")
+
+        try:
+            reading = ReadingModel(
+                deviceId=self.device_id,
+                timestamp=message.get("timestamp"),
+                data=message.get("data"),
+            )
+        except ValidationError as e:
+            await self.reject(seq, f"Invalid reading: {e}")
+            return
+
+        await self.accept(seq, reading)
+
+    async def handle_binary(self, frame: bytes):
+        try:
+            first_seq, items = decode_reading_frame(frame, self.device_id)
+        except ReadingDecodeError as e:
+            await self.send({"type": "error", "error": str(e)})
+            return
+
+        for offset, item in enumerate(items):
+            if isinstance(item, ReadingDecodeError):
+                await self.reject(first_seq + offset, f"Invalid reading: {item}")
+            else:
+                await self.accept(first_seq + offset, item)
+
+    async def reject(self, seq, error: str):
+        await self.send({"type": "ack", "seqs": [], "failed": [{"seq": seq, "error": error}], "grant": 0})
+
+    async def accept(self, seq, reading: ReadingModel):
+        if self.credits <= 0:
+            # client ignored backpressure → reading is not accepted
+            await self.send({"type": "error", "seq": seq, "error": "No credits left, wait for an ack"})
+            return
+
+        self.credits -= 1
+        self.pending.append((seq, build_reading_doc(reading, self.device, DIRECT_PIPELINE.accepts(self.device_id))))
+
+        if self.flush_deadline is None:
+            self.flush_deadline = asyncio.get_running_loop().time() + self.flush_ms / 1000
+
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+
+    # ------------------------------
+    # Batch write + ack
+    # ------------------------------
+    async def flush(self) -> bool:
+        pending, self.pending = self.pending, []
+        self.flush_deadline = None
+        if not pending:
+            return True
+
+        # per-device token bucket (shared with the HTTP endpoints): the readings over it are nacked
+        admitted, wait = READINGS_RATE_LIMITER.acquire_many(self.device_id, len(pending))
+        shed = [
+            {"seq": seq, "error": "Too many readings from this device", "retry_after": retry_after(wait)}
+            for seq, _ in pending[admitted:]
+        ]
+        pending = pending[:admitted]
+
+        # device may have been powered off / unlinked since the hello
+        device = await DEVICE_REGISTRY.get(self.device_id)
+        if not is_device_active(device):
+            await self.send({
+                "type": "ack",
+                "seqs": [],
+                "failed": [{"seq": seq, "error": "Device not linked or inactive"} for seq, _ in pending] + shed,
+                "grant": 0,
+            })
+            await self.websocket.close(code=WS_CLOSE_DEVICE_INACTIVE, reason="Device not linked or inactive")
+            self.closed = True
+            return False
+
+        failed = {}
+        try:
+            if pending:
+                failed = await insert_reading_docs([(doc, device) for _, doc in pending])
+        except Exception as e:
+            # nothing known to be stored → every reading of the batch is to be resent
+            print(f"❌ Stream batch of {len(pending)} from {self.device_id} not written: {e}")
+            failed = {position: "Write failed, resend" for position in range(len(pending))}
+
+        self.credits += len(pending) + len(shed)
+        await self.send({
+            "type": "ack",
+            "seqs": [seq for position, (seq, _) in enumerate(pending) if position not in failed],
+            "failed": [{"seq": pending[position][0], "error": error} for position, error in failed.items()] + shed,
+            "grant": len(pending) + len(shed),
+        })
+        return True
+
+    async def run(self):
+        try:
+            hello = await asyncio.wait_for(self.receive(), READINGS_WS_HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.websocket.close(code=WS_CLOSE_HELLO_TIMEOUT, reason="No hello received")
+            return
+
+        if not await self.bind(hello):
+            return
+
+        loop = asyncio.get_running_loop()
+
+        while not self.closed:
+            if self.flush_deadline is None:
+                message = await self.receive()
+            else:
+                try:
+                    message = await asyncio.wait_for(
+                        self.receive(),
+                        max(0.0, self.flush_deadline - loop.time()),
+                    )
+                except asyncio.TimeoutError:
+                    await self.flush()
+                    continue
+
+            if isinstance(message, bytes):
+                await self.handle_binary(message)
+            else:
+                await self.handle(message)
+
+    async def close(self):
+        if self.device_id is not None:
+            LIVE_CHANNELS.unregister(self.device_id, self.push)
+
+        if self._sender is not None:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+            self._sender = None
+
+        # never acked → the client resends them (storing them here would duplicate)
+        self.pending = []
+
+
+async def handle_reading_stream(websocket: WebSocket):
+    await websocket.accept()
+    session = ReadingStreamSession(websocket)
+
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.close()
@@ -9,6 +9,7 @@ from database import db
 from firebase_admin import auth
 from datetime import datetime
 from bson import ObjectId
+from monitoring.device_registry import DEVICE_REGISTRY
 
 # --------------- Create main account ---------------
 async def create_main_account(user: UserModel):
@@ -98,6 +99,7 @@ async def delete_main_account(firebase_uid: str):
     await db.devices.delete_many({
         "user_id": str(user_id)
     })
+    DEVICE_REGISTRY.invalidate_where(user_id=str(user_id))
     
     # 4- delete user
     await db.users.delete_one({
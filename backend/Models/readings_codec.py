@@ -0,0 +1,190 @@
+"""
+readings_codec.py
+
+Purpose:
+    Compact binary wire format for readings (msgpack), next to the JSON ReadingModel.
+
+Format (version 1), one reading = one positional msgpack array:
+    [1, deviceId, timestamp_ms, ir, r, g, b, clear, humidity, temperature]
+
+    - deviceId may be nil when the channel is already bound to a device (WebSocket)
+    - timestamp_ms: Unix epoch milliseconds (UTC) or nil (server time)
+    - ir, r, g, b, clear: integers (int64, what BSON can store)
+    - humidity, temperature: finite numbers or nil
+
+A payload is one reading or an array of readings.
+Decoding builds ReadingModel directly (model_construct) after checking the
+fixed fields, so no generic Dict[str, Any] validation runs per sample.
+"""
+
+import math
+from datetime import datetime, timezone
+from typing import List, Optional, Union
+
+import msgpack
+
+from Models.readings_model import ReadingModel
+
+READING_FORMAT_VERSION = 1
+READING_FIELDS = ("version", "deviceId", "timestamp_ms", "ir", "r", "g", "b", "clear", "humidity", "temperature")
+
+# BSON int64: msgpack also carries uint64, which the insert would refuse for the whole batch
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+class ReadingDecodeError(ValueError):
+    pass
+
+
+def _int_field(record, position):
+    value = record[position]
+    if type(value) is not int:
+        raise ReadingDecodeError(f"{READING_FIELDS[position]} must be an integer")
+    if not INT64_MIN <= value <= INT64_MAX:
+        raise ReadingDecodeError(f"{READING_FIELDS[position]} out of range: {value}")
+    return value
+
+
+def _number_field(record, position):
+    value = record[position]
+    if value is None:
+        return None
+    if type(value) not in (int, float):
+        raise ReadingDecodeError(f"{READING_FIELDS[position]} must be a number or nil")
+    if type(value) is int and not INT64_MIN <= value <= INT64_MAX:
+        raise ReadingDecodeError(f"{READING_FIELDS[position]} out of range: {value}")
+    if type(value) is float and not math.isfinite(value):
+        raise ReadingDecodeError(f"{READING_FIELDS[position]} must be finite")
+    return value
+
+
+def decode_reading(record, device_id: Optional[str] = None) -> ReadingModel:
+    """
+    One decoded msgpack array → ReadingModel.
+    device_id (bound channel) wins over the deviceId in the record.
+    """
+    if not isinstance(record, (list, tuple)) or len(record) != len(READING_FIELDS):
+        raise ReadingDecodeError(f"Expected an array of {len(READING_FIELDS)} fields")
+
+    if record[0] != READING_FORMAT_VERSION:
+        raise ReadingDecodeError(f"Unsupported reading format version: {record[0]}")
+
+    device = device_id or record[1]
+    if not isinstance(device, str) or not device:
+        raise ReadingDecodeError("deviceId must be a non-empty string")
+
+    timestamp_ms = record[2]
+    if timestamp_ms is None:
+        timestamp = None
+    elif type(timestamp_ms) is int:
+        # naive UTC, same as datetime.utcnow() used for JSON readings
+        try:
+            timestamp = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+        except (ValueError, OverflowError, OSError):
+            raise ReadingDecodeError(f"timestamp_ms out of range: {timestamp_ms}")
+    else:
+        raise ReadingDecodeError("timestamp_ms must be an integer or nil")
+
+    data = {
+        "ir": {"rawValue": _int_field(record, 3)},
+        "rgb": {
+            "r": _int_field(record, 4),
+            "g": _int_field(record, 5),
+            "b": _int_field(record, 6),
+            "clear": _int_field(record, 7),
+        },
+    }
+
+    humidity = _number_field(record, 8)
+    if humidity is not None:
+        data["humidity"] = humidity
+
+    temperature = _number_field(record, 9)
+    if temperature is not None:
+        data["temperature"] = temperature
+
+    return ReadingModel.model_construct(
+        deviceId=device,
+        user_id=None,
+        form_id=None,
+        timestamp=timestamp,
+        data=data,
+    )
+
+
+def _unpack(payload: bytes):
+    try:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=True)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise ReadingDecodeError(f"Invalid msgpack payload: {e}")
+
+
+def unpack_records(payload: bytes) -> list:
+    """
+    msgpack payload → list of raw records (one reading or an array of readings).
+    """
+    decoded = _unpack(payload)
+
+    if not isinstance(decoded, list) or not decoded:
+        raise ReadingDecodeError("Expected a reading array or an array of readings")
+
+    # single reading starts with the version number
+    return [decoded] if type(decoded[0]) is int else decoded
+
+
+def decode_readings(payload: bytes, device_id: Optional[str] = None) -> List[Union[ReadingModel, ReadingDecodeError]]:
+    """
+    Every record gets an entry (same order): the reading, or the error that rejected it.
+    Raises ReadingDecodeError only if the payload itself can't be read.
+    """
+    return _decode_records(unpack_records(payload), device_id)
+
+
+def decode_reading_frame(payload: bytes, device_id: str):
+    """
+    WebSocket binary frame: [first_seq, [reading, ...]] → (first_seq, decode results).
+    Reading i of the frame has seq first_seq + i.
+    """
+    frame = _unpack(payload)
+    if not isinstance(frame, list) or len(frame) != 2 or type(frame[0]) is not int or not isinstance(frame[1], list):
+        raise ReadingDecodeError("Expected a frame [first_seq, [reading, ...]]")
+
+    return frame[0], _decode_records(frame[1], device_id)
+
+
+def _decode_records(records, device_id):
+    results = []
+    for record in records:
+        try:
+            results.append(decode_reading(record, device_id))
+        except ReadingDecodeError as e:
+            results.append(e)
+    return results
+
+
+# -----------------------------
+# Encoding (gateways, simulators, tests)
+# -----------------------------
+def encode_reading(
+    device_id: Optional[str],
+    timestamp: Optional[datetime],
+    ir: int,
+    r: int,
+    g: int,
+    b: int,
+    clear: int,
+    humidity: Optional[float] = None,
+    temperature: Optional[float] = None,
+) -> list:
+    timestamp_ms = None
+    if timestamp is not None:
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        timestamp_ms = int(timestamp.timestamp() * 1000)
+
+    return [READING_FORMAT_VERSION, device_id, timestamp_ms, ir, r, g, b, clear, humidity, temperature]
+
+
+def pack_readings(records: list) -> bytes:
+    return msgpack.packb(records, use_bin_type=True)
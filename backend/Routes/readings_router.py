@@ -1,5 +1,8 @@
-from fastapi import APIRouter
-from Controllers.readings_controller import create_reading
+from fastapi import APIRouter, Body, Request, WebSocket
+from Controllers.readings_controller import create_reading, create_readings_batch, create_readings_binary
+from monitoring.write_behind import WRITE_BEHIND
+from monitoring.rate_limit import READINGS_RATE_LIMITER
+from Controllers.readings_stream_controller import handle_reading_stream
 from Models.readings_model import ReadingModel
 
 router = APIRouter()
@@ -7,3 +10,35 @@ router = APIRouter()
 @router.post("/readings")
 async def add_reading(reading: ReadingModel):
     return await create_reading(reading)
+
+
+# Write-behind queue depth / flush latency (READINGS_WRITE_BEHIND=true)
+@router.get("/readings/ingest-stats")
+async def get_ingest_stats():
+    return WRITE_BEHIND.stats()
+
+
+# Per-device rate limiting: admitted / shed readings (this worker process)
+@router.get("/readings/rate-limit-stats")
+async def get_rate_limit_stats():
+    return READINGS_RATE_LIMITER.stats()
+
+
+# Many readings in one request: {"readings": [ReadingModel, ...]}
+# (each item is validated separately → per-item results)
+@router.post("/readings/batch")
+async def add_readings_batch(readings: list[dict] = Body(..., embed=True)):
+    return await create_readings_batch(readings)
+
+
+# Compact msgpack readings (Content-Type: application/msgpack), see Models/readings_codec.py
+@router.post("/readings/binary")
+async def add_readings_binary(request: Request):
+    return await create_readings_binary(await request.body())
+
+
+# Long-lived stream from the glasses: hello → readings (acked in batches)
+# + live alerts pushed back on the same connection
+@router.websocket("/readings/ws")
+async def readings_stream(websocket: WebSocket):
+    await handle_reading_stream(websocket)
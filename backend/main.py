@@ -1,4 +1,10 @@
 from fastapi import FastAPI
+import os
+import sys
+
+# AI modules live in "AI finel/" and import each other by plain name
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI finel"))
+
 from Routes.notifications_router import router as notification_router
 from Routes.readings_router import router as readings_router
 from Routes.user_router import router as user_router
@@ -7,15 +13,60 @@ from Routes.devices_router import router as devices_router
 from Routes.chart_metrics_router import router as chart_metrics_router
 from fastapi import FastAPI
 import asyncio
-from monitoring.monitor import watch_database
+from monitoring.monitor import watch_database, process_direct_batch
+from ai_executor import start_ai_executor, stop_ai_executor
+from monitoring.direct_pipeline import DIRECT_PIPELINE, PIPELINE_MODE
+from monitoring.device_registry import DEVICE_REGISTRY
+from monitoring.write_behind import WRITE_BEHIND, READINGS_WRITE_BEHIND
+from Controllers.readings_controller import insert_reading_docs
+from monitoring.reading_store import ensure_reading_indexes, READINGS_STORAGE
+from monitoring.compaction import compaction_loop, ensure_retention_indexes, READINGS_COMPACTION_ENABLED
+from database import db
 
 app = FastAPI()
 
-# Start the database watcher in the background
+# Start the AI worker pool + database watcher in the background
 @app.on_event("startup")
 async def startup_event():
+    # the REST API doesn't need the AI executor → a model load error is logged, not fatal
+    try:
+        await start_ai_executor()
+    except Exception as e:
+        print(f"⚠️ AI executor not started: {e}")
+
+    # raw readings indexes (documents or per-minute buckets)
+    try:
+        await ensure_reading_indexes(db)
+        await ensure_retention_indexes(db)
+        print(f"🗄️ Raw readings storage: {READINGS_STORAGE}")
+    except Exception as e:
+        print(f"⚠️ Could not create raw readings indexes: {e}")
+
+    # direct mode: readings posted to this process skip the change stream
+    if PIPELINE_MODE == "direct":
+        DIRECT_PIPELINE.start(process_direct_batch)
+
+    # write-behind: POST /api/readings answers 202, readings are written in batches
+    if READINGS_WRITE_BEHIND:
+        WRITE_BEHIND.start(insert_reading_docs)
+
     asyncio.create_task(watch_database())
 
+    # keep the shared device cache in sync with the devices collection
+    asyncio.create_task(DEVICE_REGISTRY.watch())
+
+    # old raw readings → per-minute aggregates, then deleted
+    if READINGS_COMPACTION_ENABLED:
+        asyncio.create_task(compaction_loop(db))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # queued readings are written (and handed to the direct pipeline) first
+    await WRITE_BEHIND.stop()
+    await DIRECT_PIPELINE.stop()
+    await stop_ai_executor()
+
 app.include_router(notification_router, prefix="/api/notifications")
 app.include_router(readings_router, prefix="/api")
 app.include_router(user_router, prefix="/api/users")
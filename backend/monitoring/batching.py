@@ -0,0 +1,39 @@
+# batching.py
+# ============================================
+# Micro-batching for the raw_readings change stream:
+# take up to `max_size` events, waiting at most
+# `max_wait_ms` after the first one arrives.
+# ============================================
+
+import os
+import time
+
+WATCH_BATCH_SIZE = int(os.getenv("WATCH_BATCH_SIZE", "100"))
+WATCH_BATCH_MAX_WAIT_MS = int(os.getenv("WATCH_BATCH_MAX_WAIT_MS", "50"))
+
+# Batch size while draining the backlog after a resume
+WATCH_CATCHUP_BATCH_SIZE = int(os.getenv("WATCH_CATCHUP_BATCH_SIZE", "1000"))
+
+
+async def next_batch(stream, max_size=WATCH_BATCH_SIZE, max_wait_ms=WATCH_BATCH_MAX_WAIT_MS):
+    """
+    Block for the first change, then drain what is already available.
+    Returns [] when the stream is closed.
+
+    try_next() returns None once nothing arrives within the stream's
+    max_await_time_ms, so a quiet stream never holds a batch back longer.
+    """
+    try:
+        changes = [await stream.next()]
+    except StopAsyncIteration:
+        return []
+
+    deadline = time.monotonic() + max_wait_ms / 1000
+
+    while len(changes) < max_size and time.monotonic() < deadline:
+        change = await stream.try_next()
+        if change is None:
+            break
+        changes.append(change)
+
+    return changes
@@ -0,0 +1,338 @@
+# compaction.py
+# ============================================
+# Retention of raw readings:
+# - readings older than READINGS_RAW_RETENTION_DAYS are rolled
+#   into per-device, per-minute aggregates (reading_aggregates)
+# - then the raw readings are deleted in bounded batches
+# - optional TTL index (READINGS_TTL_DAYS) as a safety net that
+#   drops raw readings without aggregating them
+#
+# Aggregate document (one per device per minute):
+#   {deviceId, user_id, form_id, start, count, blinks,
+#    ibi / lux / blue_ratio / humidity / temperature:
+#        {"n", "sum", "min", "max"}}        mean = sum / n
+#
+# Per device, db.compaction_state keeps how far it was compacted
+# (compacted_until) and the last blink time, so IBIs continue
+# across runs. Readings uploaded late (older than compacted_until)
+# are merged into the existing minutes.
+#
+# Exactly once: a run only takes readings ingested before its
+# max_id (ObjectId, READINGS_COMPACTION_INGEST_MARGIN before the
+# run) and deletes only those. The run is recorded before it
+# starts ({"run": {id, cutoff, max_id, stage}}); a run that
+# stopped half way is resumed with the same bounds:
+# - stage "aggregate": minutes are rewritten ($set, same values)
+#   and a merge already applied is skipped (aggregate "runs")
+# - stage "delete": aggregates are complete, only the delete
+#   is finished
+# ============================================
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from monitoring.metrics import MetricsEngine, to_epoch_seconds
+from monitoring.partitions import WATCH_WORKER_ID
+from monitoring.reading_store import (
+    bucket_start,
+    bucketed,
+    delete_readings,
+    find_readings,
+    reading_device_ids,
+    readings_collection,
+)
+
+READINGS_COMPACTION_ENABLED = os.getenv("READINGS_COMPACTION_ENABLED", "false").lower() == "true"
+READINGS_RAW_RETENTION_DAYS = float(os.getenv("READINGS_RAW_RETENTION_DAYS", "7"))
+READINGS_COMPACTION_INTERVAL = float(os.getenv("READINGS_COMPACTION_INTERVAL", "3600"))  # seconds
+READINGS_COMPACTION_DELETE_BATCH = int(os.getenv("READINGS_COMPACTION_DELETE_BATCH", "5000"))
+READINGS_COMPACTION_PAUSE_MS = int(os.getenv("READINGS_COMPACTION_PAUSE_MS", "50"))
+READINGS_TTL_DAYS = float(os.getenv("READINGS_TTL_DAYS", "0"))   # 0 = no TTL index
+# readings ingested this recently (write-behind queue, retries) wait for the next run
+READINGS_COMPACTION_INGEST_MARGIN = float(os.getenv("READINGS_COMPACTION_INGEST_MARGIN", "300"))  # seconds
+
+AGGREGATE_STATS = ("ibi", "lux", "blue_ratio", "humidity", "temperature")
+AGGREGATE_WRITE_BATCH = 1000
+AGGREGATE_RUNS_KEPT = 10      # merge run ids remembered per minute
+
+COMPACTION_LOCK = "readings_compaction"
+
+# same lux / blue ratio formulas as the live metrics
+_FORMULAS = MetricsEngine()
+
+
+class MinuteAggregate:
+    __slots__ = ("start", "user_id", "form_id", "count", "blinks", "stats")
+
+    def __init__(self, start, user_id=None, form_id=None):
+        self.start = start
+        self.user_id = user_id
+        self.form_id = form_id
+        self.count = 0
+        self.blinks = 0
+        self.stats = {}    # name -> [n, sum, min, max]
+
+    def add(self, name, value):
+        stat = self.stats.get(name)
+        if stat is None:
+            self.stats[name] = [1, value, value, value]
+            return
+        stat[0] += 1
+        stat[1] += value
+        if value < stat[2]:
+            stat[2] = value
+        if value > stat[3]:
+            stat[3] = value
+
+    def fields(self):
+        fields = {"count": self.count, "blinks": self.blinks}
+        for name, (n, total, low, high) in self.stats.items():
+            fields[name] = {"n": n, "sum": total, "min": low, "max": high}
+        return fields
+
+
+def stat_mean(aggregate, name):
+    stat = aggregate.get(name)
+    if not stat or not stat.get("n"):
+        return None
+    return stat["sum"] / stat["n"]
+
+
+def add_reading(aggregate, doc, last_blink_time):
+    """
+    Fold one reading into its minute. Returns the new last blink time (epoch s).
+    """
+    data = doc.get("data") or {}
+    aggregate.count += 1
+
+    if (data.get("ir") or {}).get("rawValue", 0) == 1:
+        aggregate.blinks += 1
+        t = to_epoch_seconds(doc["timestamp"])
+        if last_blink_time is not None and t >= last_blink_time:
+            aggregate.add("ibi", t - last_blink_time)
+        last_blink_time = t
+
+    rgb = data.get("rgb")
+    if rgb:
+        aggregate.add("lux", _FORMULAS.calculate_lux(rgb.get("clear", 0)))
+        aggregate.add("blue_ratio", _FORMULAS.calculate_blue_ratio(rgb.get("r", 0), rgb.get("g", 0), rgb.get("b", 0)))
+
+    for name in ("humidity", "temperature"):
+        value = data.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            aggregate.add(name, value)
+
+    return last_blink_time
+
+
+# ----------------------------------------------------
+# Aggregates (collection = db.reading_aggregates)
+# ----------------------------------------------------
+def _aggregate_write(device_id, aggregate, run_id=None):
+    key = {"deviceId": device_id, "start": aggregate.start}
+    owner = {"user_id": aggregate.user_id, "form_id": aggregate.form_id}
+
+    if run_id is None:
+        # first compaction of this minute → the aggregate is complete
+        return UpdateOne(key, {"$set": {**owner, **aggregate.fields()}}, upsert=True)
+
+    # late readings → add to what is already there
+    inc = {"count": aggregate.count, "blinks": aggregate.blinks}
+    low, high = {}, {}
+    for name, (n, total, minimum, maximum) in aggregate.stats.items():
+        inc[f"{name}.n"] = n
+        inc[f"{name}.sum"] = total
+        low[f"{name}.min"] = minimum
+        high[f"{name}.max"] = maximum
+
+    # the minute remembers the run → a resumed run can't merge twice
+    # (filter no longer matches → upsert hits the unique key → skipped)
+    key["runs"] = {"$ne": run_id}
+    update = {
+        "$inc": inc,
+        "$setOnInsert": owner,
+        "$push": {"runs": {"$each": [run_id], "$slice": -AGGREGATE_RUNS_KEPT}},
+    }
+    if low:
+        update["$min"] = low
+        update["$max"] = high
+    return UpdateOne(key, update, upsert=True)
+
+
+async def _write_aggregates(aggregates, operations):
+    try:
+        await aggregates.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # duplicate key = merge already applied by this run
+        errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        if errors:
+            raise
+
+
+async def aggregate_range(db, device_id, start, end, last_blink_time=None, run_id=None, storage=None, max_id=None):
+    """
+    Roll the device's readings in [start, end) (ingested before max_id)
+    into minute aggregates; run_id: merge into existing minutes.
+    Returns (minutes written, last blink time).
+    """
+    aggregates = db["reading_aggregates"]
+    operations = []
+    written = 0
+    current = None
+
+    async for doc in find_readings(db, device_id, start, end, storage=storage, max_id=max_id):
+        minute = bucket_start(doc["timestamp"])
+
+        if current is None or current.start != minute:
+            if current is not None:
+                operations.append(_aggregate_write(device_id, current, run_id))
+            current = MinuteAggregate(minute, doc.get("user_id"), doc.get("form_id"))
+
+            if len(operations) >= AGGREGATE_WRITE_BATCH:
+                await _write_aggregates(aggregates, operations)
+                written += len(operations)
+                operations = []
+
+        last_blink_time = add_reading(current, doc, last_blink_time)
+
+    if current is not None:
+        operations.append(_aggregate_write(device_id, current, run_id))
+    if operations:
+        await _write_aggregates(aggregates, operations)
+        written += len(operations)
+
+    return written, last_blink_time
+
+
+async def compact_device(
+    db,
+    device_id,
+    cutoff,
+    delete_batch=READINGS_COMPACTION_DELETE_BATCH,
+    pause_ms=READINGS_COMPACTION_PAUSE_MS,
+    storage=None,
+    now=None,
+):
+    """
+    Aggregate, then delete, the device's readings older than cutoff.
+    An unfinished earlier run is finished first (with its own cutoff).
+    """
+    states = db["compaction_state"]
+    state = await states.find_one({"_id": device_id}) or {}
+    run = state.get("run")
+
+    if run is None:
+        # readings ingested after max_id are left for the next run
+        max_id = ObjectId.from_datetime(
+            (now or datetime.utcnow()) - timedelta(seconds=READINGS_COMPACTION_INGEST_MARGIN)
+        )
+        run = {"id": str(max_id), "cutoff": cutoff, "max_id": max_id, "stage": "aggregate"}
+        await states.update_one({"_id": device_id}, {"$set": {"run": run}}, upsert=True)
+
+    cutoff, max_id = run["cutoff"], run["max_id"]
+    minutes = 0
+
+    if run["stage"] == "aggregate":
+        watermark = state.get("compacted_until")
+        done = {"run.stage": "delete"}
+
+        # readings uploaded after their minute was compacted
+        if watermark is not None:
+            late, _ = await aggregate_range(
+                db, device_id, None, min(watermark, cutoff), run_id=run["id"], storage=storage, max_id=max_id
+            )
+            minutes += late
+
+        if watermark is None or watermark < cutoff:
+            fresh, last_blink_time = await aggregate_range(
+                db, device_id, watermark, cutoff, state.get("last_blink_time"), storage=storage, max_id=max_id
+            )
+            minutes += fresh
+            done.update({"compacted_until": cutoff, "last_blink_time": last_blink_time})
+
+        # aggregates are written → the raw readings may go
+        await states.update_one({"_id": device_id}, {"$set": done})
+
+    # only what this run aggregated
+    deleted = await delete_readings(
+        db, device_id, cutoff, delete_batch, pause_ms / 1000, storage=storage, max_id=max_id
+    )
+    await states.update_one({"_id": device_id}, {"$unset": {"run": ""}})
+    return minutes, deleted
+
+
+async def run_compaction(db, now=None, retention_days=READINGS_RAW_RETENTION_DAYS, storage=None):
+    """
+    One compaction pass over every device. Returns a summary dict.
+    """
+    # whole minutes only (a minute is never split between raw and aggregate)
+    cutoff = bucket_start((now or datetime.utcnow()) - timedelta(days=retention_days))
+    summary = {"cutoff": cutoff, "devices": 0, "minutes": 0, "deleted": 0}
+
+    for device_id in await reading_device_ids(db, cutoff, storage=storage):
+        try:
+            minutes, deleted = await compact_device(db, device_id, cutoff, storage=storage)
+        except Exception as e:
+            print(f"❌ Compaction failed for {device_id}: {e}")
+            continue
+
+        summary["devices"] += 1
+        summary["minutes"] += minutes
+        summary["deleted"] += deleted
+
+    return summary
+
+
+# ----------------------------------------------------
+# Indexes / TTL option
+# ----------------------------------------------------
+async def ensure_retention_indexes(db, ttl_days=READINGS_TTL_DAYS, storage=None):
+    await db["reading_aggregates"].create_index([("deviceId", ASCENDING), ("start", ASCENDING)], unique=True)
+
+    if ttl_days > 0:
+        # buckets expire once their newest sample is old enough
+        field = "last" if bucketed(storage) else "timestamp"
+        await readings_collection(db, storage).create_index(
+            [(field, ASCENDING)],
+            name="raw_readings_ttl",
+            expireAfterSeconds=int(ttl_days * 86400),
+        )
+
+
+# ----------------------------------------------------
+# Scheduled job (one worker at a time, db.job_locks)
+# ----------------------------------------------------
+async def acquire_job_lock(locks, name, owner, ttl):
+    now = datetime.utcnow()
+    try:
+        result = await locks.update_one(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # another live worker holds the lock
+        return False
+    return result.matched_count == 1 or result.upserted_id is not None
+
+
+async def compaction_loop(db, interval=READINGS_COMPACTION_INTERVAL, worker_id=WATCH_WORKER_ID):
+    print(f"🗜️ Raw readings compaction every {interval:.0f}s (keep {READINGS_RAW_RETENTION_DAYS:g} days raw)")
+
+    while True:
+        try:
+            if await acquire_job_lock(db["job_locks"], COMPACTION_LOCK, worker_id, interval):
+                summary = await run_compaction(db)
+                print(
+                    f"🗜️ Compacted {summary['devices']} device(s): {summary['minutes']} minute aggregate(s), "
+                    f"{summary['deleted']} raw document(s) deleted (before {summary['cutoff']})"
+                )
+        except Exception as e:
+            print(f"❌ Compaction run failed: {e}")
+
+        await asyncio.sleep(interval)
@@ -0,0 +1,186 @@
+# device_registry.py
+# ============================================
+# Process-wide cache of device context:
+#   deviceId → is_linked, power, errorLock, user_id, form_id, sampling
+#
+# Used on the hot path (create_reading, watcher, notifications,
+# auto shutdown) instead of a devices.find_one per call.
+# Kept fresh by:
+# - a change stream on `devices` (watch())
+# - explicit invalidation from devices_controller mutations
+# - a TTL, as a safety net if the change stream is not running
+# ============================================
+
+import os
+import time
+from collections import OrderedDict
+
+DEVICE_CACHE_SIZE = int(os.getenv("DEVICE_CACHE_SIZE", "50000"))
+DEVICE_CACHE_TTL = float(os.getenv("DEVICE_CACHE_TTL", "60"))  # seconds
+
+DEVICE_CONTEXT_FIELDS = ("deviceId", "is_linked", "power", "errorLock", "user_id", "form_id", "sampling")
+DEVICE_PROJECTION = {field: 1 for field in DEVICE_CONTEXT_FIELDS}
+
+
+def device_context(doc):
+    return {field: doc.get(field) for field in DEVICE_CONTEXT_FIELDS}
+
+
+class DeviceRegistry:
+    """
+    Returned dicts are shared: read them, change them only through update().
+    A missing device is cached too (as None), so unknown ids don't hit the DB.
+    """
+
+    def __init__(self, collection=None, max_size=DEVICE_CACHE_SIZE, ttl=DEVICE_CACHE_TTL):
+        self._collection = collection
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()   # deviceId -> (context or None, loaded_at, _id)
+        self._ids = {}                  # Mongo _id -> deviceId (for delete events)
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from database import db
+            self._collection = db["devices"]
+        return self._collection
+
+    # ----------------------------------------------------
+    # Lookup
+    # ----------------------------------------------------
+    def peek(self, device_id):
+        """
+        (hit, context) from memory only.
+        """
+        entry = self._entries.get(device_id)
+        if entry is None:
+            return False, None
+
+        context, loaded_at, _ = entry
+        if time.monotonic() - loaded_at > self.ttl:
+            self._drop(device_id)
+            return False, None
+
+        self._entries.move_to_end(device_id)
+        return True, context
+
+    async def get(self, device_id):
+        hit, context = self.peek(device_id)
+        if hit:
+            return context
+
+        doc = await self.collection.find_one({"deviceId": device_id}, DEVICE_PROJECTION)
+        return self._store(device_id, doc)
+
+    async def get_many(self, device_ids):
+        """
+        deviceId → context for all ids, one $in query for the misses.
+        """
+        result = {}
+        missing = []
+        for device_id in device_ids:
+            hit, context = self.peek(device_id)
+            if hit:
+                result[device_id] = context
+            else:
+                missing.append(device_id)
+
+        if missing:
+            found = {}
+            async for doc in self.collection.find({"deviceId": {"$in": missing}}, DEVICE_PROJECTION):
+                found.setdefault(doc["deviceId"], doc)
+            for device_id in missing:
+                result[device_id] = self._store(device_id, found.get(device_id))
+
+        return result
+
+    def _store(self, device_id, doc):
+        context = device_context(doc) if doc else None
+        _id = doc.get("_id") if doc else None
+
+        self._drop(device_id)
+        self._entries[device_id] = (context, time.monotonic(), _id)
+        if _id is not None:
+            self._ids[_id] = device_id
+
+        while len(self._entries) > self.max_size:
+            _, (_, _, old_id) = self._entries.popitem(last=False)
+            self._ids.pop(old_id, None)
+
+        return context
+
+    # ----------------------------------------------------
+    # Updates / invalidation
+    # ----------------------------------------------------
+    def update(self, device_id, fields):
+        """
+        Write-through after this process changed the device in MongoDB.
+        """
+        entry = self._entries.get(device_id)
+        if entry is not None and entry[0] is not None:
+            entry[0].update({k: v for k, v in fields.items() if k in DEVICE_CONTEXT_FIELDS})
+
+    def invalidate(self, device_id):
+        self._drop(device_id)
+
+    def invalidate_where(self, **fields):
+        """
+        Drop every cached device matching all fields (e.g. user_id + form_id).
+        """
+        for device_id, (context, _, _) in list(self._entries.items()):
+            if context is not None and all(context.get(k) == v for k, v in fields.items()):
+                self._drop(device_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._ids.clear()
+
+    def _drop(self, device_id):
+        entry = self._entries.pop(device_id, None)
+        if entry is not None:
+            self._ids.pop(entry[2], None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ----------------------------------------------------
+    # devices change stream
+    # ----------------------------------------------------
+    def apply_change(self, change):
+        operation = change.get("operationType")
+
+        if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            self.clear()
+            return
+
+        doc = change.get("fullDocument")
+        if doc and doc.get("deviceId"):
+            # deviceId may have changed → drop any entry of this _id too
+            old_id = self._ids.get(doc.get("_id"))
+            if old_id is not None and old_id != doc["deviceId"]:
+                self._drop(old_id)
+            if doc["deviceId"] in self._entries:
+                self._store(doc["deviceId"], doc)
+            return
+
+        # delete (or update without the full document)
+        device_id = self._ids.get(change.get("documentKey", {}).get("_id"))
+        if device_id is not None:
+            self._drop(device_id)
+
+    async def watch(self):
+        print("👀 Watching MongoDB devices for cache invalidation...")
+        try:
+            async with self.collection.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    self.apply_change(change)
+        except Exception as e:
+            # fall back to TTL-only freshness
+            print(f"⚠️ Devices change stream stopped ({e}) → device cache uses TTL only")
+            self.clear()
+
+
+# Process-wide registry
+DEVICE_REGISTRY = DeviceRegistry()
@@ -0,0 +1,183 @@
+# direct_pipeline.py
+# ============================================
+# In-process pipeline (PIPELINE_MODE=direct):
+# create_reading hands the inserted reading + the device
+# it already loaded straight to a bounded queue, so alerts
+# skip the change-stream round trip and the second device
+# lookup.
+#
+# The change stream stays the durable path:
+# - a reading is claimed (by _id) before it is stored; when
+#   the watcher sees a claimed reading it waits for the
+#   in-process run instead of running it a second time
+# - a failed in-process batch is handed back: the watcher
+#   runs those readings itself
+# - a reading never claimed here (process restarted before
+#   it ran, other worker) is simply processed by the stream,
+#   which only moves its resume token once both are done
+# - partitioned watcher: only readings of partitions this
+#   worker owns go direct (same MetricsEngine as the stream)
+# ============================================
+
+import asyncio
+import os
+from collections import OrderedDict
+
+from bson import ObjectId
+
+from monitoring.batching import WATCH_BATCH_SIZE
+
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "stream").lower()   # "stream" | "direct"
+DIRECT_QUEUE_SIZE = int(os.getenv("DIRECT_QUEUE_SIZE", "10000"))
+DIRECT_WAIT_TIMEOUT = float(os.getenv("DIRECT_WAIT_TIMEOUT", "30"))   # seconds the watcher waits for a claimed reading
+
+# Outcome of a claimed reading
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class DirectPipeline:
+    def __init__(self, max_queue=DIRECT_QUEUE_SIZE, batch_size=WATCH_BATCH_SIZE, wait_timeout=DIRECT_WAIT_TIMEOUT):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.wait_timeout = wait_timeout
+
+        self.handler = None
+        self.owns = None            # deviceId -> bool (partitioned watcher), None = every device
+        self._queue = None
+        self._task = None
+
+        # reading _id -> [state, asyncio.Event set when the run is over]
+        # finished entries are kept (bounded) until the watcher has seen them
+        self._claims = OrderedDict()
+        self.max_claims = max_queue * 4
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def accepts(self, device_id):
+        """
+        True if a reading of this device is processed in-process.
+        """
+        return self._task is not None and (self.owns is None or self.owns(device_id))
+
+    def start(self, handler):
+        """
+        handler: async fn([(doc, device), ...]) → runs one batch.
+        """
+        if self._task is not None:
+            return
+
+        self.handler = handler
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        print(f"⚡ Direct reading pipeline started (queue {self.max_queue})")
+
+    async def stop(self, timeout=10):
+        if self._task is None:
+            return
+
+        # finish what is already queued, then stop the consumer
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Direct pipeline stopped with {self._queue.qsize()} reading(s) unprocessed")
+
+        task, self._task = self._task, None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        # not run here → left to the change stream
+        while not self._queue.empty():
+            doc, _ = self._queue.get_nowait()
+            self._finish(doc, FAILED)
+
+        print("⚡ Direct reading pipeline stopped")
+
+    # ----------------------------------------------------
+    # Claims (before the insert) / outcome
+    # ----------------------------------------------------
+    def claim(self, docs):
+        """
+        Claim the direct docs before they are stored (sets their _id).
+        """
+        for doc in docs:
+            if doc.get("direct"):
+                self._claims[doc.setdefault("_id", ObjectId())] = [RUNNING, asyncio.Event()]
+
+    def unclaim(self, doc):
+        # not stored → no change event will come for it
+        self._claims.pop(doc.get("_id"), None)
+
+    def _finish(self, doc, state):
+        claim = self._claims.get(doc.get("_id"))
+        if claim is None:
+            return
+        claim[0] = state
+        claim[1].set()
+        self._claims.move_to_end(doc["_id"])
+
+        while len(self._claims) > self.max_claims:
+            oldest, (oldest_state, _) = next(iter(self._claims.items()))
+            if oldest_state == RUNNING:
+                break
+            del self._claims[oldest]
+
+    async def unhandled(self, docs):
+        """
+        Watcher side: the docs it must run itself. Waits for readings
+        still running in-process; drops the ones that ran successfully.
+        """
+        result = []
+        for doc in docs:
+            claim = self._claims.get(doc["_id"]) if doc.get("direct") else None
+            if claim is None:
+                result.append(doc)
+                continue
+
+            if claim[0] == RUNNING:
+                try:
+                    await asyncio.wait_for(claim[1].wait(), self.wait_timeout)
+                except asyncio.TimeoutError:
+                    print(f"⚠️ Direct reading {doc['_id']} still running after {self.wait_timeout:g}s → processed by the watcher")
+
+            # seen by the watcher → forget it
+            self._claims.pop(doc["_id"], None)
+            if claim[0] != DONE:
+                result.append(doc)
+
+        return result
+
+    # ----------------------------------------------------
+    # Queue
+    # ----------------------------------------------------
+    async def submit(self, doc, device):
+        # bounded queue → a burst slows the request down instead of growing memory
+        await self._queue.put((doc, device))
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self):
+        while True:
+            items = [await self._queue.get()]
+            while len(items) < self.batch_size and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+
+            state = DONE
+            try:
+                await self.handler(items)
+            except Exception as e:
+                # handed back to the change stream
+                print(f"❌ Direct pipeline batch failed, left to the watcher: {e}")
+                state = FAILED
+            finally:
+                for doc, _ in items:
+                    self._finish(doc, state)
+                    self._queue.task_done()
+
+
+# Process-wide pipeline (started by main.py in direct mode)
+DIRECT_PIPELINE = DirectPipeline()
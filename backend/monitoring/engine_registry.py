@@ -0,0 +1,205 @@
+# engine_registry.py
+# ============================================
+# One MetricsEngine per device (deviceId):
+# - LRU bound on the number of live engines
+# - idle eviction (glasses taken off / device offline)
+# - optional snapshot of evicted engines, restored on
+#   the device's next reading
+# - engines in use by a batch are pinned and never evicted;
+#   eviction runs between batches (trim / evict_idle)
+# ============================================
+
+import os
+import time
+from collections import OrderedDict
+
+from monitoring.metrics import MetricsEngine
+
+METRICS_MAX_ENGINES = int(os.getenv("METRICS_MAX_ENGINES", "10000"))
+METRICS_IDLE_TIMEOUT = float(os.getenv("METRICS_IDLE_TIMEOUT", "1800"))  # seconds
+METRICS_SWEEP_INTERVAL = float(os.getenv("METRICS_SWEEP_INTERVAL", "60"))  # seconds
+
+
+class DeviceMetrics:
+    """
+    Per-device state kept by the watcher.
+    """
+
+    __slots__ = ("device_id", "engine", "last_seen", "last_chart_save_time", "sampling")
+
+    def __init__(self, device_id, engine, last_chart_save_time=None):
+        self.device_id = device_id
+        self.engine = engine
+        self.last_seen = time.monotonic()
+        self.last_chart_save_time = last_chart_save_time
+        self.sampling = None    # SamplingState, created by the watcher
+
+
+class MetricsEngineRegistry:
+    def __init__(
+        self,
+        max_engines=METRICS_MAX_ENGINES,
+        idle_timeout=METRICS_IDLE_TIMEOUT,
+        sweep_interval=METRICS_SWEEP_INTERVAL,
+        keep_snapshots=True,
+    ):
+        self.max_engines = max_engines
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.keep_snapshots = keep_snapshots
+
+        self._devices = OrderedDict()   # deviceId -> DeviceMetrics (LRU order)
+        self._evicted = {}              # deviceId -> snapshot waiting to be persisted
+        self._pinned = {}               # deviceId -> batches using its engine
+        self._last_sweep = time.monotonic()
+
+    # ----------------------------------------------------
+    # Lookup
+    # ----------------------------------------------------
+    def get(self, device_id, snapshot=None):
+        """
+        Return the device's state, creating it (from snapshot if given).
+        Never evicts: the LRU bound is applied by trim().
+        """
+        state = self._devices.get(device_id)
+        if state is not None:
+            state.last_seen = time.monotonic()
+            self._devices.move_to_end(device_id)
+            return state
+
+        # evicted but not persisted yet → newer than anything in the DB
+        pending = self._evicted.pop(device_id, None)
+        if pending is not None:
+            snapshot = pending
+
+        if snapshot:
+            engine = MetricsEngine.from_snapshot(snapshot.get("engine", {}))
+            state = DeviceMetrics(device_id, engine, snapshot.get("last_chart_save_time"))
+        else:
+            state = DeviceMetrics(device_id, MetricsEngine())
+
+        self._devices[device_id] = state
+        return state
+
+    def pin(self, device_ids):
+        for device_id in device_ids:
+            self._pinned[device_id] = self._pinned.get(device_id, 0) + 1
+
+    def unpin(self, device_ids):
+        for device_id in device_ids:
+            count = self._pinned.get(device_id, 0) - 1
+            if count > 0:
+                self._pinned[device_id] = count
+            else:
+                self._pinned.pop(device_id, None)
+
+    def device_ids(self):
+        return list(self._devices)
+
+    def __contains__(self, device_id):
+        return device_id in self._devices
+
+    def __len__(self):
+        return len(self._devices)
+
+    # ----------------------------------------------------
+    # Eviction
+    # ----------------------------------------------------
+    def _on_evict(self, state):
+        if self.keep_snapshots:
+            self._evicted[state.device_id] = self.snapshot(state)
+
+    def snapshot(self, state):
+        return {
+            "deviceId": state.device_id,
+            "engine": state.engine.to_snapshot(),
+            "last_chart_save_time": state.last_chart_save_time,
+        }
+
+    def _evict(self, device_id):
+        self._on_evict(self._devices.pop(device_id))
+
+    def trim(self):
+        """
+        Apply the LRU bound (pinned engines are skipped). Returns how many.
+        """
+        excess = len(self._devices) - self.max_engines
+        if excess <= 0:
+            return 0
+
+        victims = [device_id for device_id in self._devices if device_id not in self._pinned][:excess]
+        for device_id in victims:
+            self._evict(device_id)
+        return len(victims)
+
+    def remove(self, device_id):
+        state = self._devices.pop(device_id, None)
+        if state is not None:
+            self._on_evict(state)
+
+    def has_pending(self, device_id):
+        return device_id in self._evicted
+
+    def sweep_due(self):
+        return time.monotonic() - self._last_sweep >= self.sweep_interval
+
+    def evict_idle(self):
+        """
+        Drop engines not fed for idle_timeout seconds. Returns how many.
+        """
+        now = time.monotonic()
+        self._last_sweep = now
+        evicted = 0
+
+        # LRU order → the idle ones are at the front
+        for device_id, state in list(self._devices.items()):
+            if now - state.last_seen < self.idle_timeout:
+                break
+            if device_id in self._pinned:
+                continue
+            self._evict(device_id)
+            evicted += 1
+
+        return evicted
+
+    def pop_evicted(self):
+        """
+        Snapshots of evicted engines (caller persists them).
+        """
+        evicted, self._evicted = self._evicted, {}
+        return list(evicted.values())
+
+
+# ----------------------------------------------------
+# MongoDB snapshot store (collection = db.metrics_snapshots)
+# ----------------------------------------------------
+async def load_device_metrics(registry, collection, device_id):
+    if device_id in registry or registry.has_pending(device_id) or not registry.keep_snapshots:
+        return registry.get(device_id)
+
+    snapshot = await collection.find_one({"deviceId": device_id})
+    return registry.get(device_id, snapshot)
+
+
+async def load_device_metrics_many(registry, collection, device_ids):
+    """
+    Batch version: one $in query for every device not in memory.
+    """
+    missing = [
+        device_id for device_id in device_ids
+        if device_id not in registry and not registry.has_pending(device_id)
+    ]
+
+    snapshots = {}
+    if missing and registry.keep_snapshots:
+        async for snapshot in collection.find({"deviceId": {"$in": missing}}):
+            snapshots[snapshot["deviceId"]] = snapshot
+
+    return {device_id: registry.get(device_id, snapshots.get(device_id)) for device_id in device_ids}
+
+
+async def persist_evicted(registry, collection):
+    snapshots = registry.pop_evicted()
+    for snapshot in snapshots:
+        await collection.replace_one({"deviceId": snapshot["deviceId"]}, snapshot, upsert=True)
+    return len(snapshots)
@@ -0,0 +1,71 @@
+# live_channels.py
+# ============================================
+# Open WebSocket connections per device, so the
+# server can push alerts on the same connection the
+# glasses stream readings on (readings_stream_controller).
+#
+# Publishing never waits on a client: a connection queues the
+# message in its own bounded outbox (drained by its sender
+# task), and a send that still takes longer than
+# LIVE_PUSH_TIMEOUT drops that connection. One stalled socket
+# can't hold up the alerts of every other device.
+# ============================================
+
+import asyncio
+import os
+
+LIVE_PUSH_TIMEOUT = float(os.getenv("LIVE_PUSH_TIMEOUT", "1"))   # seconds
+
+
+class LiveChannels:
+    def __init__(self, send_timeout=LIVE_PUSH_TIMEOUT):
+        self.send_timeout = send_timeout
+        self._channels = {}   # deviceId -> set of send callables
+
+    def register(self, device_id, send):
+        self._channels.setdefault(device_id, set()).add(send)
+
+    def unregister(self, device_id, send):
+        channels = self._channels.get(device_id)
+        if channels is None:
+            return
+        channels.discard(send)
+        if not channels:
+            del self._channels[device_id]
+
+    def is_connected(self, device_id):
+        return device_id in self._channels
+
+    async def publish(self, device_id, message):
+        """
+        Push to every open connection of this device. Returns how many got it.
+        A failed or slow send only drops that connection.
+        """
+        delivered = 0
+        for send in list(self._channels.get(device_id, ())):
+            try:
+                await asyncio.wait_for(send(message), self.send_timeout)
+                delivered += 1
+            except Exception:
+                self.unregister(device_id, send)
+        return delivered
+
+
+def notification_push(notification):
+    """
+    JSON-safe push message for a stored notification document.
+    """
+    created_at = notification.get("created_at")
+    return {
+        "type": "notification",
+        "id": str(notification.get("id") or notification.get("_id") or ""),
+        "kind": notification.get("type"),
+        "title": notification.get("title"),
+        "message": notification.get("message"),
+        "metric_name": notification.get("metric_name"),
+        "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+    }
+
+
+# Process-wide channels
+LIVE_CHANNELS = LiveChannels()
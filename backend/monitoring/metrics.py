@@ -9,66 +9,228 @@
 # - Blue light ratio
 # ============================================
 
+import bisect
+import os
 import time
+from collections import deque
+from datetime import datetime, timezone
+
+# Number of recent IBIs kept per device
+IBI_WINDOW = int(os.getenv("METRICS_IBI_WINDOW", "20"))
+
+# Sliding window for the blink rate (seconds)
+BLINK_RATE_WINDOW = float(os.getenv("METRICS_BLINK_RATE_WINDOW", "60"))
+
+
+def to_epoch_seconds(timestamp):
+    """
+    Reading timestamp (naive UTC datetime, ISO string or epoch) → epoch seconds.
+    """
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+class IBIWindow:
+    """
+    Last `size` IBIs with a running mean / sum of squared deviations
+    (sliding Welford), so latest, mean and variance are O(1) per blink,
+    and a sorted copy kept up to date on push (bisect), so a percentile
+    is a lookup instead of a sort.
+    """
+
+    __slots__ = ("values", "ordered", "mean", "m2")
+
+    def __init__(self, size=IBI_WINDOW, values=()):
+        self.values = deque(maxlen=size)
+        self.ordered = []
+        self.mean = 0.0
+        self.m2 = 0.0
+        for v in values:
+            self.push(v)
+
+    def push(self, x):
+        n = len(self.values)
+
+        if n < self.values.maxlen:
+            self.values.append(x)
+            bisect.insort(self.ordered, x)
+            delta = x - self.mean
+            self.mean += delta / (n + 1)
+            self.m2 += delta * (x - self.mean)
+            return
+
+        # full → replace the oldest value
+        old = self.values[0]
+        self.values.append(x)
+        del self.ordered[bisect.bisect_left(self.ordered, old)]
+        bisect.insort(self.ordered, x)
+        old_mean = self.mean
+        self.mean += (x - old) / n
+        self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        if self.m2 < 0:
+            self.m2 = 0.0   # float drift
+
+    def latest(self):
+        return self.values[-1] if self.values else None
+
+    def variance(self):
+        n = len(self.values)
+        return self.m2 / n if n else 0
+
+    def percentile(self, q):
+        if not self.values:
+            return None
+        ordered = self.ordered
+        k = (len(ordered) - 1) * q / 100
+        lo = int(k)
+        hi = min(lo + 1, len(ordered) - 1)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+    def __len__(self):
+        return len(self.values)
+
 
 class MetricsEngine:
-    def __init__(self):
-        # Store timestamps of last few blinks
+    __slots__ = (
+        "last_blink_time",
+        "ibi",
+        "blink_count",
+        "session_start_time",
+        "last_event_time",
+        "blink_times",
+        "rate_window",
+    )
+
+    def __init__(self, ibi_window=IBI_WINDOW, rate_window=BLINK_RATE_WINDOW):
+        # Timestamp of last blink + recent IBIs (for variance calculation)
         self.last_blink_time = None
-        self.ibi_values = []  # for variance calculation
+        self.ibi = IBIWindow(ibi_window)
 
         # Blink counters
         self.blink_count = 0
         self.session_start_time = time.time()
 
+        # Event time: latest reading timestamp seen (None → wall clock)
+        self.last_event_time = None
+
+        # Blink times inside the sliding rate window (oldest first)
+        self.blink_times = deque()
+        self.rate_window = rate_window
+
+    @property
+    def ibi_values(self):
+        return list(self.ibi.values)
+
+    @ibi_values.setter
+    def ibi_values(self, values):
+        self.ibi = IBIWindow(self.ibi.values.maxlen, values)
+
+    # ----------------------------------------------------
+    # Clock: reading timestamps when given, else wall clock
+    # ----------------------------------------------------
+    def now(self):
+        if self.last_event_time is not None:
+            return self.last_event_time
+        return time.time()
+
+    def _advance(self, timestamp):
+        """
+        Move the event clock to this reading. Returns (time, is_late).
+        """
+        if timestamp is None:
+            return time.time(), False
+
+        t = to_epoch_seconds(timestamp)
+
+        if self.last_event_time is None:
+            # first timestamped reading starts the session (replay / backfill)
+            if self.blink_count == 0:
+                self.session_start_time = t
+            self.last_event_time = t
+            return t, False
+
+        if t < self.last_event_time:
+            return self.last_event_time, True
+
+        self.last_event_time = t
+        return t, False
+
     # ----------------------------------------------------
     # Update blink metrics when blink.rawValue == 1
     # ----------------------------------------------------
-    def update_blink(self, blink_detected: bool):
-        current_time = time.time()
+    def update_blink(self, blink_detected: bool, timestamp=None):
+        current_time, late = self._advance(timestamp)
 
         if blink_detected:
             self.blink_count += 1
+            self.blink_times.append(current_time)
 
-            if self.last_blink_time is not None:
-                ibi = current_time - self.last_blink_time
-                self.ibi_values.append(ibi)
+            # a late reading would give a negative / wrong IBI
+            if self.last_blink_time is not None and not late:
+                self.ibi.push(current_time - self.last_blink_time)
 
-                # Limit to recent 20 values only
-                if len(self.ibi_values) > 20:
-                    self.ibi_values.pop(0)
+            if not late:
+                self.last_blink_time = current_time
 
-            self.last_blink_time = current_time
+        self._expire(current_time)
+
+    def _expire(self, now):
+        cutoff = now - self.rate_window
+        while self.blink_times and self.blink_times[0] <= cutoff:
+            self.blink_times.popleft()
 
     # ----------------------------------------------------
     # Calculate blink rate (blinks per minute)
     # ----------------------------------------------------
     def calculate_blink_rate(self):
-        minutes = (time.time() - self.session_start_time) / 60
+        # session average
+        minutes = (self.now() - self.session_start_time) / 60
         if minutes == 0:
             return 0
         return self.blink_count / minutes
 
+    def window_blink_rate(self):
+        """
+        Blinks per minute over the last rate_window seconds
+        (or the whole session while it is shorter than the window).
+        """
+        now = self.now()
+        self._expire(now)
+
+        seconds = min(self.rate_window, now - self.session_start_time)
+        if seconds <= 0:
+            return 0
+        return len(self.blink_times) * 60 / seconds
+
     # ----------------------------------------------------
     # Calculate IBI metrics
     # ----------------------------------------------------
     def get_latest_ibi(self):
-        if not self.ibi_values:
+        return self.ibi.latest()
+
+    def ibi_mean(self):
+        if not len(self.ibi):
             return None
-        return self.ibi_values[-1]
+        return self.ibi.mean
 
     def ibi_variance(self):
-        if len(self.ibi_values) < 3:
+        if len(self.ibi) < 3:
             return 0
-        mean = sum(self.ibi_values) / len(self.ibi_values)
-        var = sum((x - mean) ** 2 for x in self.ibi_values) / len(self.ibi_values)
-        return var
+        return self.ibi.variance()
+
+    def ibi_percentile(self, q):
+        return self.ibi.percentile(q)
 
     # ----------------------------------------------------
     # Session time (used for long-exposure warnings)
     # ----------------------------------------------------
     def get_session_time_minutes(self):
-        return (time.time() - self.session_start_time) / 60
+        return (self.now() - self.session_start_time) / 60
 
     # ----------------------------------------------------
     # Ambient light estimation (lux)
@@ -85,3 +247,28 @@ class MetricsEngine:
         if total == 0:
             return 0
         return b / total
+
+    # ----------------------------------------------------
+    # Snapshot / restore (engine registry eviction)
+    # ----------------------------------------------------
+    def to_snapshot(self):
+        return {
+            "last_blink_time": self.last_blink_time,
+            "ibi_values": list(self.ibi_values),
+            "blink_count": self.blink_count,
+            "session_start_time": self.session_start_time,
+            "last_event_time": self.last_event_time,
+            "blink_times": list(self.blink_times),
+            "rate_window": self.rate_window,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot, ibi_window=IBI_WINDOW):
+        engine = cls(ibi_window, snapshot.get("rate_window", BLINK_RATE_WINDOW))
+        engine.last_blink_time = snapshot.get("last_blink_time")
+        engine.ibi_values = snapshot.get("ibi_values", [])
+        engine.blink_count = snapshot.get("blink_count", 0)
+        engine.session_start_time = snapshot.get("session_start_time", engine.session_start_time)
+        engine.last_event_time = snapshot.get("last_event_time")
+        engine.blink_times.extend(snapshot.get("blink_times", []))
+        return engine
@@ -1,169 +1,454 @@
 import asyncio
 from database import db
-from monitoring.metrics import MetricsEngine
-from monitoring.rules import evaluate_rules
-from Controllers.chart_metrics_controller import create_chart_metric
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from monitoring.batching import next_batch, WATCH_BATCH_SIZE, WATCH_BATCH_MAX_WAIT_MS, WATCH_CATCHUP_BATCH_SIZE
+from monitoring.resume_tokens import ResumeTokenStore, WATCH_RESUME_ENABLED
+from monitoring.partitions import PartitionLeaseManager, LeaseTokenStore, keep_leases, WATCH_PARTITIONED
+from monitoring.reading_store import readings_collection, change_stream_match, readings_from_change
+from monitoring.engine_registry import MetricsEngineRegistry, load_device_metrics_many, persist_evicted
+from monitoring.device_registry import DEVICE_REGISTRY
+from monitoring.direct_pipeline import DIRECT_PIPELINE
+from monitoring.live_channels import LIVE_CHANNELS, notification_push
+from monitoring.rules import evaluate_rules, in_alert_zone
+from monitoring.sampling import SamplingState, blink_rate_scale, SAMPLING_ADAPTIVE_ENABLED
+from Controllers.chart_metrics_controller import create_chart_metrics_many
+from Controllers.notification_controller import push_notifications_many
 from datetime import datetime
 
-async def watch_database():
-    print("👀 Watching MongoDB for new sensor data...")
-
-    metrics_engine = MetricsEngine()
-    last_chart_save_time = datetime.utcnow()
-    pipeline = [{"$match": {"operationType": "insert"}}]
-
-    async with db.raw_readings.watch(pipeline) as stream:
-        async for change in stream:
-            doc = change["fullDocument"]
-            device_id = doc["deviceId"]
-            data = doc.get("data", {})
-
-            # ------------------------------
-            # Load device from devices collection
-            # Only continue if this device is currently linked
-            # ------------------------------
-            device = await db["devices"].find_one({
+# InvalidResumeToken, ChangeStreamFatalError, ChangeStreamHistoryLost
+RESUME_TOKEN_ERRORS = (260, 280, 286)
+
+# One MetricsEngine per device (bounded, idle devices evicted),
+# shared by the change-stream watcher and the direct pipeline
+ENGINES = MetricsEngineRegistry()
+
+
+class WriteBatch:
+    """
+    Writes collected while processing one batch of readings,
+    sent with one round trip per collection in flush().
+    """
+
+    def __init__(self):
+        self.device_locks = []      # UpdateOne(...) for devices
+        self.locked_devices = []    # deviceIds locked by this batch
+        self.sensor_errors = []     # notification documents
+        self.shutdowns = []         # (device_id, user_id, form_id), same order as sensor_errors
+        self.alerts = []            # rule notification documents (evaluate_rules)
+        self.chart_metrics = []     # chart_metrics documents
+        self.sampling = {}          # deviceId -> new sampling advice
+
+    def alert_sink(self, device_id, device):
+        """
+        notify callback for evaluate_rules: the device's alerts are
+        stored with the batch's other notifications.
+        """
+        def notify(notification):
+            now = datetime.utcnow()
+            notification.update({
                 "deviceId": device_id,
-                "is_linked": True
+                "user_id": device.get("user_id"),
+                "form_id": device.get("form_id"),
+                "created_at": now,
+                "updated_at": now,
             })
+            self.alerts.append(notification)
+
+        return notify
+
+    async def flush(self):
+        # Lock devices before the user gets the notification (same order as before)
+        if self.device_locks:
+            await db["devices"].bulk_write(self.device_locks, ordered=True)
+            for device_id in self.locked_devices:
+                DEVICE_REGISTRY.update(device_id, {"power": True, "errorLock": True})
+
+        # sensor errors + rule alerts: one insert
+        notifications = self.sensor_errors + self.alerts
+        if notifications:
+            result = await db["notifications"].insert_many(notifications)
+
+            # Start auto shutdown timers (sensor errors come first)
+            for notification_id, (device_id, user_id, form_id) in zip(result.inserted_ids, self.shutdowns):
+                asyncio.create_task(auto_shutdown(notification_id, device_id, user_id, form_id))
+
+            for notification_id, notification in zip(result.inserted_ids, notifications):
+                if LIVE_CHANNELS.is_connected(notification["deviceId"]):
+                    notification["id"] = notification_id
+                    await LIVE_CHANNELS.publish(notification["deviceId"], notification_push(notification))
+
+            if self.alerts:
+                await push_notifications_many(self.alerts)
+
+        # Adaptive sampling: stored on the device (every worker answers with it) + pushed
+        if self.sampling:
+            await db["devices"].bulk_write(
+                [UpdateOne({"deviceId": device_id}, {"$set": {"sampling": advice}}) for device_id, advice in self.sampling.items()],
+                ordered=False,
+            )
+            for device_id, advice in self.sampling.items():
+                DEVICE_REGISTRY.update(device_id, {"sampling": advice})
+                if LIVE_CHANNELS.is_connected(device_id):
+                    await LIVE_CHANNELS.publish(device_id, {"type": "sampling", **advice})
+
+        if self.chart_metrics:
+            await create_chart_metrics_many(self.chart_metrics)
+            print(f"📊 {len(self.chart_metrics)} chart metrics snapshot(s) saved")
+
+
+async def watch_database(
+    batch_size=WATCH_BATCH_SIZE,
+    max_wait_ms=WATCH_BATCH_MAX_WAIT_MS,
+    catchup_batch_size=WATCH_CATCHUP_BATCH_SIZE,
+    resume=WATCH_RESUME_ENABLED,
+    partitioned=WATCH_PARTITIONED,
+):
+    print(f"👀 Watching MongoDB for new sensor data (batches of up to {batch_size}, {max_wait_ms} ms)...")
+
+    engines = ENGINES
+    options = (batch_size, max_wait_ms, catchup_batch_size)
+
+    # Several workers → each one only consumes the partitions it holds a lease on
+    if partitioned:
+        await watch_partitions(engines, resume, *options)
+        return
 
-            # Device not linked → ignore data
-            if not device:
-                print("⚠️ Device not linked → ignoring data")
-                continue
-
-            # Device OFF → ignore data
-            if device.get("power") == False:
-                print("🔌 Device OFF → ignoring data")
-                continue
-
-            # Error lock active → ignore everything until user responds
-            if device.get("errorLock", False):
-                print("🔒 Error lock active → waiting for user response")
-                continue
-
-            # ------------------------------
-            # Metrics calculation
-            # ------------------------------
-            blink_raw = data.get("ir", {}).get("rawValue", 0)
-            metrics_engine.update_blink(blink_raw == 1)
-
-            rgb = data.get("rgb", {})
-            r, g, b = rgb.get("r", 0), rgb.get("g", 0), rgb.get("b", 0)
-            clear = rgb.get("clear", 0)
-
-            lux = metrics_engine.calculate_lux(clear)
-            blue_ratio = metrics_engine.calculate_blue_ratio(r, g, b)
-
-            metrics = {
-                "ibi": metrics_engine.get_latest_ibi(),
-                "blink_rate": metrics_engine.calculate_blink_rate(),
-                "ibi_variance": metrics_engine.ibi_variance(),
-                "lux": lux,
-                "blue_ratio": blue_ratio,
-                "session_time": metrics_engine.get_session_time_minutes()
-            }
-
-            # ------------------------------
-            # Incorrect Data Detection
-            # ------------------------------
-            incorrect_detected = False
-            reasons = []
-
-            if metrics["blink_rate"] == 0 and metrics["session_time"] > 1:
-                incorrect_detected = True
-                reasons.append("No blinks detected")
-
-            if metrics["ibi"] == 0 or metrics["ibi_variance"] == 0:
-                incorrect_detected = True
-                reasons.append("Abnormal IBI readings")
-
-            if lux == 0 or lux > 2000:
-                incorrect_detected = True
-                reasons.append("Invalid light sensor readings")
-
-            if not (0 <= blue_ratio <= 1):
-                incorrect_detected = True
-                reasons.append("Invalid RGB sensor readings")
-
-            # ------------------------------
-            # Handle incorrect data
-            # ------------------------------
-            if incorrect_detected:
-                message = "Device may not be worn properly"
-                if reasons:
-                    message += f" ({', '.join(reasons)})"
-
-                print("❌ Incorrect data detected:", reasons)
-
-                # Lock device temporarily until user reads notification
-                await db["devices"].update_one(
-                    {
-                        "deviceId": device_id,
-                        "user_id": device["user_id"],
-                        "form_id": device["form_id"]
-                    },
-                    {"$set": {
-                        "power": True,          # keep device ON so user can be alerted
-                        "errorLock": True,      # prevent further processing until user responds
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
-
-                # Create sensor error notification
-                result = await db["notifications"].insert_one({
-                    "user_id": device.get("user_id"),
-                    "form_id": device.get("form_id"),
-                    "deviceId": device_id,
-                    "title": "Incorrect Sensor Data",
-                    "message": message,
-                    "timestamp": doc.get("timestamp", datetime.utcnow()),
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow(),
-                    "isRead": False,
-                    "type": "sensor_error"
-                })
-
-                # Start auto shutdown timer
-                asyncio.create_task(
-                    auto_shutdown(
-                        result.inserted_id,
-                        device_id,
-                        device["user_id"],
-                        device["form_id"]
-                    )
-                )
-
-                continue  # stop here if incorrect data detected
-
-            # ------------------------------
-            # Normal behavior (rules evaluation)
-            # ------------------------------
-            await evaluate_rules(metrics)
-
-            # ------------------------------
-            # Save chart metrics every 5 minutes
-            # ------------------------------
-            now = datetime.utcnow()
-            minutes_passed = (now - last_chart_save_time).total_seconds() / 60
-
-            if minutes_passed >= 5:
-                await create_chart_metric({
-                    "deviceId": device_id,
-                    "user_id": device.get("user_id"),
-                    "form_id": device.get("form_id"),
-                    "timestamp": now,
-                    "blink_count": metrics_engine.blink_count,
-                    "blink_rate": metrics["blink_rate"],
-                    "latest_ibi": metrics["ibi"],
-                    "avg_ibi": None,
-                    "lux": metrics["lux"],
-                    "blue_ratio": metrics["blue_ratio"],
-                    "bucket_minutes": 5,
-                })
-
-                print("📊 Chart metrics snapshot saved")
-                last_chart_save_time = now
+    pipeline = [change_stream_match()]
+    tokens = ResumeTokenStore(db.watcher_state, readings_collection(db).name)
+    await watch_stream(pipeline, engines, tokens, resume, *options)
+
+
+async def watch_stream(pipeline, engines, tokens, resume, batch_size, max_wait_ms, catchup_batch_size):
+    # Resume after the last processed event → readings inserted while down are not lost
+    resume_token = await tokens.load() if resume else None
+
+    while True:
+        try:
+            await consume_stream(pipeline, engines, tokens, resume_token, batch_size, max_wait_ms, catchup_batch_size)
+            return
+        except OperationFailure as e:
+            # token no longer in the oplog (or invalid) → start from now
+            if resume_token is None or e.code not in RESUME_TOKEN_ERRORS:
+                raise
+            print(f"⚠️ Cannot resume change stream ({e.code}) → starting from current position")
+            await tokens.clear()
+            resume_token = None
+
+
+async def watch_partitions(engines, resume, *options):
+    leases = PartitionLeaseManager(db.watcher_leases, db.watcher_workers)
+    consumer = None
+
+    # renewal never waits for the consumer (slow batch, restart)
+    keeper = asyncio.create_task(keep_leases(leases))
+
+    # direct pipeline: only readings of partitions owned here
+    DIRECT_PIPELINE.owns = leases.owns
+
+    try:
+        while True:
+            if await leases.heartbeat():
+                # partitions changed → restart the stream with the new filter
+                await stop_consumer(consumer)
+                consumer = None
+
+                # hand over engines of devices now owned by another worker
+                for device_id in engines.device_ids():
+                    if not leases.owns(device_id):
+                        engines.remove(device_id)
+                await persist_evicted(engines, db.metrics_snapshots)
+
+                print(f"🧩 Worker {leases.worker_id} owns partitions {sorted(leases.owned)}")
+
+                if leases.owned:
+                    consumer = asyncio.create_task(watch_stream(
+                        [change_stream_match(leases.owned)],
+                        engines,
+                        LeaseTokenStore(leases),
+                        resume,
+                        *options,
+                    ))
+
+            elif consumer is not None and consumer.done():
+                consumer.result()   # re-raise if the stream failed
+                return
+
+            await asyncio.sleep(leases.heartbeat_interval)
+    finally:
+        DIRECT_PIPELINE.owns = lambda device_id: False
+        await stop_consumer(consumer)
+        await stop_consumer(keeper)
+        await leases.release_all()
+
+
+async def stop_consumer(consumer):
+    if consumer is None:
+        return
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+
+
+async def consume_stream(pipeline, engines, tokens, resume_token, batch_size, max_wait_ms, catchup_batch_size):
+    # Backlog since the last run is drained in large batches before going live
+    catching_up = resume_token is not None and catchup_batch_size > batch_size
+    if resume_token is not None:
+        print("⏩ Resuming change stream" + (f" (catch-up batches of {catchup_batch_size})" if catching_up else ""))
+
+    # raw_readings, or raw_reading_buckets in bucket storage mode
+    stream = readings_collection(db).watch(
+        pipeline,
+        resume_after=resume_token,
+        max_await_time_ms=max_wait_ms,
+        batch_size=catchup_batch_size if catching_up else None,
+    )
+
+    try:
+        async with stream:
+            while True:
+                size = catchup_batch_size if catching_up else batch_size
+                changes = await next_batch(stream, size, max_wait_ms)
+                if not changes:
+                    break
+
+                # ------------------------------
+                # Evict idle devices + persist their snapshots
+                # ------------------------------
+                if engines.sweep_due():
+                    evicted = engines.evict_idle()
+                    await persist_evicted(engines, db.metrics_snapshots)
+                    if evicted:
+                        print(f"🧹 Evicted {evicted} idle device engine(s), {len(engines)} active")
+
+                # partitioned: already processed by a previous owner / lease lost
+                docs = [doc for change in changes if not tokens.skip(change) for doc in readings_from_change(change)]
+
+                # direct readings: only the ones the in-process run didn't do
+                docs = await DIRECT_PIPELINE.unhandled(docs)
+                if docs:
+                    await process_batch(docs, engines)
+
+                # the batch is fully written → safe to move the resume point
+                await tokens.advance(changes[-1]["_id"], len(changes))
+
+                if catching_up and len(changes) < size:
+                    catching_up = False
+                    print("✅ Change stream caught up → live mode")
+    finally:
+        await tokens.save()
+
+
+async def process_batch(docs, engines):
+    """
+    Run one micro-batch of raw readings (in stream order).
+    """
+    # ------------------------------
+    # Load all devices of the batch (device cache, one query for misses)
+    # Only continue for devices currently linked
+    # ------------------------------
+    device_ids = list({doc["deviceId"] for doc in docs})
+    cached = await DEVICE_REGISTRY.get_many(device_ids)
+
+    # copies: the batch marks error locks before they are written
+    devices = {
+        device_id: dict(device)
+        for device_id, device in cached.items()
+        if device and device.get("is_linked") is True
+    }
+
+    await process_docs(docs, devices, engines)
+
+
+async def process_direct_batch(items, engines=ENGINES):
+    """
+    Direct pipeline batch: [(doc, device), ...] from create_reading,
+    device already loaded there → no second lookup.
+    """
+    devices = {}
+    for doc, device in items:
+        devices.setdefault(doc["deviceId"], dict(device))
+
+    await process_docs([doc for doc, _ in items], devices, engines)
+
+
+async def process_docs(docs, devices, engines):
+    # engines of this batch can't be evicted until it is done
+    device_ids = list(devices)
+    engines.pin(device_ids)
+    try:
+        states = await load_device_metrics_many(engines, db.metrics_snapshots, device_ids)
+        await process_loaded_docs(docs, devices, states)
+    finally:
+        engines.unpin(device_ids)
+
+    # LRU bound, applied between batches
+    engines.trim()
+
+
+async def process_loaded_docs(docs, devices, states):
+    writes = WriteBatch()
+
+    for doc in docs:
+        device = devices.get(doc["deviceId"])
+
+        # Device not linked → ignore data
+        if not device:
+            print("⚠️ Device not linked → ignoring data")
+            continue
+
+        # Device OFF → ignore data
+        if device.get("power") == False:
+            print("🔌 Device OFF → ignoring data")
+            continue
+
+        # Error lock active → ignore everything until user responds
+        if device.get("errorLock", False):
+            print("🔒 Error lock active → waiting for user response")
+            continue
+
+        await process_reading(doc, device, states[doc["deviceId"]], writes)
+
+    await writes.flush()
+
+
+async def process_reading(doc, device, device_metrics, writes):
+    device_id = doc["deviceId"]
+    data = doc.get("data", {})
+
+    # ------------------------------
+    # Metrics calculation (this device's engine only)
+    # ------------------------------
+    metrics_engine = device_metrics.engine
+    if device_metrics.last_chart_save_time is None:
+        device_metrics.last_chart_save_time = doc.get("timestamp") or datetime.utcnow()
+
+    blink_raw = data.get("ir", {}).get("rawValue", 0)
+    # event time = the reading's own timestamp (replay / bursts stay correct)
+    metrics_engine.update_blink(blink_raw == 1, doc.get("timestamp"))
+
+    rgb = data.get("rgb", {})
+    r, g, b = rgb.get("r", 0), rgb.get("g", 0), rgb.get("b", 0)
+    clear = rgb.get("clear", 0)
+
+    lux = metrics_engine.calculate_lux(clear)
+    blue_ratio = metrics_engine.calculate_blue_ratio(r, g, b)
+
+    metrics = {
+        "ibi": metrics_engine.get_latest_ibi(),
+        # session average: the "no blinks at all" check + chart metrics
+        "blink_rate": metrics_engine.calculate_blink_rate(),
+        # last rate_window seconds, for the rules; sampled slower than
+        # the fastest interval → fewer blinks seen, scaled back
+        "window_blink_rate": metrics_engine.window_blink_rate() * blink_rate_scale(device),
+        "ibi_variance": metrics_engine.ibi_variance(),
+        "lux": lux,
+        "blue_ratio": blue_ratio,
+        "session_time": metrics_engine.get_session_time_minutes()
+    }
+
+    # ------------------------------
+    # Incorrect Data Detection
+    # ------------------------------
+    incorrect_detected = False
+    reasons = []
+
+    if metrics["blink_rate"] == 0 and metrics["session_time"] > 1:
+        incorrect_detected = True
+        reasons.append("No blinks detected")
+
+    if metrics["ibi"] == 0 or metrics["ibi_variance"] == 0:
+        incorrect_detected = True
+        reasons.append("Abnormal IBI readings")
+
+    if lux == 0 or lux > 2000:
+        incorrect_detected = True
+        reasons.append("Invalid light sensor readings")
+
+    if not (0 <= blue_ratio <= 1):
+        incorrect_detected = True
+        reasons.append("Invalid RGB sensor readings")
+
+    # ------------------------------
+    # Handle incorrect data
+    # ------------------------------
+    if incorrect_detected:
+        message = "Device may not be worn properly"
+        if reasons:
+            message += f" ({', '.join(reasons)})"
+
+        print("❌ Incorrect data detected:", reasons)
+
+        # Lock device temporarily until user reads notification
+        writes.device_locks.append(UpdateOne(
+            {
+                "deviceId": device_id,
+                "user_id": device["user_id"],
+                "form_id": device["form_id"]
+            },
+            {"$set": {
+                "power": True,          # keep device ON so user can be alerted
+                "errorLock": True,      # prevent further processing until user responds
+                "updated_at": datetime.utcnow()
+            }}
+        ))
+
+        # later readings of this device in the same batch see the lock
+        device["errorLock"] = True
+        writes.locked_devices.append(device_id)
+
+        # Create sensor error notification
+        writes.sensor_errors.append({
+            "user_id": device.get("user_id"),
+            "form_id": device.get("form_id"),
+            "deviceId": device_id,
+            "title": "Incorrect Sensor Data",
+            "message": message,
+            "timestamp": doc.get("timestamp", datetime.utcnow()),
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "isRead": False,
+            "type": "sensor_error"
+        })
+        writes.shutdowns.append((device_id, device["user_id"], device["form_id"]))
+
+        return  # stop here if incorrect data detected
+
+    # ------------------------------
+    # Normal behavior (rules evaluation)
+    # ------------------------------
+    await evaluate_rules(metrics, writes.alert_sink(device_id, device))
+
+    # ------------------------------
+    # Adaptive sampling advice (only written when the interval changes)
+    # ------------------------------
+    if SAMPLING_ADAPTIVE_ENABLED:
+        if device_metrics.sampling is None:
+            device_metrics.sampling = SamplingState()
+        advice = device_metrics.sampling.update(metrics, in_alert_zone(metrics))
+        if advice is not None and (device.get("sampling") or {}).get("interval_ms") != advice["interval_ms"]:
+            writes.sampling[device_id] = advice
+
+    # ------------------------------
+    # Save chart metrics every 5 minutes
+    # ------------------------------
+    now = doc.get("timestamp") or datetime.utcnow()
+    minutes_passed = (now - device_metrics.last_chart_save_time).total_seconds() / 60
+
+    if minutes_passed >= 5:
+        writes.chart_metrics.append({
+            "deviceId": device_id,
+            "user_id": device.get("user_id"),
+            "form_id": device.get("form_id"),
+            "timestamp": now,
+            "blink_count": metrics_engine.blink_count,
+            "blink_rate": metrics["blink_rate"],
+            "latest_ibi": metrics["ibi"],
+            "avg_ibi": metrics_engine.ibi_mean(),
+            "lux": metrics["lux"],
+            "blue_ratio": metrics["blue_ratio"],
+            "bucket_minutes": 5,
+        })
+        device_metrics.last_chart_save_time = now
 
 
 async def auto_shutdown(notification_id, device_id, user_id, form_id):
@@ -178,13 +463,9 @@ async def auto_shutdown(notification_id, device_id, user_id, form_id):
         return
 
     # Get the same device linked to this user + form
-    device = await db["devices"].find_one({
-        "deviceId": device_id,
-        "user_id": user_id,
-        "form_id": form_id
-    })
+    device = await DEVICE_REGISTRY.get(device_id)
 
-    if not device:
+    if not device or device.get("user_id") != user_id or device.get("form_id") != form_id:
         return
 
     # If error lock is already cleared, do not shut down
@@ -206,4 +487,5 @@ async def auto_shutdown(notification_id, device_id, user_id, form_id):
             "errorLock": False,
             "updated_at": datetime.utcnow()
         }}
-    )
\ No newline at end of file
+    )
+    DEVICE_REGISTRY.update(device_id, {"power": False, "errorLock": False})
\ No newline at end of file
@@ -0,0 +1,277 @@
+# partitions.py
+# ============================================
+# Partitioned change-stream consumption:
+# - every raw reading carries partition = hash(deviceId) % N
+# - workers (uvicorn processes / nodes) claim partitions
+#   through leases in db.watcher_leases, renewed by heartbeat
+# - a worker only watches readings of its own partitions,
+#   so each reading is processed once across all workers
+# - expired leases (crashed worker) are taken over, and
+#   partitions are rebalanced when workers join or leave
+# - leases are renewed by their own task (keep_leases), so a
+#   slow batch or a consumer restart can't let them expire
+# - every lease keeps the resume token of its partition; events
+#   a previous owner already processed are skipped on resume
+# ============================================
+
+import asyncio
+import math
+import os
+import socket
+import zlib
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from monitoring.resume_tokens import ResumeTokenStore
+
+WATCH_PARTITIONED = os.getenv("WATCH_PARTITIONED", "false").lower() == "true"
+WATCH_PARTITIONS = int(os.getenv("WATCH_PARTITIONS", "8"))
+WATCH_LEASE_TTL = float(os.getenv("WATCH_LEASE_TTL", "30"))  # seconds
+WATCH_WORKER_ID = os.getenv("WATCH_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def partition_of(device_id, partitions=WATCH_PARTITIONS):
+    # crc32, not hash(): must be the same in every process
+    return zlib.crc32(str(device_id).encode("utf-8")) % partitions
+
+
+def change_partition(change):
+    """
+    Partition of a raw readings change event (bucket _id or reading field).
+    """
+    key = (change.get("documentKey") or {}).get("_id")
+    if isinstance(key, dict) and "p" in key:
+        return key["p"]
+    return (change.get("fullDocument") or {}).get("partition", 0)
+
+
+def token_position(token):
+    # resume token keys sort by cluster time
+    return token["_data"]
+
+
+def partition_match(owned):
+    """
+    Change-stream $match for the given partitions.
+    Readings stored before partitioning (no field) belong to partition 0.
+    """
+    owned = sorted(owned)
+    conditions = [{"fullDocument.partition": {"$in": owned}}]
+    if 0 in owned:
+        conditions.append({"fullDocument.partition": {"$exists": False}})
+
+    return {"$match": {"operationType": "insert", "$or": conditions}}
+
+
+class PartitionLeaseManager:
+    """
+    Lease documents (one per partition):
+      {"_id": partition, "owner": worker_id, "expires_at": datetime, "resume_token": {...}}
+    Worker documents (db.watcher_workers) count live workers for the fair share.
+    """
+
+    def __init__(
+        self,
+        leases,
+        workers,
+        worker_id=WATCH_WORKER_ID,
+        partitions=WATCH_PARTITIONS,
+        ttl=WATCH_LEASE_TTL,
+    ):
+        self.leases = leases
+        self.workers = workers
+        self.worker_id = worker_id
+        self.partitions = partitions
+        self.ttl = ttl
+
+        self.owned = set()
+
+    @property
+    def heartbeat_interval(self):
+        return self.ttl / 3
+
+    def owns(self, device_id):
+        return partition_of(device_id, self.partitions) in self.owned
+
+    async def _live_workers(self, now):
+        await self.workers.update_one(
+            {"_id": self.worker_id},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl)}},
+            upsert=True,
+        )
+        return max(1, await self.workers.count_documents({"expires_at": {"$gt": now}}))
+
+    async def _claim(self, partition, now):
+        try:
+            result = await self.leases.update_one(
+                {
+                    "_id": partition,
+                    "$or": [
+                        {"owner": self.worker_id},
+                        {"owner": None},
+                        {"expires_at": {"$lt": now}},
+                    ],
+                },
+                {"$set": {"owner": self.worker_id, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # lease exists and another live worker holds it
+            return False
+        return result.matched_count == 1 or result.upserted_id is not None
+
+    async def renew(self):
+        """
+        Extend this worker's own leases (no rebalancing).
+        """
+        now = datetime.utcnow()
+        await self.workers.update_one(
+            {"_id": self.worker_id},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl)}},
+            upsert=True,
+        )
+        if self.owned:
+            await self.leases.update_many(
+                {"_id": {"$in": sorted(self.owned)}, "owner": self.worker_id},
+                {"$set": {"expires_at": now + timedelta(seconds=self.ttl)}},
+            )
+
+    async def heartbeat(self):
+        """
+        Renew own leases, give back partitions above the fair share and
+        claim free / expired ones up to it. Returns True if ownership changed.
+        """
+        now = datetime.utcnow()
+        before = set(self.owned)
+        share = math.ceil(self.partitions / await self._live_workers(now))
+
+        # renew (a lease lost to a takeover drops out here)
+        await self.leases.update_many(
+            {"owner": self.worker_id},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl)}},
+        )
+        owned = set()
+        async for lease in self.leases.find({"owner": self.worker_id}, {"_id": 1}):
+            owned.add(lease["_id"])
+
+        # too many (new worker joined) → release the extra ones
+        excess = sorted(owned)[share:]
+        if excess:
+            await self.release(excess)
+            owned -= set(excess)
+
+        # too few → claim free or expired partitions
+        if len(owned) < share:
+            taken = set()
+            async for lease in self.leases.find(
+                {"owner": {"$ne": None}, "expires_at": {"$gte": now}}, {"_id": 1}
+            ):
+                taken.add(lease["_id"])
+
+            for partition in range(self.partitions):
+                if len(owned) >= share:
+                    break
+                if partition in owned or partition in taken:
+                    continue
+                if await self._claim(partition, now):
+                    owned.add(partition)
+
+        self.owned = owned
+        return owned != before
+
+    async def release(self, partitions=None):
+        partitions = list(self.owned if partitions is None else partitions)
+        if not partitions:
+            return
+
+        await self.leases.update_many(
+            {"_id": {"$in": partitions}, "owner": self.worker_id},
+            {"$set": {"owner": None, "expires_at": datetime.utcnow()}},
+        )
+        self.owned -= set(partitions)
+
+    async def release_all(self):
+        await self.release()
+        await self.workers.delete_one({"_id": self.worker_id})
+
+
+async def keep_leases(manager):
+    """
+    Renew the leases every heartbeat_interval, independent of the
+    consumer and of rebalancing (run as its own task).
+    """
+    while True:
+        await asyncio.sleep(manager.heartbeat_interval)
+        try:
+            await manager.renew()
+        except Exception as e:
+            print(f"⚠️ Lease renewal failed: {e}")
+
+
+class LeaseTokenStore(ResumeTokenStore):
+    """
+    Resume tokens kept per partition on the lease documents, so a partition
+    that moves to another worker resumes where its previous owner stopped.
+
+    One stream covers all owned partitions and starts at the oldest of
+    their tokens; events of a partition at or before that partition's own
+    token were already processed and are skipped (skip()).
+    """
+
+    def __init__(self, manager, **kwargs):
+        super().__init__(manager.leases, manager.worker_id, **kwargs)
+        self.manager = manager
+        self.partitions = sorted(manager.owned)
+        self.ahead = {}     # partition -> its token, while ahead of the stream
+
+    async def load(self):
+        tokens = {}
+        async for lease in self.collection.find({"_id": {"$in": self.partitions}}, {"resume_token": 1}):
+            if lease.get("resume_token"):
+                tokens[lease["_id"]] = lease["resume_token"]
+
+        self.ahead = dict(tokens)
+        return min(tokens.values(), key=token_position) if tokens else None
+
+    def skip(self, change):
+        """
+        True for events not to process here: already processed for their
+        partition, or in a partition this worker no longer owns.
+        """
+        partition = change_partition(change)
+        if partition not in self.manager.owned:
+            return True
+
+        token = self.ahead.get(partition)
+        if token is None:
+            return False
+        if token_position(change["_id"]) <= token_position(token):
+            return True
+
+        del self.ahead[partition]
+        return False
+
+    async def _write(self, token):
+        # partitions still ahead of the stream keep their own token
+        for partition, ahead in list(self.ahead.items()):
+            if token_position(ahead) <= token_position(token):
+                del self.ahead[partition]
+
+        partitions = [p for p in self.partitions if p not in self.ahead]
+        if not partitions:
+            return
+
+        await self.collection.update_many(
+            {"_id": {"$in": partitions}, "owner": self.manager.worker_id},
+            {"$set": {"resume_token": token}},
+        )
+
+    async def clear(self):
+        self.token = None
+        self._unsaved = 0
+        self.ahead = {}
+        await self.collection.update_many(
+            {"_id": {"$in": self.partitions}, "owner": self.manager.worker_id},
+            {"$unset": {"resume_token": ""}},
+        )
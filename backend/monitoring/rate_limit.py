@@ -0,0 +1,137 @@
+# rate_limit.py
+# ============================================
+# Per-device admission control for readings ingestion
+# (POST /api/readings, /batch, /binary, WebSocket): one
+# token bucket per deviceId, kept in memory, checked
+# before the device lookup and the insert, so a looping
+# device is shed with a 429 at almost no cost and can't
+# slow down the rest of the fleet. A batch costs one
+# token per reading of the device.
+#
+# - rate:  tokens refilled per second (sustained readings/s)
+# - burst: bucket size (readings accepted at once)
+# - LRU bound on tracked devices (an unknown device starts full)
+# ============================================
+
+import os
+import time
+from collections import OrderedDict
+
+READINGS_RATE_LIMIT_ENABLED = os.getenv("READINGS_RATE_LIMIT_ENABLED", "true").lower() == "true"
+READINGS_RATE_LIMIT = float(os.getenv("READINGS_RATE_LIMIT", "20"))      # readings / second / device
+READINGS_RATE_BURST = float(os.getenv("READINGS_RATE_BURST", "60"))
+READINGS_RATE_LIMIT_DEVICES = int(os.getenv("READINGS_RATE_LIMIT_DEVICES", "100000"))
+
+
+class TokenBucketLimiter:
+    def __init__(
+        self,
+        rate=READINGS_RATE_LIMIT,
+        burst=READINGS_RATE_BURST,
+        max_devices=READINGS_RATE_LIMIT_DEVICES,
+        enabled=READINGS_RATE_LIMIT_ENABLED,
+        clock=time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_devices = max_devices
+        self.enabled = enabled
+        self.clock = clock
+
+        self._buckets = OrderedDict()   # deviceId -> [tokens, last refill, rejected]
+        self.allowed = 0
+        self.rejected = 0
+
+    def _refill(self, device_id):
+        now = self.clock()
+        bucket = self._buckets.get(device_id)
+
+        if bucket is None:
+            bucket = [self.burst, now, 0]
+            self._buckets[device_id] = bucket
+            while len(self._buckets) > self.max_devices:
+                self._buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(device_id)
+
+        return bucket
+
+    def _wait(self, missing):
+        if self.rate <= 0:
+            return float("inf")
+        return missing / self.rate
+
+    def acquire(self, device_id, cost=1.0):
+        """
+        Take `cost` tokens. Returns 0 if admitted, else the seconds
+        until enough tokens are back (for Retry-After).
+        """
+        if not self.enabled:
+            return 0.0
+
+        bucket = self._refill(device_id)
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return 0.0
+
+        bucket[2] += 1
+        self.rejected += 1
+        return self._wait(cost - bucket[0])
+
+    def acquire_many(self, device_id, count):
+        """
+        Batch of `count` readings, one token each: admits as many as
+        there are tokens (a batch larger than the burst still drains).
+        Returns (admitted, seconds until the next one is admitted).
+        """
+        if not self.enabled:
+            return count, 0.0
+
+        bucket = self._refill(device_id)
+        admitted = min(count, int(bucket[0]))
+        bucket[0] -= admitted
+        self.allowed += admitted
+
+        if admitted == count:
+            return count, 0.0
+
+        bucket[2] += count - admitted
+        self.rejected += count - admitted
+        return admitted, self._wait(1 - bucket[0])
+
+    def reset(self, device_id=None):
+        if device_id is None:
+            self._buckets.clear()
+        else:
+            self._buckets.pop(device_id, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    # ----------------------------------------------------
+    # Metrics
+    # ----------------------------------------------------
+    def stats(self, top=10):
+        shedding = sorted(
+            ((device_id, bucket[2]) for device_id, bucket in self._buckets.items() if bucket[2]),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:top]
+
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "burst": self.burst,
+            "tracked_devices": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "top_rejected_devices": [{"deviceId": d, "rejected": n} for d, n in shedding],
+        }
+
+
+# Process-wide limiter (per worker process)
+READINGS_RATE_LIMITER = TokenBucketLimiter()
@@ -0,0 +1,349 @@
+# reading_store.py
+# ============================================
+# Storage of raw readings, behind one interface:
+#
+# READINGS_STORAGE=documents (default)
+#   one document per sample in raw_readings
+#
+# READINGS_STORAGE=buckets
+#   one document per device per minute in raw_reading_buckets:
+#   {
+#     "_id": {"p": partition, "d": deviceId, "t": minute start},
+#     "deviceId", "user_id", "form_id", "partition", "start",
+#     "first", "last", "count", "last_push",
+#     "samples": [{"_id", "timestamp", "data"}, ...]
+#   }
+#   → far fewer documents and index entries per sample.
+#   A push only applies while its first sample isn't in the
+#   bucket yet, so a retried write can't add samples twice.
+#
+# The _id carries partition + deviceId so the watcher can
+# filter and route bucket update events without fetching
+# the full bucket. (A native time-series collection is not
+# used: change streams don't support them.)
+#
+# - store_readings(): write (insert_many / bucket upserts)
+# - find_readings(): read back as per-sample documents
+# - delete_readings(): remove old readings in bounded batches
+# - readings_from_change(): change event → new readings
+# ============================================
+
+import asyncio
+import os
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from monitoring.partitions import partition_match, partition_of
+
+READINGS_STORAGE = os.getenv("READINGS_STORAGE", "documents").lower()   # "documents" | "buckets"
+READINGS_COLLECTION = os.getenv("MONGODB_COLLECTION", "raw_readings")
+READINGS_BUCKET_COLLECTION = os.getenv("READINGS_BUCKET_COLLECTION", "raw_reading_buckets")
+
+
+def bucketed(storage=None):
+    return (storage or READINGS_STORAGE) == "buckets"
+
+
+def readings_collection(db, storage=None):
+    return db[READINGS_BUCKET_COLLECTION if bucketed(storage) else READINGS_COLLECTION]
+
+
+def bucket_start(timestamp):
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def bucket_id(device_id, start):
+    # field order matters for _id equality → always built here
+    return {"p": partition_of(device_id), "d": device_id, "t": start}
+
+
+# ----------------------------------------------------
+# Index bootstrap (startup)
+# ----------------------------------------------------
+async def ensure_reading_indexes(db, storage=None):
+    collection = readings_collection(db, storage)
+
+    if bucketed(storage):
+        await collection.create_index([("deviceId", ASCENDING), ("start", ASCENDING)])
+    else:
+        await collection.create_index([("deviceId", ASCENDING), ("timestamp", ASCENDING)])
+
+
+# ----------------------------------------------------
+# Write
+# ----------------------------------------------------
+async def store_readings(db, docs, retry=False, storage=None):
+    """
+    docs: reading documents (build_reading_doc). Returns {position: error}.
+    retry=True: docs already carry their _id, a duplicate key means an
+    earlier attempt stored it (buckets: see _store_buckets).
+    """
+    if not docs:
+        return {}
+
+    if bucketed(storage):
+        return await _store_buckets(readings_collection(db, storage), docs)
+
+    failed = {}
+    try:
+        await readings_collection(db, storage).insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if retry and error.get("code") == 11000:
+                continue
+            failed[error["index"]] = error.get("errmsg", "Insert failed")
+    return failed
+
+
+def _sample(doc):
+    sample = {"_id": doc.setdefault("_id", ObjectId()), "timestamp": doc["timestamp"], "data": doc["data"]}
+    if doc.get("direct"):
+        sample["direct"] = True
+    return sample
+
+
+async def _store_buckets(collection, docs):
+    # one upsert per (device, minute), readings kept in arrival order
+    groups = {}
+    for position, doc in enumerate(docs):
+        start = bucket_start(doc["timestamp"])
+        groups.setdefault((doc["deviceId"], start), []).append(position)
+
+    operations = []
+    positions = []
+    for (device_id, start), members in groups.items():
+        samples = [_sample(docs[position]) for position in members]
+        first = docs[members[0]]
+        timestamps = [sample["timestamp"] for sample in samples]
+
+        # one update = one atomic push → checking its first sample is enough
+        operations.append(UpdateOne(
+            {"_id": bucket_id(device_id, start), "samples._id": {"$ne": samples[0]["_id"]}},
+            {
+                "$setOnInsert": {
+                    "deviceId": device_id,
+                    "user_id": first.get("user_id"),
+                    "form_id": first.get("form_id"),
+                    "partition": partition_of(device_id),
+                    "start": start,
+                },
+                "$push": {"samples": {"$each": samples}},
+                "$inc": {"count": len(samples)},
+                "$min": {"first": min(timestamps)},
+                "$max": {"last": max(timestamps)},
+                "$set": {"last_push": len(samples)},
+            },
+            upsert=True,
+        ))
+        positions.append(members)
+
+    failed = {}
+    duplicates = _bulk_errors(await _bulk_write(collection, operations), positions, failed)
+
+    # duplicate _id: either the samples are already in the bucket (retry), or
+    # two writers created the bucket at once → run those upserts once more;
+    # the bucket exists then, so a duplicate now means "already stored"
+    if duplicates:
+        _bulk_errors(
+            await _bulk_write(collection, [operations[i] for i in duplicates]),
+            [positions[i] for i in duplicates],
+            failed,
+        )
+    return failed
+
+
+async def _bulk_write(collection, operations):
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        return e.details.get("writeErrors", [])
+    return []
+
+
+def _bulk_errors(errors, positions, failed):
+    """
+    Record bucket write errors in failed. Returns the operation indexes
+    that failed with a duplicate key.
+    """
+    duplicates = []
+    for error in errors:
+        if error.get("code") == 11000:
+            duplicates.append(error["index"])
+            continue
+        for position in positions[error["index"]]:
+            failed[position] = error.get("errmsg", "Insert failed")
+    return duplicates
+
+
+# ----------------------------------------------------
+# Read
+# ----------------------------------------------------
+def _unpack(bucket, samples=None):
+    device_id = bucket.get("deviceId") or bucket["_id"]["d"]
+    seen = set()
+
+    for sample in bucket.get("samples", []) if samples is None else samples:
+        # a retried write may have pushed the same sample twice
+        if sample["_id"] in seen:
+            continue
+        seen.add(sample["_id"])
+
+        doc = {
+            "_id": sample["_id"],
+            "deviceId": device_id,
+            "user_id": bucket.get("user_id"),
+            "form_id": bucket.get("form_id"),
+            "partition": bucket["_id"]["p"],
+            "timestamp": sample["timestamp"],
+            "data": sample["data"],
+        }
+        if sample.get("direct"):
+            doc["direct"] = True
+        yield doc
+
+
+async def find_readings(db, device_id, start=None, end=None, storage=None, max_id=None):
+    """
+    Readings of one device in [start, end), oldest first, as per-sample
+    documents in both storage modes.
+    max_id: only readings whose _id is below it (= ingested before it).
+    """
+    collection = readings_collection(db, storage)
+
+    if not bucketed(storage):
+        query = {"deviceId": device_id}
+        if max_id is not None:
+            query["_id"] = {"$lt": max_id}
+        if start is not None or end is not None:
+            query["timestamp"] = {}
+            if start is not None:
+                query["timestamp"]["$gte"] = start
+            if end is not None:
+                query["timestamp"]["$lt"] = end
+
+        async for doc in collection.find(query).sort("timestamp", ASCENDING):
+            yield doc
+        return
+
+    query = {"deviceId": device_id}
+    if start is not None or end is not None:
+        query["start"] = {}
+        if start is not None:
+            query["start"]["$gte"] = bucket_start(start)
+        if end is not None:
+            query["start"]["$lt"] = end
+
+    async for bucket in collection.find(query).sort("start", ASCENDING):
+        docs = sorted(_unpack(bucket), key=lambda doc: doc["timestamp"])
+        for doc in docs:
+            if start is not None and doc["timestamp"] < start:
+                continue
+            if end is not None and doc["timestamp"] >= end:
+                continue
+            if max_id is not None and doc["_id"] >= max_id:
+                continue
+            yield doc
+
+
+async def reading_device_ids(db, before, storage=None):
+    """
+    Devices with readings older than `before`.
+    """
+    field = "start" if bucketed(storage) else "timestamp"
+    return await readings_collection(db, storage).distinct("deviceId", {field: {"$lt": before}})
+
+
+async def delete_readings(db, device_id, before, batch_size=5000, pause_s=0.0, storage=None, max_id=None):
+    """
+    Delete one device's readings older than `before` (buckets: whole
+    buckets that start before it), batch_size documents per delete_many
+    so a large backlog doesn't hold the server. Returns how many documents.
+    max_id: only readings whose _id is below it; a bucket that also holds
+    newer samples keeps those (the older ones are pulled out of it).
+    """
+    collection = readings_collection(db, storage)
+    field = "start" if bucketed(storage) else "timestamp"
+    query = {"deviceId": device_id, field: {"$lt": before}}
+
+    if max_id is not None:
+        if bucketed(storage):
+            await _pull_samples(collection, dict(query, **{"samples._id": {"$gte": max_id}}), max_id)
+            query["samples"] = {"$not": {"$elemMatch": {"_id": {"$gte": max_id}}}}
+        else:
+            query["_id"] = {"$lt": max_id}
+
+    deleted = 0
+    while True:
+        ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return deleted
+
+        # query repeated: a document that changed since find() is left alone
+        result = await collection.delete_many(dict(query, _id=dict(query.get("_id", {}), **{"$in": ids})))
+        deleted += result.deleted_count
+
+        if len(ids) < batch_size:
+            return deleted
+        await asyncio.sleep(pause_s)
+
+
+async def _pull_samples(collection, query, max_id):
+    # last_push = 0 → the watcher doesn't take the rewritten array for new readings
+    older = {"$lt": ["$$sample._id", max_id]}
+    await collection.update_many(query, [
+        {"$set": {"samples": {"$filter": {"input": "$samples", "as": "sample", "cond": {"$not": [older]}}}}},
+        {"$set": {"count": {"$size": "$samples"}, "last_push": 0}},
+    ])
+
+
+# ----------------------------------------------------
+# Change stream
+# ----------------------------------------------------
+def change_stream_match(owned=None, storage=None):
+    """
+    $match stage for new readings (owned: partitions of this worker, None = all).
+    """
+    if not bucketed(storage):
+        if owned is None:
+            return {"$match": {"operationType": "insert"}}
+        return partition_match(owned)
+
+    match = {"operationType": {"$in": ["insert", "update"]}}
+    if owned is not None:
+        match["documentKey._id.p"] = {"$in": sorted(owned)}
+    return {"$match": match}
+
+
+def readings_from_change(change, storage=None):
+    """
+    Readings added by one change event (direct ones included: the watcher
+    checks them against the direct pipeline).
+    """
+    if not bucketed(storage):
+        return [change["fullDocument"]]
+
+    key = change["documentKey"]["_id"]
+    bucket = change.get("fullDocument") or {"_id": key}
+
+    if change["operationType"] == "insert":
+        samples = bucket.get("samples", [])
+    else:
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        if updated.get("last_push") == 0:
+            # old samples pulled out by compaction, nothing new
+            samples = []
+        elif "samples" in updated:
+            # whole array reported → the last push is at its end
+            samples = updated["samples"][-updated.get("last_push", len(updated["samples"])):]
+        else:
+            # $push reported per element: "samples.<index>"
+            pushed = sorted(
+                (int(field.split(".", 1)[1]), value)
+                for field, value in updated.items()
+                if field.startswith("samples.") and field.count(".") == 1
+            )
+            samples = [value for _, value in pushed]
+
+    return list(_unpack(bucket, samples))
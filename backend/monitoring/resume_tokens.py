@@ -0,0 +1,75 @@
+# resume_tokens.py
+# ============================================
+# Change-stream resume token persistence:
+# the watcher saves the token of the last processed
+# event (every N events or T seconds) and resumes
+# from it after a restart, so no reading is lost.
+# ============================================
+
+import os
+import time
+from datetime import datetime
+
+WATCH_RESUME_ENABLED = os.getenv("WATCH_RESUME_ENABLED", "true").lower() == "true"
+WATCH_RESUME_EVERY_N = int(os.getenv("WATCH_RESUME_EVERY_N", "500"))
+WATCH_RESUME_EVERY_S = float(os.getenv("WATCH_RESUME_EVERY_S", "5"))
+
+
+class ResumeTokenStore:
+    """
+    One document per watched stream in `collection` (db.watcher_state):
+      {"_id": name, "resume_token": {...}, "updated_at": datetime}
+    """
+
+    def __init__(self, collection, name, every_n=WATCH_RESUME_EVERY_N, every_s=WATCH_RESUME_EVERY_S):
+        self.collection = collection
+        self.name = name
+        self.every_n = every_n
+        self.every_s = every_s
+
+        self.token = None          # last processed token (may be unsaved)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+    async def load(self):
+        doc = await self.collection.find_one({"_id": self.name})
+        return doc.get("resume_token") if doc else None
+
+    async def save(self):
+        if self.token is None or self._unsaved == 0:
+            return False
+
+        await self._write(self.token)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        return True
+
+    async def _write(self, token):
+        await self.collection.update_one(
+            {"_id": self.name},
+            {"$set": {"resume_token": token, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    def skip(self, change):
+        """
+        True for an event that must not be processed (see LeaseTokenStore).
+        """
+        return False
+
+    async def advance(self, token, events=1):
+        """
+        Call AFTER the events up to `token` are fully processed.
+        Saves when N events or T seconds have passed since the last save.
+        """
+        self.token = token
+        self._unsaved += events
+
+        if self._unsaved >= self.every_n or time.monotonic() - self._last_save >= self.every_s:
+            return await self.save()
+        return False
+
+    async def clear(self):
+        self.token = None
+        self._unsaved = 0
+        await self.collection.delete_one({"_id": self.name})
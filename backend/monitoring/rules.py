@@ -65,10 +65,61 @@ def is_in_cooldown(alert_type):
 def record_cooldown(alert_type):
     LAST_ALERT[alert_type] = time.time()
 
+# --------------------------------------------------------
+# Conditions (shared by the rules and the sampling alert zone)
+# --------------------------------------------------------
+def is_blue_and_dark(blue, lux):
+    return blue > THRESHOLDS["BLUE_RATIO_HIGH"] and lux < THRESHOLDS["TOO_DARK_LUX"]
+
+def is_long_blue_exposure(session_time, blue):
+    return session_time > THRESHOLDS["LONG_EXPOSURE_MIN"] and blue > THRESHOLDS["BLUE_RATIO_HIGH"]
+
+def is_short_ibi(ibi):
+    return ibi is not None and ibi < THRESHOLDS["DRY_EYE_IBI"]
+
+def is_long_ibi(ibi):
+    return ibi is not None and ibi > THRESHOLDS["EVAP_DRY_EYE_IBI"]
+
+def is_low_blink_rate(blink_rate):
+    return blink_rate is not None and blink_rate < THRESHOLDS["LOW_BLINK_RATE"]
+
+def is_concentration_ibi(ibi):
+    return ibi is not None and THRESHOLDS["HIGH_CONCENTRATION_IBI_MIN"] <= ibi <= THRESHOLDS["HIGH_CONCENTRATION_IBI_MAX"]
+
+def is_too_dark(lux):
+    return lux < THRESHOLDS["TOO_DARK_LUX"]
+
+def is_too_bright(lux):
+    return lux > THRESHOLDS["TOO_BRIGHT_LUX"]
+
+def is_blue_high(blue):
+    return blue > THRESHOLDS["BLUE_RATIO_HIGH"]
+
+def in_alert_zone(metrics):
+    """
+    Metrics inside any rule's condition (cooldowns ignored),
+    e.g. to keep adaptive sampling at its fastest interval.
+    """
+    ibi = metrics.get("ibi")
+    lux = metrics.get("lux", 0)
+    blue = metrics.get("blue_ratio", 0)
+
+    return (
+        is_blue_and_dark(blue, lux)
+        or is_long_blue_exposure(metrics.get("session_time", 0), blue)
+        or is_short_ibi(ibi)
+        or is_long_ibi(ibi)
+        or is_low_blink_rate(metrics.get("window_blink_rate", metrics.get("blink_rate")))
+        or is_concentration_ibi(ibi)
+        or is_too_dark(lux)
+        or is_too_bright(lux)
+        or is_blue_high(blue)
+    )
+
 # --------------------------------------------------------
 # Helper: Send notification to DB
 # --------------------------------------------------------
-async def send_notification(alert_type, title, message, metric_name, critical_value):
+async def send_notification(alert_type, title, message, metric_name, critical_value, notify=None):
     notification = {
         "userId": USER_ID,
         "title": title,
@@ -77,15 +128,24 @@ async def send_notification(alert_type, title, message, metric_name, critical_va
         "metric_value": critical_value,
         "isRead": False
     }
+    if notify is not None:
+        # caller writes it with the rest of its batch (monitor.WriteBatch)
+        notify(notification)
+        return
     await create_notification(notification)
 
 # --------------------------------------------------------
 # Main rules engine
 # --------------------------------------------------------
-async def evaluate_rules(metrics):
+async def evaluate_rules(metrics, notify=None):
+    """
+    notify: fn(notification) collecting the alerts instead of storing
+    each one with create_notification.
+    """
 
     ibi = metrics["ibi"]
-    blink_rate = metrics["blink_rate"]
+    # recent rate when the watcher has one (session average otherwise)
+    blink_rate = metrics.get("window_blink_rate", metrics["blink_rate"])
     lux = metrics["lux"]
     blue = metrics["blue_ratio"]
     session_time = metrics["session_time"]
@@ -95,7 +155,7 @@ async def evaluate_rules(metrics):
     # ---------------------------------------------------------
 
     # Blue + dark
-    if blue > THRESHOLDS["BLUE_RATIO_HIGH"] and lux < THRESHOLDS["TOO_DARK_LUX"]:
+    if is_blue_and_dark(blue, lux):
         if not is_in_cooldown("blue_combined"):
             await send_notification(
                 "blue_combined",
@@ -103,12 +163,13 @@ async def evaluate_rules(metrics):
                 "High blue light with low ambient light. Eye strain risk increased.",
                 "blue_and_dark",
                 blue,
+                notify=notify,
             )
             record_cooldown("blue_combined")
         return
 
     # Long exposure + blue
-    if session_time > THRESHOLDS["LONG_EXPOSURE_MIN"] and blue > THRESHOLDS["BLUE_RATIO_HIGH"]:
+    if is_long_blue_exposure(session_time, blue):
         if not is_in_cooldown("fatigue"):
             await send_notification(
                 "fatigue",
@@ -116,6 +177,7 @@ async def evaluate_rules(metrics):
                 "More than 2 hours of blue-heavy exposure detected.",
                 "long_exposure",
                 session_time,
+                notify=notify,
             )
             record_cooldown("fatigue")
         return
@@ -125,89 +187,96 @@ async def evaluate_rules(metrics):
     # ---------------------------------------------------------
     if ibi is not None:
 
-        if ibi < THRESHOLDS["DRY_EYE_IBI"]:
+        if is_short_ibi(ibi):
             if not is_in_cooldown("dry_eye"):
                 await send_notification(
                     "dry_eye",
                     f"{EMOJI['high']} Dry Eye Alert",
                     f"Inter-blink interval too short ({ibi:.1f}s). Possible dry eye.",
                     "IBI_short",
-                    ibi
+                    ibi,
+                    notify=notify,
                 )
                 record_cooldown("dry_eye")
 
-        if ibi > THRESHOLDS["EVAP_DRY_EYE_IBI"]:
+        if is_long_ibi(ibi):
             if not is_in_cooldown("dry_eye"):
                 await send_notification(
                     "dry_eye",
                     f"{EMOJI['high']} Evaporative Dry Eye",
                     f"Long inter-blink interval ({ibi:.1f}s). Tear film evaporation risk.",
                     "IBI_long",
-                    ibi
+                    ibi,
+                    notify=notify,
                 )
                 record_cooldown("dry_eye")
 
     # Low blink rate
-    if blink_rate < THRESHOLDS["LOW_BLINK_RATE"]:
+    if is_low_blink_rate(blink_rate):
         if not is_in_cooldown("dry_eye"):
             await send_notification(
                 "dry_eye",
                 f"{EMOJI['high']} Low Blink Rate",
                 f"Blink rate is low ({blink_rate:.1f} blinks/min). Eye dryness risk.",
                 "low_blink_rate",
-                blink_rate
+                blink_rate,
+                notify=notify,
             )
             record_cooldown("dry_eye")
 
     # ---------------------------------------------------------
     # 2) Fatigue (IBI concentration) Alerts
     # ---------------------------------------------------------
-    if ibi is not None and THRESHOLDS["HIGH_CONCENTRATION_IBI_MIN"] <= ibi <= THRESHOLDS["HIGH_CONCENTRATION_IBI_MAX"]:
+    if is_concentration_ibi(ibi):
         if not is_in_cooldown("fatigue"):
             await send_notification(
                 "fatigue",
                 f"{EMOJI['medium']} Eye Fatigue Detected",
                 f"High concentration detected (IBI: {ibi:.1f}s). Eye strain possible.",
                 "fatigue_concentration",
-                ibi
+                ibi,
+                notify=notify,
             )
             record_cooldown("fatigue")
 
     # ---------------------------------------------------------
     # 3) Ambient Light Alerts
     # ---------------------------------------------------------
-    if lux < THRESHOLDS["TOO_DARK_LUX"]:
+    if is_too_dark(lux):
         if not is_in_cooldown("light_low"):
             await send_notification(
                 "light_low",
                 f"{EMOJI['medium']} Low Ambient Light",
                 f"Ambient light is too low ({lux:.0f} lux). Screen strain increases.",
                 "low_light",
-                lux
+                lux,
+                notify=notify,
             )
             record_cooldown("light_low")
 
-    if lux > THRESHOLDS["TOO_BRIGHT_LUX"]:
+    if is_too_bright(lux):
         if not is_in_cooldown("light_high"):
             await send_notification(
                 "light_high",
                 f"{EMOJI['medium']} High Ambient Light",
                 f"Ambient light too high ({lux:.0f} lux). Glare risk.",
                 "high_light",
-                lux
+                lux,
+                notify=notify,
             )
             record_cooldown("light_high")
 
     # ---------------------------------------------------------
     # 4) Blue-only Alerts
     # ---------------------------------------------------------
-    if blue > THRESHOLDS["BLUE_RATIO_HIGH"]:
+    if is_blue_high(blue):
         if not is_in_cooldown("blue_only"):
             await send_notification(
                 "blue_only",
                 f"{EMOJI['medium']} High Blue Light",
                 f"High blue light ratio detected ({blue:.2f}).",
                 "blue_light_only",
-                blue
+                blue,
+                notify=notify,
             )
             record_cooldown("blue_only")
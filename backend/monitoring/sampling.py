@@ -0,0 +1,152 @@
+# sampling.py
+# ============================================
+# Server-driven adaptive sampling:
+# the watcher tracks how stable each device's metrics are
+# and advises the glasses how often to sample / upload.
+#
+# - unstable (blink rate varies, light drifts) or in an
+#   alert zone (rules.in_alert_zone) → fastest interval,
+#   upload right away
+# - stable → interval doubles every SAMPLING_STABLE_READINGS
+#   stable readings, up to SAMPLING_MAX_INTERVAL_MS, and
+#   readings are uploaded in larger batches
+#
+# Advice = {"interval_ms", "upload_interval_ms", "reason"},
+# stored on the device document ("sampling", only when it
+# changes) so every worker returns it from the device cache,
+# and pushed on the device's WebSocket if one is open.
+#
+# A device sampled slower than SAMPLING_MIN_INTERVAL_MS sees
+# fewer of the blinks: its blink rate is scaled back to the
+# fastest interval (blink_rate_scale) before the rules run.
+# Off by default (SAMPLING_ADAPTIVE_ENABLED=true to enable).
+# ============================================
+
+import math
+import os
+
+SAMPLING_ADAPTIVE_ENABLED = os.getenv("SAMPLING_ADAPTIVE_ENABLED", "false").lower() == "true"
+SAMPLING_MIN_INTERVAL_MS = int(os.getenv("SAMPLING_MIN_INTERVAL_MS", "1000"))
+SAMPLING_MAX_INTERVAL_MS = int(os.getenv("SAMPLING_MAX_INTERVAL_MS", "8000"))
+SAMPLING_MAX_UPLOAD_MS = int(os.getenv("SAMPLING_MAX_UPLOAD_MS", "30000"))
+SAMPLING_STABLE_READINGS = int(os.getenv("SAMPLING_STABLE_READINGS", "10"))
+
+# Stability thresholds
+SAMPLING_BLINK_CV_MAX = float(os.getenv("SAMPLING_BLINK_CV_MAX", "0.25"))   # std / mean of blink rate
+SAMPLING_LUX_DRIFT_MAX = float(os.getenv("SAMPLING_LUX_DRIFT_MAX", "0.2"))  # |lux - mean| / mean
+
+# EWMA weight of one reading
+SAMPLING_ALPHA = 0.2
+
+
+def sampling_levels(min_ms=SAMPLING_MIN_INTERVAL_MS, max_ms=SAMPLING_MAX_INTERVAL_MS):
+    """
+    Sampling intervals from fastest to slowest (doubling).
+    """
+    levels = [min_ms]
+    while levels[-1] * 2 <= max_ms:
+        levels.append(levels[-1] * 2)
+    return levels
+
+
+def make_advice(level, levels, reason, max_upload_ms=SAMPLING_MAX_UPLOAD_MS):
+    interval = levels[level]
+    # slower sampling → also batch more readings per upload
+    upload = min(interval * 2 ** level, max(max_upload_ms, interval))
+    return {"interval_ms": interval, "upload_interval_ms": upload, "reason": reason}
+
+
+DEFAULT_ADVICE = make_advice(0, sampling_levels(), "default")
+
+
+def sampling_advice(device):
+    """
+    Advice for an API response (None when adaptive sampling is off).
+    """
+    if not SAMPLING_ADAPTIVE_ENABLED:
+        return None
+    return (device or {}).get("sampling") or DEFAULT_ADVICE
+
+
+def blink_rate_scale(device, min_ms=SAMPLING_MIN_INTERVAL_MS):
+    """
+    Factor from the blink rate seen at the device's advised interval
+    to the rate at the fastest one (1 when adaptive sampling is off).
+    """
+    advice = sampling_advice(device)
+    if advice is None:
+        return 1.0
+    return max(advice["interval_ms"] / min_ms, 1.0)
+
+
+class SamplingState:
+    """
+    Per-device stability tracker (kept on DeviceMetrics).
+    """
+
+    __slots__ = ("levels", "stable_readings", "level", "stable_count", "blink_mean", "blink_var", "lux_mean", "advice")
+
+    def __init__(self, levels=None, stable_readings=SAMPLING_STABLE_READINGS):
+        self.levels = levels or sampling_levels()
+        self.stable_readings = stable_readings
+        self.level = 0
+        self.stable_count = 0
+        self.blink_mean = None
+        self.blink_var = 0.0
+        self.lux_mean = None
+        self.advice = None
+
+    def _observe(self, blink_rate, lux):
+        """
+        Update the EWMAs. Returns (blink rate CV, lux drift) before this reading.
+        """
+        if self.blink_mean is None:
+            self.blink_mean = blink_rate
+            self.lux_mean = lux
+            return 0.0, 0.0
+
+        lux_drift = abs(lux - self.lux_mean) / max(self.lux_mean, 1.0)
+        self.lux_mean += SAMPLING_ALPHA * (lux - self.lux_mean)
+
+        # exponentially weighted variance
+        delta = blink_rate - self.blink_mean
+        self.blink_mean += SAMPLING_ALPHA * delta
+        self.blink_var = (1 - SAMPLING_ALPHA) * (self.blink_var + SAMPLING_ALPHA * delta * delta)
+        blink_cv = math.sqrt(self.blink_var) / max(self.blink_mean, 1.0)
+
+        return blink_cv, lux_drift
+
+    def update(self, metrics, alert_active=False):
+        """
+        Fold one reading's metrics in. Returns the new advice when it
+        changed (to be stored / pushed), else None.
+        """
+        blink_rate = metrics.get("window_blink_rate", metrics.get("blink_rate", 0))
+        blink_cv, lux_drift = self._observe(blink_rate, metrics.get("lux", 0))
+
+        if alert_active:
+            reason = "alert"
+        elif blink_cv > SAMPLING_BLINK_CV_MAX:
+            reason = "blink_rate_unstable"
+        elif lux_drift > SAMPLING_LUX_DRIFT_MAX:
+            reason = "light_changing"
+        else:
+            reason = None
+
+        if reason is not None:
+            # fast attack: back to the fastest interval at once
+            self.level = 0
+            self.stable_count = 0
+        else:
+            # slow release: one step slower after a run of stable readings
+            self.stable_count += 1
+            if self.stable_count >= self.stable_readings and self.level < len(self.levels) - 1:
+                self.level += 1
+                self.stable_count = 0
+            reason = "stable"
+
+        if self.advice is not None and self.advice["interval_ms"] == self.levels[self.level]:
+            return None
+
+        self.advice = make_advice(self.level, self.levels, reason)
+        return self.advice
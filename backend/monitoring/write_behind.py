@@ -0,0 +1,192 @@
+# write_behind.py
+# ============================================
+# Write-behind ingestion (READINGS_WRITE_BEHIND=true):
+# create_reading queues the reading and answers 202
+# right away; a background task writes the queue to
+# raw_readings with unordered insert_many batches,
+# flushed by size or by age of the oldest reading.
+#
+# - bounded queue: a full queue slows requests down
+#   instead of growing memory
+# - _id is set before queueing, so a retried batch
+#   can't store a reading twice
+# - stop() flushes what is queued (graceful shutdown)
+# ============================================
+
+import asyncio
+import os
+import time
+
+READINGS_WRITE_BEHIND = os.getenv("READINGS_WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "50000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_MAX_AGE_MS = int(os.getenv("WRITE_BEHIND_MAX_AGE_MS", "100"))
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "3"))
+
+# Queued by stop(): everything before it is written, then the writer exits
+_STOP = object()
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        max_queue=WRITE_BEHIND_QUEUE_SIZE,
+        batch_size=WRITE_BEHIND_BATCH_SIZE,
+        max_age_ms=WRITE_BEHIND_MAX_AGE_MS,
+        retries=WRITE_BEHIND_RETRIES,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.max_age_ms = max_age_ms
+        self.retries = retries
+
+        self.writer = None
+        self._queue = None
+        self._task = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.accepted = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_last = 0.0
+        self.flush_ms_max = 0.0
+        self.batch_age_ms_last = 0.0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self, writer):
+        """
+        writer: async fn([(doc, device), ...], retry=bool) → {position: error}
+        (readings_controller.insert_reading_docs).
+        """
+        if self._task is not None:
+            return
+
+        self.writer = writer
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        print(f"📝 Write-behind ingestion started (queue {self.max_queue}, batches of {self.batch_size}, {self.max_age_ms} ms)")
+
+    async def stop(self, timeout=30):
+        if self._task is None:
+            return
+
+        # new readings are inserted directly from now on
+        task, self._task = self._task, None
+
+        try:
+            await asyncio.wait_for(self._drain(task), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Write-behind stopped with {self._queue.qsize()} reading(s) not written")
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        print("📝 Write-behind ingestion stopped")
+
+    async def _drain(self, task):
+        await self._queue.put(_STOP)
+        await task
+
+    async def submit(self, doc, device):
+        await self._queue.put((doc, device, time.monotonic()))
+        self.accepted += 1
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # ----------------------------------------------------
+    # Background writer
+    # ----------------------------------------------------
+    async def _next_batch(self):
+        """
+        Block for the first reading, then take more until the batch is
+        full or the first one has waited max_age_ms.
+        Returns (items, stopping).
+        """
+        item = await self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        items = [item]
+        deadline = item[2] + self.max_age_ms / 1000
+
+        while len(items) < self.batch_size:
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            if item is _STOP:
+                return items, True
+            items.append(item)
+
+        return items, False
+
+    async def _write(self, items):
+        pending = [(doc, device) for doc, device, _ in items]
+
+        for attempt in range(self.retries + 1):
+            try:
+                # retry → duplicate _id means "stored by the earlier attempt"
+                return await self.writer(pending, retry=attempt > 0)
+            except Exception as e:
+                print(f"❌ Write-behind batch of {len(items)} failed (attempt {attempt + 1}): {e}")
+                if attempt < self.retries:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+
+        return {position: "Write failed" for position in range(len(pending))}
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            items, stopping = await self._next_batch()
+            if not items:
+                continue
+
+            started = time.monotonic()
+            failed = await self._write(items)
+
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self.batches += 1
+            self.written += len(items) - len(failed)
+            self.failed += len(failed)
+            self.flush_ms_last = elapsed_ms
+            self.flush_ms_total += elapsed_ms
+            self.flush_ms_max = max(self.flush_ms_max, elapsed_ms)
+            self.batch_age_ms_last = (started - items[0][2]) * 1000
+
+            if failed:
+                print(f"⚠️ Write-behind dropped {len(failed)} reading(s): {next(iter(failed.values()))}")
+
+    # ----------------------------------------------------
+    # Metrics
+    # ----------------------------------------------------
+    def stats(self):
+        return {
+            "running": self.running,
+            "queue_depth": self.qsize(),
+            "queue_capacity": self.max_queue,
+            "accepted": self.accepted,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "flush_ms_last": round(self.flush_ms_last, 2),
+            "flush_ms_avg": round(self.flush_ms_total / self.batches, 2) if self.batches else 0.0,
+            "flush_ms_max": round(self.flush_ms_max, 2),
+            "batch_age_ms_last": round(self.batch_age_ms_last, 2),
+        }
+
+
+# Process-wide queue (started by main.py when READINGS_WRITE_BEHIND=true)
+WRITE_BEHIND = WriteBehindQueue()
@@ -9,3 +9,7 @@ PROJECT_ROOT = os.path.abspath(
 # Add backend/ folder to sys.path
 BACKEND_PATH = os.path.join(PROJECT_ROOT, "backend")
 sys.path.insert(0, BACKEND_PATH)
+
+# Add backend/AI finel/ folder to sys.path (flat AI modules)
+AI_PATH = os.path.join(BACKEND_PATH, "AI finel")
+sys.path.insert(0, AI_PATH)
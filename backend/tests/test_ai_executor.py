@@ -0,0 +1,114 @@
+# ==========================================================
+# test_ai_executor.py
+# AI evaluation runs in the worker pool, not on the event loop
+# ==========================================================
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import ai_executor
+from ai_executor import AIEvaluationExecutor, AIExecutorBusy, evaluate_reading_sync
+
+SENSOR = {"blink_rate_bpm": 6, "blue_lux": 900, "focus_minutes": 70, "ambient_lux": 800, "humidity": 25, "temperature": 26}
+PROFILE = {
+    "min_safe_blink_bpm": 12,
+    "max_safe_blue": 500,
+    "max_safe_focus_min": 40,
+    "has_eye_surgery": 1,
+    "has_dry_eye_condition": 1,
+    "wears_protective_glasses": 0,
+}
+
+
+# ----------------------------------------------------------
+# TC_AX1 - Same result as calling the pipeline directly
+# ----------------------------------------------------------
+async def test_evaluate_reading_matches_sync():
+    executor = AIEvaluationExecutor(max_workers=1, max_pending=4)
+    await executor.start()
+    try:
+        result = await executor.evaluate_reading(SENSOR, PROFILE, 23)
+    finally:
+        await executor.stop()
+
+    expected = evaluate_reading_sync(SENSOR, PROFILE, 23)
+    assert result["flags"] == expected["flags"]
+    assert result["indices"] == expected["indices"]
+    assert result["recommendations"] == expected["recommendations"]
+    assert result["light_action"] == expected["light_action"]
+
+
+# ----------------------------------------------------------
+# TC_AX2 - Work runs on a worker thread
+# ----------------------------------------------------------
+async def test_runs_off_loop_thread(mocker):
+    seen = {}
+
+    def fake_eval(*args, **kwargs):
+        seen["thread"] = threading.current_thread().name
+        return {}
+
+    mocker.patch.object(ai_executor, "evaluate_reading_sync", side_effect=fake_eval)
+
+    executor = AIEvaluationExecutor(max_workers=1, max_pending=4)
+    await executor.start()
+    try:
+        await executor.evaluate_reading(SENSOR, PROFILE, 10)
+    finally:
+        await executor.stop()
+
+    assert seen["thread"].startswith("ai-eval")
+
+
+# ----------------------------------------------------------
+# TC_AX3 - Bounded queue → AIExecutorBusy
+# ----------------------------------------------------------
+async def test_bounded_queue_rejects(mocker):
+    def slow_eval(*args, **kwargs):
+        time.sleep(0.3)
+        return {}
+
+    mocker.patch.object(ai_executor, "evaluate_reading_sync", side_effect=slow_eval)
+
+    executor = AIEvaluationExecutor(max_workers=1, max_pending=1, queue_timeout=0.05)
+    await executor.start()
+    try:
+        first = asyncio.create_task(executor.evaluate_reading(SENSOR, PROFILE, 10))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(AIExecutorBusy):
+            await executor.evaluate_reading(SENSOR, PROFILE, 10)
+
+        await first
+    finally:
+        await executor.stop()
+
+
+# ----------------------------------------------------------
+# TC_AX4 - Not started → clear error
+# ----------------------------------------------------------
+async def test_requires_start():
+    executor = AIEvaluationExecutor()
+    with pytest.raises(RuntimeError):
+        await executor.evaluate_reading(SENSOR, PROFILE, 10)
+
+
+# ----------------------------------------------------------
+# TC_AX5 - Model load error → executor stays stopped
+# ----------------------------------------------------------
+async def test_failed_load_leaves_executor_stopped(mocker):
+    registry = mocker.Mock()
+    registry.get.side_effect = FileNotFoundError("alert_model.pkl")
+    mocker.patch.object(ai_executor, "get_model_registry", return_value=registry)
+
+    executor = AIEvaluationExecutor(max_workers=1, max_pending=4)
+    with pytest.raises(FileNotFoundError):
+        await executor.start()
+
+    assert not executor.running
+    registry.start_watcher.assert_not_called()
+    with pytest.raises(RuntimeError):
+        await executor.evaluate_reading(SENSOR, PROFILE, 10)
@@ -0,0 +1,226 @@
+# ==========================================================
+# test_compaction.py
+# Raw readings retention: per-minute aggregates + batched deletes
+# ==========================================================
+
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from monitoring import compaction
+from monitoring.compaction import MinuteAggregate, add_reading, stat_mean
+
+
+NOW = datetime(2025, 3, 8, 12, 0)
+INGESTED = ObjectId.from_datetime(datetime(2025, 3, 8, 11, 0))   # well before NOW - margin
+
+
+def _reading(second, minute=0, blink=0, clear=400, rgb=(10, 20, 30), **data):
+    r, g, b = rgb
+    return {
+        "_id": INGESTED,
+        "deviceId": "DEV_1",
+        "user_id": "u1",
+        "form_id": "f1",
+        "timestamp": datetime(2025, 3, 1, 12, minute, second),
+        "data": {"ir": {"rawValue": blink}, "rgb": {"r": r, "g": g, "b": b, "clear": clear}, **data},
+    }
+
+
+@pytest.fixture
+def db(mocker):
+    collections = {}
+
+    def collection(name):
+        if name not in collections:
+            mock = mocker.MagicMock()
+            mock.bulk_write = mocker.AsyncMock()
+            mock.update_one = mocker.AsyncMock()
+            mock.find_one = mocker.AsyncMock(return_value=None)
+            mock.create_index = mocker.AsyncMock()
+            collections[name] = mock
+        return collections[name]
+
+    fake = mocker.MagicMock()
+    fake.__getitem__.side_effect = collection
+    return fake
+
+
+def _patch_readings(mocker, readings):
+    calls = []
+
+    async def find_readings(db, device_id, start=None, end=None, storage=None, max_id=None):
+        calls.append((start, end))
+        for doc in readings:
+            if max_id is not None and doc.get("_id", max_id) >= max_id:
+                continue
+            if (start is None or doc["timestamp"] >= start) and (end is None or doc["timestamp"] < end):
+                yield doc
+
+    mocker.patch.object(compaction, "find_readings", find_readings)
+    return calls
+
+
+# ----------------------------------------------------------
+# TC_CP1 - Blinks, IBIs, light and climate stats of one minute
+# ----------------------------------------------------------
+def test_minute_aggregate():
+    aggregate = MinuteAggregate(datetime(2025, 3, 1, 12, 0))
+    last_blink = None
+
+    for doc in [
+        _reading(1, blink=1, humidity=40),
+        _reading(4, blink=1, clear=600, humidity=50),
+        _reading(10, blink=1, rgb=(0, 0, 0), temperature=30.5),
+        _reading(12),
+    ]:
+        last_blink = add_reading(aggregate, doc, last_blink)
+
+    fields = aggregate.fields()
+    assert fields["count"] == 4 and fields["blinks"] == 3
+    assert fields["ibi"] == {"n": 2, "sum": 9.0, "min": 3.0, "max": 6.0}
+    assert fields["lux"]["min"] == 200 and fields["lux"]["max"] == 300
+    assert fields["blue_ratio"]["min"] == 0
+    assert stat_mean(fields, "humidity") == 45
+    assert fields["temperature"]["n"] == 1
+
+
+# ----------------------------------------------------------
+# TC_CP2 - One aggregate per minute, state saved before raw readings are deleted
+# ----------------------------------------------------------
+async def test_compact_device(mocker, db):
+    order = []
+    late = dict(_reading(40, minute=1), _id=ObjectId.from_datetime(NOW))     # ingested after the run began
+    _patch_readings(mocker, [_reading(5, blink=1), _reading(50, blink=1), _reading(20, minute=1, blink=1), late, _reading(0, minute=9)])
+    db["compaction_state"].update_one.side_effect = lambda query, update, **k: order.append(list(update))
+    delete = mocker.patch.object(
+        compaction, "delete_readings", mocker.AsyncMock(side_effect=lambda *a, **k: order.append("delete") or 3)
+    )
+
+    cutoff = datetime(2025, 3, 1, 12, 5)
+    minutes, deleted = await compaction.compact_device(db, "DEV_1", cutoff, now=NOW)
+
+    assert (minutes, deleted) == (2, 3)
+    assert order == [["$set"], ["$set"], "delete", ["$unset"]]
+    assert delete.await_args.args[2] == cutoff
+
+    run = db["compaction_state"].update_one.await_args_list[0].args[1]["$set"]["run"]
+    assert run["stage"] == "aggregate" and run["cutoff"] == cutoff
+    assert INGESTED < run["max_id"] < late["_id"]
+    assert delete.await_args.kwargs["max_id"] == run["max_id"]      # only what was aggregated
+
+    operations = db["reading_aggregates"].bulk_write.await_args.args[0]
+    second_minute = operations[1]._doc["$set"]
+    assert second_minute["count"] == 1 and second_minute["blinks"] == 1
+    assert second_minute["ibi"]["sum"] == 30.0          # IBI crosses the minute boundary
+
+    saved = db["compaction_state"].update_one.await_args_list[1].args[1]["$set"]
+    assert saved["compacted_until"] == cutoff and saved["last_blink_time"] is not None
+    assert saved["run.stage"] == "delete"
+
+
+# ----------------------------------------------------------
+# TC_CP3 - Late readings before the watermark are merged, not overwritten
+# ----------------------------------------------------------
+async def test_late_readings_merged(mocker, db):
+    watermark = datetime(2025, 3, 1, 12, 5)
+    calls = _patch_readings(mocker, [_reading(30, minute=2, blink=1)])
+    db["compaction_state"].find_one.return_value = {"_id": "DEV_1", "compacted_until": watermark, "last_blink_time": None}
+    mocker.patch.object(compaction, "delete_readings", mocker.AsyncMock(return_value=1))
+
+    await compaction.compact_device(db, "DEV_1", watermark, now=NOW)
+
+    assert calls == [(None, watermark)]                     # no fresh range left
+    operation = db["reading_aggregates"].bulk_write.await_args.args[0][0]
+    run_id = db["compaction_state"].update_one.await_args_list[0].args[1]["$set"]["run"]["id"]
+    assert operation._doc["$inc"]["count"] == 1 and operation._doc["$inc"]["blinks"] == 1
+    assert operation._filter["runs"] == {"$ne": run_id}     # merged once per run
+    assert operation._doc["$push"]["runs"]["$each"] == [run_id]
+
+    saved = db["compaction_state"].update_one.await_args_list[1].args[1]["$set"]
+    assert saved == {"run.stage": "delete"}                 # watermark unchanged
+
+
+# ----------------------------------------------------------
+# TC_CP6 - A failed delete is resumed by the next pass, nothing merged twice
+# ----------------------------------------------------------
+async def test_failed_delete_resumed(mocker, db):
+    watermark = datetime(2025, 3, 1, 12, 5)
+    states = db["compaction_state"]
+    state = {"_id": "DEV_1", "compacted_until": watermark, "last_blink_time": None}
+
+    async def update_state(query, update, upsert=False):
+        for field, value in update.get("$set", {}).items():
+            if field.startswith("run."):
+                state["run"][field[4:]] = value
+            else:
+                state[field] = value
+        for field in update.get("$unset", {}):
+            state.pop(field, None)
+
+    states.find_one.side_effect = lambda query: dict(state)
+    states.update_one.side_effect = update_state
+    calls = _patch_readings(mocker, [_reading(30, minute=2, blink=1)])
+    delete = mocker.patch.object(
+        compaction, "delete_readings", mocker.AsyncMock(side_effect=[RuntimeError("primary stepped down"), 1])
+    )
+
+    with pytest.raises(RuntimeError):
+        await compaction.compact_device(db, "DEV_1", watermark, now=NOW)
+    assert state["run"]["stage"] == "delete"
+
+    # next pass, later and with another cutoff: only the pending delete
+    minutes, deleted = await compaction.compact_device(db, "DEV_1", datetime(2025, 3, 1, 12, 10), now=NOW.replace(hour=13))
+
+    assert (minutes, deleted) == (0, 1)
+    assert len(calls) == 1                                  # the late reading was merged once
+    assert db["reading_aggregates"].bulk_write.await_count == 1
+    assert delete.await_args_list[0] == delete.await_args_list[1]   # same cutoff, same max_id
+    assert "run" not in state
+
+
+# ----------------------------------------------------------
+# TC_CP7 - A merge the run already applied is skipped on resume
+# ----------------------------------------------------------
+async def test_merge_replay_skipped(mocker, db):
+    from pymongo.errors import BulkWriteError
+
+    watermark = datetime(2025, 3, 1, 12, 5)
+    run = {"id": "run-1", "cutoff": watermark, "max_id": ObjectId.from_datetime(NOW), "stage": "aggregate"}
+    db["compaction_state"].find_one.return_value = {"_id": "DEV_1", "compacted_until": watermark, "run": run}
+    db["reading_aggregates"].bulk_write.side_effect = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000}]})
+    _patch_readings(mocker, [_reading(30, minute=2, blink=1)])
+    delete = mocker.patch.object(compaction, "delete_readings", mocker.AsyncMock(return_value=1))
+
+    await compaction.compact_device(db, "DEV_1", datetime(2025, 3, 1, 12, 10), now=NOW)
+
+    operation = db["reading_aggregates"].bulk_write.await_args.args[0][0]
+    assert operation._filter["runs"] == {"$ne": "run-1"}    # resumed with its own run id
+    assert delete.await_args.args[2] == watermark           # and its own cutoff
+
+
+# ----------------------------------------------------------
+# TC_CP4 - Cutoff is a whole minute, every old device is compacted
+# ----------------------------------------------------------
+async def test_run_compaction(mocker, db):
+    mocker.patch.object(compaction, "reading_device_ids", mocker.AsyncMock(return_value=["DEV_1", "DEV_2"]))
+    compact = mocker.patch.object(compaction, "compact_device", mocker.AsyncMock(return_value=(10, 100)))
+
+    summary = await compaction.run_compaction(db, now=datetime(2025, 3, 8, 12, 30, 45), retention_days=7)
+
+    assert summary["cutoff"] == datetime(2025, 3, 1, 12, 30)
+    assert summary["devices"] == 2 and summary["deleted"] == 200
+    assert compact.await_count == 2
+
+
+# ----------------------------------------------------------
+# TC_CP5 - TTL index only when configured
+# ----------------------------------------------------------
+async def test_ttl_index_option(db):
+    await compaction.ensure_retention_indexes(db, ttl_days=0, storage="documents")
+    db["raw_readings"].create_index.assert_not_called()
+
+    await compaction.ensure_retention_indexes(db, ttl_days=30, storage="buckets")
+    args, kwargs = db["raw_reading_buckets"].create_index.await_args
+    assert args[0] == [("last", 1)] and kwargs["expireAfterSeconds"] == 30 * 86400
@@ -0,0 +1,97 @@
+# ==========================================================
+# test_device_registry.py
+# Shared device-context cache + invalidation
+# ==========================================================
+
+from monitoring.device_registry import DeviceRegistry
+
+
+DEVICE = {
+    "_id": "oid_1",
+    "deviceId": "DEV_1",
+    "is_linked": True,
+    "power": True,
+    "errorLock": False,
+    "user_id": "u1",
+    "form_id": "f1",
+    "device_name": "Clip",
+}
+
+
+def _collection(mocker, docs):
+    async def fake_find(query, projection=None):
+        for doc in docs:
+            if doc["deviceId"] in query["deviceId"]["$in"]:
+                yield doc
+
+    collection = mocker.MagicMock()
+    collection.find_one = mocker.AsyncMock(side_effect=lambda q, p=None: next(
+        (d for d in docs if d["deviceId"] == q["deviceId"]), None
+    ))
+    collection.find = mocker.MagicMock(side_effect=fake_find)
+    return collection
+
+
+# ----------------------------------------------------------
+# TC_DR1 - Second lookup is served from memory
+# ----------------------------------------------------------
+async def test_get_cached(mocker):
+    collection = _collection(mocker, [DEVICE])
+    registry = DeviceRegistry(collection)
+
+    first = await registry.get("DEV_1")
+    second = await registry.get("DEV_1")
+
+    assert first == second
+    assert first["user_id"] == "u1"
+    assert "device_name" not in first
+    assert collection.find_one.await_count == 1
+
+
+# ----------------------------------------------------------
+# TC_DR2 - Unknown device is cached as None, get_many uses one query
+# ----------------------------------------------------------
+async def test_get_many_and_negative_cache(mocker):
+    collection = _collection(mocker, [DEVICE])
+    registry = DeviceRegistry(collection)
+
+    result = await registry.get_many(["DEV_1", "DEV_X"])
+    assert result["DEV_1"]["is_linked"] is True
+    assert result["DEV_X"] is None
+
+    assert await registry.get("DEV_X") is None
+    assert collection.find.call_count == 1
+    assert collection.find_one.await_count == 0
+
+
+# ----------------------------------------------------------
+# TC_DR3 - Change-stream events refresh / drop entries
+# ----------------------------------------------------------
+async def test_apply_change(mocker):
+    registry = DeviceRegistry(_collection(mocker, [DEVICE]))
+    await registry.get("DEV_1")
+
+    registry.apply_change({"operationType": "update", "fullDocument": dict(DEVICE, power=False)})
+    hit, context = registry.peek("DEV_1")
+    assert hit and context["power"] is False
+
+    registry.apply_change({"operationType": "delete", "documentKey": {"_id": "oid_1"}})
+    assert registry.peek("DEV_1") == (False, None)
+
+
+# ----------------------------------------------------------
+# TC_DR4 - Controller-side invalidation and TTL
+# ----------------------------------------------------------
+async def test_invalidate_where_and_ttl(mocker):
+    clock = mocker.patch("monitoring.device_registry.time.monotonic", return_value=0)
+    collection = _collection(mocker, [DEVICE])
+    registry = DeviceRegistry(collection, ttl=60)
+
+    await registry.get("DEV_1")
+    registry.invalidate_where(user_id="u1", form_id="f1")
+    assert len(registry) == 0
+
+    await registry.get("DEV_1")
+    clock.return_value = 61
+    await registry.get("DEV_1")
+    assert collection.find_one.await_count == 3
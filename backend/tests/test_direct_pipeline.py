@@ -0,0 +1,100 @@
+# ==========================================================
+# test_direct_pipeline.py
+# In-process reading queue (PIPELINE_MODE=direct)
+# ==========================================================
+
+import asyncio
+
+from monitoring.direct_pipeline import DirectPipeline
+
+
+# ----------------------------------------------------------
+# TC_DP1 - Queued readings reach the handler in batches, in order
+# ----------------------------------------------------------
+async def test_readings_batched_in_order():
+    batches = []
+
+    async def handler(items):
+        batches.append(items)
+
+    pipeline = DirectPipeline(max_queue=100, batch_size=3)
+    pipeline.start(handler)
+
+    for i in range(7):
+        await pipeline.submit({"n": i}, {"deviceId": "DEV_1"})
+    await pipeline.stop()
+
+    docs = [doc["n"] for batch in batches for doc, _ in batch]
+    assert docs == list(range(7))
+    assert max(len(batch) for batch in batches) <= 3
+    assert not pipeline.running
+
+
+# ----------------------------------------------------------
+# TC_DP2 - A failing batch does not stop the pipeline
+# ----------------------------------------------------------
+async def test_handler_error_does_not_stop_pipeline():
+    seen = []
+
+    async def handler(items):
+        seen.extend(doc["n"] for doc, _ in items)
+        if items[0][0]["n"] == 0:
+            raise ValueError("boom")
+
+    pipeline = DirectPipeline(max_queue=10, batch_size=1)
+    pipeline.start(handler)
+
+    await pipeline.submit({"n": 0}, {})
+    await asyncio.sleep(0)
+    await pipeline.submit({"n": 1}, {})
+    await pipeline.stop()
+
+    assert seen == [0, 1]
+
+
+# ----------------------------------------------------------
+# TC_DP3 - Watcher skips readings run in-process, runs failed / unknown ones
+# ----------------------------------------------------------
+async def test_watcher_falls_back_for_failed_batches():
+    async def handler(items):
+        if items[0][0]["n"] == 1:
+            raise ValueError("boom")
+
+    pipeline = DirectPipeline(max_queue=10, batch_size=1)
+    pipeline.start(handler)
+
+    ok = {"_id": "a", "n": 0, "direct": True}
+    failing = {"_id": "b", "n": 1, "direct": True}
+    unknown = {"_id": "c", "n": 2, "direct": True}    # e.g. process restarted before it ran
+    stream = {"_id": "d", "n": 3}
+
+    pipeline.claim([ok, failing])
+    await pipeline.submit(ok, {})
+    await pipeline.submit(failing, {})
+
+    # the watcher waits for the in-process runs
+    left = await pipeline.unhandled([ok, failing, unknown, stream])
+    await pipeline.stop()
+
+    assert [doc["n"] for doc in left] == [1, 2, 3]
+    assert not pipeline._claims
+
+
+# ----------------------------------------------------------
+# TC_DP4 - Partitioned watcher: only owned devices go direct
+# ----------------------------------------------------------
+async def test_accepts_owned_devices_only():
+    async def handler(items):
+        pass
+
+    pipeline = DirectPipeline()
+    assert not pipeline.accepts("DEV_1")
+
+    pipeline.start(handler)
+    assert pipeline.accepts("DEV_1")
+
+    pipeline.owns = lambda device_id: device_id == "DEV_1"
+    assert pipeline.accepts("DEV_1")
+    assert not pipeline.accepts("DEV_2")
+
+    await pipeline.stop()
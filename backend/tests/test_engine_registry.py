@@ -0,0 +1,141 @@
+# ==========================================================
+# test_engine_registry.py
+# Unit tests for the per-device MetricsEngine registry
+# ==========================================================
+
+from monitoring.engine_registry import (
+    MetricsEngineRegistry,
+    load_device_metrics,
+    load_device_metrics_many,
+    persist_evicted,
+)
+
+
+# ----------------------------------------------------------
+# TC_ER1 - Each device gets its own engine
+# ----------------------------------------------------------
+def test_devices_do_not_share_engines():
+    registry = MetricsEngineRegistry()
+
+    registry.get("DEV_A").engine.update_blink(True)
+    registry.get("DEV_A").engine.update_blink(True)
+    registry.get("DEV_B").engine.update_blink(True)
+
+    assert registry.get("DEV_A").engine.blink_count == 2
+    assert registry.get("DEV_B").engine.blink_count == 1
+    assert len(registry) == 2
+
+
+# ----------------------------------------------------------
+# TC_ER2 - LRU bound evicts the least recently used device
+# ----------------------------------------------------------
+def test_lru_bound():
+    registry = MetricsEngineRegistry(max_engines=2)
+
+    registry.get("DEV_A")
+    registry.get("DEV_B")
+    registry.get("DEV_A")   # A is now most recent
+    registry.get("DEV_C")
+
+    # the bound is applied between batches, not inside get()
+    assert len(registry) == 3
+    assert registry.trim() == 1
+
+    assert "DEV_A" in registry
+    assert "DEV_B" not in registry
+    assert [s["deviceId"] for s in registry.pop_evicted()] == ["DEV_B"]
+
+
+# ----------------------------------------------------------
+# TC_ER3 - Idle devices are evicted, state comes back on return
+# ----------------------------------------------------------
+def test_idle_eviction_and_restore(mocker):
+    clock = mocker.patch("monitoring.engine_registry.time.monotonic", return_value=0)
+    registry = MetricsEngineRegistry(idle_timeout=60)
+
+    registry.get("DEV_A").engine.blink_count = 7
+    clock.return_value = 30
+    registry.get("DEV_B")
+
+    clock.return_value = 70
+    assert registry.evict_idle() == 1
+    assert "DEV_A" not in registry
+    assert "DEV_B" in registry
+
+    # not persisted yet → restored from the pending snapshot
+    assert registry.get("DEV_A").engine.blink_count == 7
+
+
+# ----------------------------------------------------------
+# TC_ER4 - Snapshots persist to and load from MongoDB
+# ----------------------------------------------------------
+async def test_persist_and_load(mocker):
+    registry = MetricsEngineRegistry()
+    registry.get("DEV_A").engine.ibi_values = [2.0, 3.0]
+    registry.remove("DEV_A")
+
+    collection = mocker.MagicMock()
+    collection.replace_one = mocker.AsyncMock()
+
+    assert await persist_evicted(registry, collection) == 1
+    saved = collection.replace_one.await_args.args[1]
+
+    collection.find_one = mocker.AsyncMock(return_value=saved)
+    state = await load_device_metrics(registry, collection, "DEV_A")
+
+    assert state.engine.ibi_values == [2.0, 3.0]
+    collection.find_one.assert_awaited_once()
+
+# ----------------------------------------------------------
+# TC_ER5 - Batch load: one $in query for devices not in memory
+# ----------------------------------------------------------
+async def test_load_many_single_query(mocker):
+    registry = MetricsEngineRegistry()
+    registry.get("DEV_A").engine.blink_count = 3
+
+    async def fake_find(query):
+        assert query == {"deviceId": {"$in": ["DEV_B", "DEV_C"]}}
+        yield {"deviceId": "DEV_B", "engine": {"blink_count": 9}}
+
+    collection = mocker.MagicMock()
+    collection.find = mocker.MagicMock(side_effect=fake_find)
+
+    states = await load_device_metrics_many(registry, collection, ["DEV_A", "DEV_B", "DEV_C"])
+
+    assert collection.find.call_count == 1
+    assert states["DEV_A"].engine.blink_count == 3
+    assert states["DEV_B"].engine.blink_count == 9
+    assert states["DEV_C"].engine.blink_count == 0
+
+
+# ----------------------------------------------------------
+# TC_ER6 - Pinned engines (batch in progress) are never evicted
+# ----------------------------------------------------------
+def test_pinned_engines_survive_eviction(mocker):
+    clock = mocker.patch("monitoring.engine_registry.time.monotonic", return_value=0)
+    registry = MetricsEngineRegistry(max_engines=1, idle_timeout=60)
+
+    registry.pin(["DEV_A", "DEV_B"])
+    engine_a = registry.get("DEV_A").engine
+    registry.get("DEV_B")
+
+    assert registry.trim() == 0
+    clock.return_value = 100
+    assert registry.evict_idle() == 0
+    assert registry.get("DEV_A").engine is engine_a
+
+    registry.unpin(["DEV_A", "DEV_B"])
+    assert registry.trim() == 1
+    assert len(registry) == 1
+
+
+# ----------------------------------------------------------
+# TC_ER7 - Snapshot keeps the blink rate window
+# ----------------------------------------------------------
+def test_snapshot_keeps_rate_window():
+    from monitoring.metrics import MetricsEngine
+
+    engine = MetricsEngine(rate_window=30)
+    restored = MetricsEngine.from_snapshot(engine.to_snapshot())
+
+    assert restored.rate_window == 30
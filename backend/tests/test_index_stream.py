@@ -0,0 +1,150 @@
+# ==========================================================
+# test_index_stream.py
+# Time-weighted streaming indices + snapshot restore
+# ==========================================================
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from index_stream import IndexTracker, IndexStreamRegistry
+
+
+T0 = datetime(2026, 1, 1, 12, 0)
+
+
+def _indices(dei, bli=0.5, efi=0.5):
+    return {
+        "DEI": {"score": int(round(dei * 50)), "level": "LOW", "ratio": dei},
+        "BLI": {"score": int(round(bli * 50)), "level": "LOW", "ratio": bli},
+        "EFI": {"score": int(round(efi * 50)), "level": "LOW", "ratio": efi},
+    }
+
+
+# ----------------------------------------------------------
+# TC_IS1 - A single spike only moves the smoothed score a little
+# ----------------------------------------------------------
+def test_single_spike_is_damped():
+    tracker = IndexTracker("DEV_1", half_life_minutes=10)
+    for i in range(10):
+        tracker.update(_indices(0.8), T0 + timedelta(minutes=i))
+
+    result = tracker.update(_indices(1.9), T0 + timedelta(minutes=10))
+
+    assert result["DEI"]["raw_score"] == 95
+    assert 40 <= result["DEI"]["score"] < 50
+    assert result["DEI"]["trend"] > 0
+
+
+# ----------------------------------------------------------
+# TC_IS2 - Weight depends on elapsed time, not reading count
+# ----------------------------------------------------------
+def test_long_gap_follows_new_value():
+    tracker = IndexTracker("DEV_1", half_life_minutes=10)
+    tracker.update(_indices(0.5), T0)
+
+    result = tracker.update(_indices(1.5), T0 + timedelta(hours=3))
+
+    assert result["DEI"]["score"] == 75
+
+
+# ----------------------------------------------------------
+# TC_IS3 - Snapshot restore gives the same state
+# ----------------------------------------------------------
+def test_snapshot_round_trip():
+    tracker = IndexTracker("DEV_1")
+    for i in range(5):
+        tracker.update(_indices(0.6 + i * 0.1), T0 + timedelta(minutes=5 * i))
+
+    restored = IndexTracker.from_snapshot(tracker.to_snapshot())
+
+    assert restored.smoothed() == tracker.smoothed()
+    assert restored.last_ts == tracker.last_ts
+    assert restored.count == 5
+
+
+# ----------------------------------------------------------
+# TC_IS4 - Registry loads from and saves to the snapshot collection
+# ----------------------------------------------------------
+async def test_registry_load_and_flush(mocker):
+    stored = IndexTracker("DEV_1")
+    stored.update(_indices(1.2), T0)
+
+    collection = mocker.MagicMock()
+    collection.find_one = mocker.AsyncMock(return_value=stored.to_snapshot())
+    collection.replace_one = mocker.AsyncMock()
+
+    registry = IndexStreamRegistry(persist_every=2)
+    await registry.load(collection, "DEV_1")
+
+    registry.update("DEV_1", _indices(1.2), T0 + timedelta(minutes=1))
+    assert registry.get("DEV_1").count == 2
+    assert not registry.should_persist("DEV_1")
+
+    registry.update("DEV_1", _indices(1.2), T0 + timedelta(minutes=2))
+    assert registry.should_persist("DEV_1")
+
+    saved = await registry.flush(collection)
+
+    assert saved == 1
+    collection.replace_one.assert_awaited_once()
+    assert not registry.should_persist("DEV_1")
+
+
+# ----------------------------------------------------------
+# TC_IS5 - LRU + idle eviction, unsaved state kept until flush
+# ----------------------------------------------------------
+async def test_registry_evicts_and_keeps_unsaved_state(mocker):
+    now = [0.0]
+    registry = IndexStreamRegistry(max_devices=2, idle_timeout=60, clock=lambda: now[0])
+
+    registry.update("A", _indices(1.2), T0)
+    registry.update("B", _indices(0.5), T0)
+    registry.update("C", _indices(0.5), T0)
+
+    assert len(registry) == 2
+    assert "A" not in registry
+
+    # A comes back with its evicted (never saved) state
+    assert registry.get("A").ratios["DEI"] == 1.2
+
+    now[0] += 61
+    registry.update("C", _indices(0.5), T0 + timedelta(minutes=1))
+    assert "C" in registry
+    assert len(registry) == 1
+
+    collection = mocker.MagicMock()
+    collection.replace_one = mocker.AsyncMock()
+
+    saved = await registry.flush(collection)
+
+    assert saved == 3
+    assert {call.args[0]["deviceId"] for call in collection.replace_one.await_args_list} == {"A", "B", "C"}
+
+
+# ----------------------------------------------------------
+# TC_IS6 - Unsaved evicted snapshots are bounded, a failed save keeps the state
+# ----------------------------------------------------------
+async def test_registry_evicted_bounded_and_failed_save(mocker):
+    registry = IndexStreamRegistry(max_devices=1, idle_timeout=0, max_evicted=2)
+
+    for device_id in ("A", "B", "C", "D"):
+        registry.update(device_id, _indices(0.5), T0)
+
+    # A, B, C evicted unsaved → only the two newest kept
+    assert registry.dropped == 1
+    assert list(registry._evicted) == ["B", "C"]
+
+    collection = mocker.MagicMock()
+    collection.replace_one = mocker.AsyncMock(side_effect=RuntimeError("primary stepped down"))
+
+    with pytest.raises(RuntimeError):
+        await registry.save(collection, "D")
+    with pytest.raises(RuntimeError):
+        await registry.save(collection, "B")
+    assert registry.should_persist("D") is False and registry._dirty["D"] == 1
+    assert "B" in registry._evicted
+
+    collection.replace_one.side_effect = None
+    assert await registry.flush(collection) == 3
+    assert not registry._dirty and not registry._evicted
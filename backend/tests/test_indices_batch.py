@@ -0,0 +1,69 @@
+# ==========================================================
+# test_indices_batch.py
+# compute_indices_batch must equal compute_indices row by row
+# ==========================================================
+
+import numpy as np
+
+from indices import compute_indices, compute_indices_batch
+
+
+def _random_pairs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    pairs = []
+    for _ in range(n):
+        sensor = {
+            "blink_rate_bpm": float(rng.choice([0, 0.05, rng.uniform(1, 30)])),
+            "blue_lux": float(rng.uniform(0, 2000)),
+            "focus_minutes": float(rng.uniform(0, 150)),
+            # include the exact branch boundaries
+            "humidity": float(rng.choice([19.99, 20, 29.99, 30, 39.99, 40, rng.uniform(10, 90)])),
+            "temperature": float(rng.choice([27, 27.01, 28, 28.01, 30, 30.01, rng.uniform(15, 35)])),
+        }
+        profile = {
+            "min_safe_blink_bpm": int(rng.integers(8, 18)),
+            "max_safe_blue": int(rng.integers(200, 800)),
+            "max_safe_focus_min": int(rng.integers(20, 60)),
+            "has_eye_surgery": int(rng.integers(0, 2)),
+            "has_dry_eye_condition": int(rng.integers(0, 2)),
+        }
+        pairs.append((sensor, profile))
+    return pairs
+
+
+# ----------------------------------------------------------
+# TC_IX1 - Identical scores, levels and ratios
+# ----------------------------------------------------------
+def test_batch_identical_to_scalar():
+    pairs = _random_pairs(3000)
+    batch = compute_indices_batch(pairs)
+
+    for i, (sensor, profile) in enumerate(pairs):
+        expected = compute_indices(sensor, profile)
+        for name in ["DEI", "BLI", "EFI"]:
+            assert batch[name]["score"][i] == expected[name]["score"]
+            assert batch[name]["level"][i] == expected[name]["level"]
+            assert batch[name]["ratio"][i] == expected[name]["ratio"]
+
+
+# ----------------------------------------------------------
+# TC_IX2 - Column input, optional fields use the same defaults
+# ----------------------------------------------------------
+def test_column_input_defaults():
+    columns = {
+        "blink_rate_bpm": [6, 14],
+        "blue_lux": [900, 300],
+        "focus_minutes": [70, 20],
+        "min_safe_blink_bpm": 12,
+        "max_safe_blue": 500,
+        "max_safe_focus_min": 40,
+    }
+    batch = compute_indices_batch(columns)
+
+    for i in range(2):
+        sensor = {k: columns[k][i] for k in ["blink_rate_bpm", "blue_lux", "focus_minutes"]}
+        profile = {k: columns[k] for k in ["min_safe_blink_bpm", "max_safe_blue", "max_safe_focus_min"]}
+        expected = compute_indices(sensor, profile)
+        for name in ["DEI", "BLI", "EFI"]:
+            assert batch[name]["score"][i] == expected[name]["score"]
+            assert batch[name]["ratio"][i] == expected[name]["ratio"]
@@ -0,0 +1,69 @@
+# ==========================================================
+# test_inference_batch.py
+# Batch inference must match the single-reading path
+# ==========================================================
+
+import numpy as np
+
+from inference import predict_alerts, predict_alerts_batch, build_feature_matrix, pairs_to_columns
+
+
+SENSORS = [
+    {"blink_rate_bpm": 6, "blue_lux": 900, "focus_minutes": 70, "ambient_lux": 800, "humidity": 25, "temperature": 26},
+    {"blink_rate_bpm": 18, "blue_lux": 200, "focus_minutes": 10, "ambient_lux": 400, "humidity": 50, "temperature": 22},
+    {"blink_rate_bpm": 11, "blue_lux": 520, "focus_minutes": 41, "ambient_lux": 600, "humidity": 35, "temperature": 29},
+]
+
+PROFILE = {
+    "min_safe_blink_bpm": 12,
+    "max_safe_blue": 500,
+    "max_safe_focus_min": 40,
+    "has_eye_surgery": 1,
+    "has_dry_eye_condition": 1,
+    "wears_protective_glasses": 0,
+}
+
+
+# ----------------------------------------------------------
+# TC_IB1 - Batch flags == per-reading flags
+# ----------------------------------------------------------
+def test_batch_matches_single():
+    batch = predict_alerts_batch([(s, PROFILE) for s in SENSORS])
+
+    for i, sensor in enumerate(SENSORS):
+        single = predict_alerts(sensor, PROFILE)
+        for label, value in single.items():
+            assert batch[label][i] == value
+
+
+# ----------------------------------------------------------
+# TC_IB2 - Column input with scalar profile values
+# ----------------------------------------------------------
+def test_column_input_broadcasts_profile():
+    columns = {k: [s[k] for s in SENSORS] for k in SENSORS[0]}
+    columns.update(PROFILE)
+
+    from_columns = predict_alerts_batch(columns)
+    from_pairs = predict_alerts_batch([(s, PROFILE) for s in SENSORS])
+
+    for label in from_pairs:
+        assert np.array_equal(from_columns[label], from_pairs[label])
+
+
+# ----------------------------------------------------------
+# TC_IB3 - Engineered deltas + column order
+# ----------------------------------------------------------
+def test_feature_matrix_deltas():
+    order = ["blink_deficit", "blue_excess", "focus_excess", "blink_rate_bpm"]
+    X = build_feature_matrix(pairs_to_columns([(SENSORS[0], PROFILE)]), order)
+
+    assert X.flags["C_CONTIGUOUS"]
+    assert X.tolist() == [[12 - 6, 900 - 500, 70 - 40, 6]]
+
+
+# ----------------------------------------------------------
+# TC_IB4 - Empty batch
+# ----------------------------------------------------------
+def test_empty_batch():
+    result = predict_alerts_batch([])
+    assert all(len(v) == 0 for v in result.values())
@@ -5,7 +5,7 @@
 
 import time
 import pytest
-from monitoring.metrics import MetricsEngine
+from monitoring.metrics import IBIWindow, MetricsEngine
 
 
 # ----------------------------------------------------------
@@ -114,3 +114,117 @@ def test_ibi_variance():
     m.ibi_values = [2, 4, 6]
 
     assert m.ibi_variance() == pytest.approx(2.66, rel=0.01)
+
+# ----------------------------------------------------------
+# TC_M8 - Sliding window keeps only the last N IBIs
+# ----------------------------------------------------------
+def test_ibi_window_slides(mocker):
+    """
+    window = 5, 9 blinks 1s..8s apart → IBIs [4,5,6,7,8] kept
+    """
+    m = MetricsEngine(ibi_window=5)
+
+    t = 0
+    for gap in [0, 1, 2, 3, 4, 5, 6, 7, 8]:
+        t += gap
+        mocker.patch("time.time", return_value=t)
+        m.update_blink(True)
+
+    assert m.ibi_values == [4, 5, 6, 7, 8]
+    assert m.get_latest_ibi() == 8
+    assert m.ibi_mean() == pytest.approx(6)
+    assert m.ibi_variance() == pytest.approx(2)
+
+
+# ----------------------------------------------------------
+# TC_M9 - Running variance matches a full recompute
+# ----------------------------------------------------------
+def test_running_variance_matches_recompute():
+    import random
+
+    random.seed(1)
+    m = MetricsEngine(ibi_window=20)
+    values = [random.uniform(0.5, 12) for _ in range(500)]
+
+    for v in values:
+        m.ibi.push(v)
+
+    window = values[-20:]
+    mean = sum(window) / 20
+    var = sum((x - mean) ** 2 for x in window) / 20
+
+    assert m.ibi_variance() == pytest.approx(var, rel=1e-9)
+
+
+# ----------------------------------------------------------
+# TC_M10 - IBI percentiles
+# ----------------------------------------------------------
+def test_ibi_percentile():
+    m = MetricsEngine()
+    m.ibi_values = [1, 2, 3, 4, 5]
+
+    assert m.ibi_percentile(50) == 3
+    assert m.ibi_percentile(90) == pytest.approx(4.6)
+
+    # sorted copy follows the sliding window (oldest out, newest in)
+    window = IBIWindow(4)
+    for v in [5, 1, 4, 1, 9, 2, 6]:
+        window.push(v)
+        assert window.ordered == sorted(window.values)
+    assert window.percentile(0) == 1 and window.percentile(100) == 9
+
+# ----------------------------------------------------------
+# TC_M11 - Event time: replayed readings use their own timestamps
+# ----------------------------------------------------------
+def test_event_time_replay(mocker):
+    """
+    10 blinks, 6 s apart (reading timestamps), replayed instantly
+    → IBI 6 s and 10 blinks/min without touching the wall clock
+    """
+    from datetime import datetime, timedelta
+
+    mocker.patch("time.time", return_value=999999)
+    m = MetricsEngine()
+    start = datetime(2026, 1, 1, 8, 0, 0)
+
+    for i in range(10):
+        m.update_blink(True, start + timedelta(seconds=6 * i))
+    m.update_blink(False, start + timedelta(seconds=60))
+
+    assert m.get_latest_ibi() == 6
+    assert m.get_session_time_minutes() == 1
+    assert m.calculate_blink_rate() == pytest.approx(10)
+
+
+# ----------------------------------------------------------
+# TC_M12 - Sliding-window blink rate forgets old blinks
+# ----------------------------------------------------------
+def test_window_blink_rate():
+    """
+    20 blinks in the first minute, then 3 in the next 60 s window
+    → window rate 3/min, session average (23 / 2 min) = 11.5/min
+    """
+    m = MetricsEngine(rate_window=60)
+
+    for i in range(20):
+        m.update_blink(True, 1000 + 3 * i)
+    for t in [1070, 1090, 1110]:
+        m.update_blink(True, t)
+    m.update_blink(False, 1120)
+
+    assert m.window_blink_rate() == pytest.approx(3)
+    assert m.calculate_blink_rate() == pytest.approx(11.5)
+
+
+# ----------------------------------------------------------
+# TC_M13 - Late readings do not produce negative IBIs
+# ----------------------------------------------------------
+def test_late_reading_ignored_for_ibi():
+    m = MetricsEngine()
+
+    m.update_blink(True, 100)
+    m.update_blink(True, 104)
+    m.update_blink(True, 101)   # arrives late
+
+    assert m.ibi_values == [4]
+    assert m.blink_count == 3
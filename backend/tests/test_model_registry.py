@@ -0,0 +1,100 @@
+# ==========================================================
+# test_model_registry.py
+# Unit tests for the AI ModelRegistry (load once + hot reload)
+# ==========================================================
+
+import json
+import os
+
+from model_registry import ModelRegistry
+
+
+def _make_registry(tmp_path):
+    model_path = tmp_path / "model.bin"
+    meta_path = tmp_path / "meta.json"
+    model_path.write_bytes(b"v1")
+    meta_path.write_text(json.dumps({"version": 1}))
+
+    calls = {"count": 0}
+
+    def loader():
+        calls["count"] += 1
+        return model_path.read_bytes(), json.loads(meta_path.read_text())
+
+    registry = ModelRegistry([str(model_path), str(meta_path)], loader)
+    return registry, calls, model_path, meta_path
+
+
+# ----------------------------------------------------------
+# TC_MR1 - Model is loaded once per process
+# ----------------------------------------------------------
+def test_get_loads_once(tmp_path):
+    registry, calls, _, _ = _make_registry(tmp_path)
+
+    first = registry.get()
+    second = registry.get()
+
+    assert calls["count"] == 1
+    assert first is second
+    assert first.model == b"v1"
+
+
+# ----------------------------------------------------------
+# TC_MR2 - Unchanged files → no reload
+# ----------------------------------------------------------
+def test_refresh_without_change(tmp_path):
+    registry, calls, _, _ = _make_registry(tmp_path)
+    registry.get()
+
+    assert registry.refresh_if_changed() is False
+    assert calls["count"] == 1
+
+
+# ----------------------------------------------------------
+# TC_MR3 - Touched but same content → no reload
+# ----------------------------------------------------------
+def test_refresh_touch_only(tmp_path):
+    registry, calls, model_path, _ = _make_registry(tmp_path)
+    registry.get()
+
+    st = os.stat(model_path)
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000))
+
+    assert registry.refresh_if_changed() is False
+    assert calls["count"] == 1
+
+
+# ----------------------------------------------------------
+# TC_MR4 - New content → atomic swap of model + meta
+# ----------------------------------------------------------
+def test_refresh_swaps_snapshot(tmp_path):
+    registry, calls, model_path, meta_path = _make_registry(tmp_path)
+    old = registry.get()
+
+    model_path.write_bytes(b"v2-new")
+    meta_path.write_text(json.dumps({"version": 2}))
+
+    assert registry.refresh_if_changed() is True
+
+    new = registry.get()
+    assert new is not old
+    assert new.model == b"v2-new"
+    assert new.meta == {"version": 2}
+    assert calls["count"] == 2
+
+
+# ----------------------------------------------------------
+# TC_MR5 - Broken reload keeps serving the old model
+# ----------------------------------------------------------
+def test_failed_reload_keeps_old(tmp_path):
+    registry, _, model_path, _ = _make_registry(tmp_path)
+    old = registry.get()
+
+    def broken_loader():
+        raise ValueError("corrupt pickle")
+
+    registry.loader = broken_loader
+    model_path.write_bytes(b"garbage!")
+
+    assert registry.refresh_if_changed() is False
+    assert registry.get() is old
@@ -0,0 +1,228 @@
+# ==========================================================
+# test_monitor.py
+# Watcher micro-batches: per-device dispatch, skips, batched writes
+# ==========================================================
+
+import asyncio
+import importlib
+import sys
+import types
+from datetime import datetime, timedelta
+
+import pytest
+
+from monitoring.engine_registry import MetricsEngineRegistry
+
+T0 = datetime(2025, 3, 1, 12, 0)
+USER_2 = "65f0c0ffee0000000000000a"     # users _id (FCM token lookup)
+
+MODULES = (
+    "monitoring.monitor",
+    "monitoring.rules",
+    "Controllers.notification_controller",
+    "Controllers.chart_metrics_controller",
+)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+
+class FakeDB:
+    def __init__(self, mocker):
+        self.mocker = mocker
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            collection = self.mocker.MagicMock()
+            collection.bulk_write = self.mocker.AsyncMock()
+            collection.insert_one = self.mocker.AsyncMock()
+            collection.insert_many = self.mocker.AsyncMock(
+                side_effect=lambda docs, **kwargs: self.mocker.MagicMock(inserted_ids=[f"{name}_{n}" for n in range(len(docs))])
+            )
+            collection.find.side_effect = lambda *args, **kwargs: FakeCursor([])
+            self.collections[name] = collection
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name in ("mocker", "collections"):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def monitor(mocker):
+    """
+    monitoring.monitor with fake `database` / firebase modules (no MongoDB, no FCM).
+    """
+    fake_db = FakeDB(mocker)
+    mocker.patch.dict(sys.modules, {
+        "database": types.SimpleNamespace(db=fake_db),
+        "firebase.firebase_client": types.SimpleNamespace(send_push_notification=mocker.MagicMock(), USER_FCM_TOKEN=""),
+    })
+    for name in MODULES:
+        sys.modules.pop(name, None)
+
+    # fresh import → fresh (process-wide) rule cooldowns
+    module = importlib.import_module("monitoring.monitor")
+
+    devices = {
+        "DEV_1": {"deviceId": "DEV_1", "is_linked": True, "power": True, "user_id": "u1", "form_id": "f1"},
+        "DEV_2": {"deviceId": "DEV_2", "is_linked": True, "power": True, "user_id": USER_2, "form_id": "f2"},
+        "DEV_UNLINKED": {"deviceId": "DEV_UNLINKED", "is_linked": False, "power": True, "user_id": "u3", "form_id": "f3"},
+        "DEV_OFF": {"deviceId": "DEV_OFF", "is_linked": True, "power": False, "user_id": "u4", "form_id": "f4"},
+        "DEV_LOCKED": {"deviceId": "DEV_LOCKED", "is_linked": True, "power": True, "errorLock": True, "user_id": "u5", "form_id": "f5"},
+    }
+    mocker.patch.object(
+        module.DEVICE_REGISTRY, "get_many", mocker.AsyncMock(side_effect=lambda ids: {i: devices.get(i) for i in ids})
+    )
+    mocker.patch.object(module.DEVICE_REGISTRY, "update", mocker.MagicMock())
+
+    yield module, fake_db
+    for name in MODULES:
+        sys.modules.pop(name, None)
+
+
+def _engines(*device_ids):
+    """
+    Engines that already saw a few blinks (IBIs 4, 5, 6 s) → no sensor error
+    for a normal reading.
+    """
+    engines = MetricsEngineRegistry(keep_snapshots=False)
+    for device_id in device_ids:
+        engine = engines.get(device_id).engine
+        for second in (0, 4, 9, 15):
+            engine.update_blink(True, T0 + timedelta(seconds=second))
+    return engines
+
+
+def _doc(device_id, second=16, clear=600, rgb=(30, 30, 10)):
+    r, g, b = rgb
+    return {
+        "deviceId": device_id,
+        "timestamp": T0 + timedelta(seconds=second),
+        "data": {"ir": {"rawValue": 0}, "rgb": {"r": r, "g": g, "b": b, "clear": clear}},
+    }
+
+
+# ----------------------------------------------------------
+# TC_MO1 - Each reading runs on its own device's engine, in stream order
+# ----------------------------------------------------------
+async def test_dispatch_per_device(monitor, mocker):
+    module, _ = monitor
+    engines = _engines("DEV_1", "DEV_2")
+    process = mocker.patch.object(module, "process_reading", mocker.AsyncMock())
+
+    await module.process_batch([_doc("DEV_1", 16), _doc("DEV_2", 17), _doc("DEV_1", 18)], engines)
+
+    calls = [(c.args[0]["deviceId"], c.args[0]["timestamp"].second, c.args[2].device_id) for c in process.await_args_list]
+    assert calls == [("DEV_1", 16, "DEV_1"), ("DEV_2", 17, "DEV_2"), ("DEV_1", 18, "DEV_1")]
+    assert process.await_args_list[0].args[2].engine is not process.await_args_list[1].args[2].engine
+
+
+# ----------------------------------------------------------
+# TC_MO2 - Unlinked, powered-off and locked devices are skipped
+# ----------------------------------------------------------
+async def test_inactive_devices_skipped(monitor, mocker):
+    module, _ = monitor
+    process = mocker.patch.object(module, "process_reading", mocker.AsyncMock())
+
+    await module.process_batch(
+        [_doc("DEV_UNLINKED"), _doc("DEV_OFF"), _doc("DEV_LOCKED"), _doc("DEV_UNKNOWN"), _doc("DEV_1")],
+        _engines("DEV_1"),
+    )
+
+    assert [c.args[0]["deviceId"] for c in process.await_args_list] == ["DEV_1"]
+
+
+# ----------------------------------------------------------
+# TC_MO3 - An error lock set earlier in the batch blocks the device's later readings
+# ----------------------------------------------------------
+async def test_lock_in_batch_blocks_later_readings(monitor):
+    module, db = monitor
+    engines = _engines("DEV_1")
+
+    await module.process_batch([_doc("DEV_1", 16, clear=0), _doc("DEV_1", 17, clear=200)], engines)
+
+    # only the bad reading ran: one lock, one sensor error, no low-light alert for the second
+    locks = db["devices"].bulk_write.await_args.args[0]
+    assert len(locks) == 1 and locks[0]._doc["$set"]["errorLock"] is True
+    notifications = db["notifications"].insert_many.await_args.args[0]
+    assert [n["title"] for n in notifications] == ["Incorrect Sensor Data"]
+    module.DEVICE_REGISTRY.update.assert_called_once_with("DEV_1", {"power": True, "errorLock": True})
+
+
+# ----------------------------------------------------------
+# TC_MO4 - One write per collection: locks, notifications (errors + alerts), chart metrics
+# ----------------------------------------------------------
+async def test_one_write_per_collection(monitor, mocker):
+    module, db = monitor
+    engines = _engines("DEV_1", "DEV_2")
+    engines.get("DEV_2").last_chart_save_time = T0 - timedelta(minutes=10)
+    shutdown = mocker.patch.object(module, "auto_shutdown", mocker.AsyncMock())
+
+    await module.process_batch([
+        _doc("DEV_1", 16, clear=0),            # sensor error → lock + notification
+        _doc("DEV_2", 16, clear=200),          # low light → rule alert + chart metrics due
+        _doc("DEV_2", 17, rgb=(10, 10, 30)),   # high blue → second rule alert
+    ], engines)
+    await asyncio.sleep(0)
+
+    assert db["devices"].bulk_write.await_count == 1
+    assert db["notifications"].insert_many.await_count == 1
+    db["notifications"].insert_one.assert_not_called()
+    assert db["chart_metrics"].insert_many.await_count == 1
+
+    notifications = db["notifications"].insert_many.await_args.args[0]
+    assert [n["metric_name"] for n in notifications[1:]] == ["low_light", "blue_light_only"]
+    assert all(n["deviceId"] == "DEV_2" and n["user_id"] == USER_2 for n in notifications[1:])
+
+    # FCM tokens: one users query for the batch's alerts
+    assert db["users"].find.call_count == 1
+
+    # auto shutdown only for the sensor error, with its stored id
+    shutdown.assert_awaited_once_with("notifications_0", "DEV_1", "u1", "f1")
+
+
+# ----------------------------------------------------------
+# TC_MO5 - Nothing to write → no round trip
+# ----------------------------------------------------------
+async def test_empty_batch_writes_nothing(monitor):
+    module, db = monitor
+
+    await module.process_batch([_doc("DEV_1")], _engines("DEV_1"))
+
+    assert not db.collections.get("notifications") or db["notifications"].insert_many.await_count == 0
+    assert not db.collections.get("chart_metrics") or db["chart_metrics"].insert_many.await_count == 0
+    db["devices"].bulk_write.assert_not_called()
+
+
+# ----------------------------------------------------------
+# TC_MO6 - A quiet rate window is a low-blink alert, only a blinkless session is a sensor error
+# ----------------------------------------------------------
+async def test_quiet_window_is_not_a_sensor_error(monitor):
+    module, db = monitor
+    engines = _engines("DEV_1")                          # blinks at 0-15 s
+    engines.get("DEV_2").engine.update_blink(False, T0)   # never blinked
+
+    await module.process_batch([_doc("DEV_1", 90), _doc("DEV_2", 90)], engines)
+
+    # DEV_1: window rate 0 but session rate 2.7 → rule alert, no lock
+    notifications = db["notifications"].insert_many.await_args.args[0]
+    assert [(n["deviceId"], n.get("metric_name")) for n in notifications] == [
+        ("DEV_2", None),                                  # sensor error (title only)
+        ("DEV_1", "low_blink_rate"),
+    ]
+    assert notifications[0]["title"] == "Incorrect Sensor Data" and "No blinks detected" in notifications[0]["message"]
+    locks = db["devices"].bulk_write.await_args.args[0]
+    assert [lock._filter["deviceId"] for lock in locks] == ["DEV_2"]
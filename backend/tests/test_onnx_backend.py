@@ -0,0 +1,37 @@
+# ==========================================================
+# test_onnx_backend.py
+# ONNX backend must agree with the compiled / sklearn paths
+# ==========================================================
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+from inference import build_model_registry
+from synthetic_data import generate_dataset
+
+
+# ----------------------------------------------------------
+# TC_OX1 - Same flags as sklearn on synthetic data
+# ----------------------------------------------------------
+def test_onnx_matches_sklearn():
+    onnx_snapshot = build_model_registry("onnx").get()
+    sk_snapshot = build_model_registry("sklearn").get()
+
+    X, _ = generate_dataset(n_profiles=20, windows_per_profile=50)
+    X = X[sk_snapshot.meta["feature_columns"]]
+
+    expected = sk_snapshot.model.predict(X)
+    got = onnx_snapshot.runtime.predict_matrix(X.to_numpy(dtype=np.float64))
+
+    for i, label in enumerate(sk_snapshot.meta["label_columns"]):
+        assert np.array_equal(got[label], expected[:, i]), label
+
+
+# ----------------------------------------------------------
+# TC_OX2 - Unknown backend name
+# ----------------------------------------------------------
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        build_model_registry("tensorflow")
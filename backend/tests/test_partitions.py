@@ -0,0 +1,125 @@
+# ==========================================================
+# test_partitions.py
+# Device partitioning + lease-based ownership
+# ==========================================================
+
+from monitoring.partitions import PartitionLeaseManager, partition_match, partition_of
+
+
+def _async_iter(items):
+    async def gen(*args, **kwargs):
+        for item in items:
+            yield item
+    return gen
+
+
+def _manager(mocker, live_workers, owned_leases, taken_leases=()):
+    leases = mocker.MagicMock()
+    leases.update_many = mocker.AsyncMock()
+    leases.update_one = mocker.AsyncMock(return_value=mocker.MagicMock(matched_count=1, upserted_id=None))
+    # 1st find → own leases, 2nd find → leases held by other live workers
+    leases.find = mocker.MagicMock(side_effect=[
+        _async_iter([{"_id": p} for p in owned_leases])(),
+        _async_iter([{"_id": p} for p in taken_leases])(),
+    ])
+
+    workers = mocker.MagicMock()
+    workers.update_one = mocker.AsyncMock()
+    workers.count_documents = mocker.AsyncMock(return_value=live_workers)
+
+    return PartitionLeaseManager(leases, workers, worker_id="w1", partitions=8, ttl=30)
+
+
+# ----------------------------------------------------------
+# TC_PT1 - Partition is stable and in range
+# ----------------------------------------------------------
+def test_partition_of_is_stable():
+    assert partition_of("DEV_1778451423129", 8) == partition_of("DEV_1778451423129", 8)
+    assert all(0 <= partition_of(f"DEV_{i}", 8) < 8 for i in range(200))
+    assert len({partition_of(f"DEV_{i}", 8) for i in range(200)}) == 8
+
+
+# ----------------------------------------------------------
+# TC_PT2 - Stream filter; old readings without partition go to 0
+# ----------------------------------------------------------
+def test_partition_match():
+    assert partition_match({3, 1}) == {"$match": {
+        "operationType": "insert",
+        "$or": [{"fullDocument.partition": {"$in": [1, 3]}}],
+    }}
+    assert {"fullDocument.partition": {"$exists": False}} in partition_match({0})["$match"]["$or"]
+
+
+# ----------------------------------------------------------
+# TC_PT3 - Second worker joins → first worker releases half
+# ----------------------------------------------------------
+async def test_release_above_fair_share(mocker):
+    manager = _manager(mocker, live_workers=2, owned_leases=range(8))
+    manager.owned = set(range(8))
+
+    assert await manager.heartbeat()
+    assert manager.owned == {0, 1, 2, 3}
+
+    release_filter = manager.leases.update_many.await_args_list[-1].args[0]
+    assert release_filter == {"_id": {"$in": [4, 5, 6, 7]}, "owner": "w1"}
+
+
+# ----------------------------------------------------------
+# TC_PT4 - New worker claims free partitions up to its share
+# ----------------------------------------------------------
+async def test_claim_free_partitions(mocker):
+    manager = _manager(mocker, live_workers=2, owned_leases=[], taken_leases=[0, 1, 2, 3])
+
+    assert await manager.heartbeat()
+    assert manager.owned == {4, 5, 6, 7}
+    assert manager.leases.update_one.await_count == 4
+
+
+# ----------------------------------------------------------
+# TC_PT5 - Per-partition tokens: events a previous owner processed are skipped
+# ----------------------------------------------------------
+async def test_resume_skips_events_of_advanced_partitions(mocker):
+    from monitoring.partitions import LeaseTokenStore
+
+    def token(position):
+        return {"_data": f"{position:04d}"}
+
+    def change(partition, position):
+        return {"_id": token(position), "fullDocument": {"partition": partition}}
+
+    manager = PartitionLeaseManager(mocker.MagicMock(), mocker.MagicMock(), worker_id="w1", partitions=8)
+    manager.owned = {1, 2}
+    manager.leases.find = mocker.MagicMock(side_effect=[_async_iter([
+        {"_id": 1, "resume_token": token(10)},
+        {"_id": 2, "resume_token": token(50)},
+    ])()])
+    manager.leases.update_many = mocker.AsyncMock()
+
+    store = LeaseTokenStore(manager, every_n=1)
+    assert await store.load() == token(10)
+
+    assert not store.skip(change(1, 20))
+    assert store.skip(change(2, 20))        # partition 2 was already at 50
+    assert store.skip(change(5, 60))        # not owned (lease lost)
+    assert not store.skip(change(2, 60))
+
+    # partition 2 only gets the stream token once the stream has passed 50
+    store.ahead[2] = token(50)
+    await store.advance(token(30))
+    assert manager.leases.update_many.await_args.args[0]["_id"] == {"$in": [1]}
+    await store.advance(token(70))
+    assert manager.leases.update_many.await_args.args[0]["_id"] == {"$in": [1, 2]}
+
+
+# ----------------------------------------------------------
+# TC_PT6 - renew() only extends this worker's own leases
+# ----------------------------------------------------------
+async def test_renew_extends_own_leases(mocker):
+    manager = _manager(mocker, live_workers=1, owned_leases=[])
+    manager.owned = {3, 1}
+
+    await manager.renew()
+
+    lease_filter = manager.leases.update_many.await_args.args[0]
+    assert lease_filter == {"_id": {"$in": [1, 3]}, "owner": "w1"}
+    manager.workers.update_one.assert_awaited_once()
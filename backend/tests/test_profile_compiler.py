@@ -0,0 +1,154 @@
+# ==========================================================
+# test_profile_compiler.py
+# Eye-health form → AI personalization profile
+# ==========================================================
+
+from datetime import datetime
+
+from profile_compiler import (
+    ProfileCache,
+    PROFILE_CACHE,
+    compile_profile,
+    invalidate_profile,
+    is_profile_current,
+    profile_version,
+)
+from profile_features import PROFILE_FEATURE_CACHE
+from synthetic_data import FEATURE_COLUMNS
+
+
+def _form(**overrides):
+    form = {
+        "full_name": "Test User",
+        "date_of_birth": datetime(2000, 1, 1),
+        "gender": "female",
+        "previous_eye_conditions": [],
+        "chronic_diseases": [],
+        "uses_glasses": False,
+        "uses_contact_lenses": False,
+        "eye_surgery_history": None,
+        "screen_time_hours": 4,
+        "lighting_conditions": "natural",
+        "sleep_hours": 8,
+        "current_eye_symptoms": [],
+    }
+    form.update(overrides)
+    return form
+
+
+def _thresholds(profile):
+    return (profile["min_safe_blink_bpm"], profile["max_safe_blue"], profile["max_safe_focus_min"])
+
+
+# ----------------------------------------------------------
+# TC_PC1 - Mapping reproduces the demo personas
+# ----------------------------------------------------------
+def test_personas():
+    normal = compile_profile(_form())
+    dry_eye = compile_profile(_form(current_eye_symptoms=["Dryness"]))
+    post_lasik = compile_profile(_form(eye_surgery_history="LASIK 2023"))
+
+    assert _thresholds(normal) == (12, 550, 45)
+    assert _thresholds(dry_eye) == (15, 430, 25)
+    assert _thresholds(post_lasik) == (14, 480, 35)
+
+    assert dry_eye["has_dry_eye_condition"] == 1
+    assert post_lasik["has_eye_surgery"] == 1
+    assert normal["has_eye_surgery"] == 0
+
+
+# ----------------------------------------------------------
+# TC_PC2 - Thresholds stay inside the training ranges
+# ----------------------------------------------------------
+def test_clamped_to_training_ranges():
+    worst = compile_profile(_form(
+        date_of_birth=datetime(1950, 1, 1),
+        previous_eye_conditions=["dry eye"],
+        chronic_diseases=["diabetes"],
+        uses_contact_lenses=True,
+        eye_surgery_history="cataract",
+        screen_time_hours=12,
+        lighting_conditions="dim",
+        current_eye_symptoms=["dryness", "eye strain"],
+    ))
+
+    assert 8 <= worst["min_safe_blink_bpm"] <= 18
+    assert 200 <= worst["max_safe_blue"] <= 800
+    assert 20 <= worst["max_safe_focus_min"] <= 60
+
+
+# ----------------------------------------------------------
+# TC_PC3 - Version only changes with profile-relevant fields
+# ----------------------------------------------------------
+def test_profile_version():
+    form = _form()
+    form["ai_profile"] = compile_profile(form)
+    assert is_profile_current(form)
+
+    form["full_name"] = "Renamed"
+    form["sleep_hours"] = 5
+    assert is_profile_current(form)
+
+    form["screen_time_hours"] = 10
+    assert not is_profile_current(form)
+    assert profile_version(form) != form["ai_profile"]["version"]
+
+
+# ----------------------------------------------------------
+# TC_PC4 - LRU cache + invalidation of both caches
+# ----------------------------------------------------------
+def test_cache_and_invalidate():
+    cache = ProfileCache(max_size=1)
+    cache.put("a", {"x": 1})
+    cache.put("b", {"x": 2})
+    assert cache.get("a") is None
+    assert cache.get("b") == {"x": 2}
+
+    profile = compile_profile(_form())
+    PROFILE_CACHE.put("form_inv", profile)
+    PROFILE_FEATURE_CACHE.get("form_inv", profile, FEATURE_COLUMNS)
+
+    invalidate_profile("form_inv")
+
+    assert PROFILE_CACHE.get("form_inv") is None
+    assert PROFILE_FEATURE_CACHE.peek("form_inv") is None
+
+
+# ----------------------------------------------------------
+# TC_PC5 - Cached profiles expire (edits made by other processes)
+# ----------------------------------------------------------
+def test_cache_ttl():
+    now = [100.0]
+    cache = ProfileCache(ttl=60, clock=lambda: now[0])
+    cache.put("a", {"x": 1})
+
+    now[0] += 59
+    assert cache.get("a") == {"x": 1}
+
+    now[0] += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+# ----------------------------------------------------------
+# TC_PC6 - Version follows the age band, not the birth date
+# ----------------------------------------------------------
+def test_version_uses_age_band():
+    young = _form(date_of_birth=datetime(2000, 1, 1))
+    also_young = _form(date_of_birth=datetime(2001, 6, 1))
+    senior = _form(date_of_birth=datetime(1950, 1, 1))
+
+    assert profile_version(young) == profile_version(also_young)
+    assert profile_version(young) != profile_version(senior)
+    assert compile_profile(senior)["min_safe_blink_bpm"] == compile_profile(young)["min_safe_blink_bpm"] + 1
+
+
+# ----------------------------------------------------------
+# TC_PC7 - Protective glasses aren't on the form → always 0
+# ----------------------------------------------------------
+def test_protective_glasses_default():
+    form = dict(_form(), uses_glasses=True)
+    profile = compile_profile(form)
+
+    assert profile["wears_protective_glasses"] == 0
+    assert compile_profile(dict(form, wears_protective_glasses=True))["max_safe_blue"] == profile["max_safe_blue"]
@@ -0,0 +1,110 @@
+# ==========================================================
+# test_profile_features.py
+# Cached per-form profile feature block
+# ==========================================================
+
+import threading
+
+from inference import predict_alerts, predict_alerts_for_form
+from profile_features import ProfileFeatureCache, PROFILE_FEATURE_CACHE, invalidate_profile_features
+from synthetic_data import FEATURE_COLUMNS
+from tree_compiler import feature_row_from_dicts
+
+SENSOR = {"blink_rate_bpm": 6, "blue_lux": 900, "focus_minutes": 70, "ambient_lux": 800, "humidity": 25, "temperature": 26}
+PROFILE = {
+    "min_safe_blink_bpm": 12,
+    "max_safe_blue": 500,
+    "max_safe_focus_min": 40,
+    "has_eye_surgery": 1,
+    "has_dry_eye_condition": 1,
+    "wears_protective_glasses": 0,
+}
+
+
+# ----------------------------------------------------------
+# TC_PF1 - Filled row == full row built from dicts
+# ----------------------------------------------------------
+def test_fill_matches_full_row():
+    cache = ProfileFeatureCache()
+    block = cache.get("form_1", PROFILE, FEATURE_COLUMNS)
+
+    assert block.fill(SENSOR) == feature_row_from_dicts(SENSOR, PROFILE, FEATURE_COLUMNS)
+
+    other = dict(SENSOR, blink_rate_bpm=20, blue_lux=100)
+    assert block.fill(other) == feature_row_from_dicts(other, PROFILE, FEATURE_COLUMNS)
+
+
+# ----------------------------------------------------------
+# TC_PF2 - Same profile → cached block; invalidate rebuilds
+# ----------------------------------------------------------
+def test_invalidate_rebuilds_block():
+    cache = ProfileFeatureCache()
+    first = cache.get("form_1", PROFILE, FEATURE_COLUMNS)
+    assert cache.get("form_1", dict(PROFILE), FEATURE_COLUMNS) is first
+
+    cache.invalidate("form_1")
+    rebuilt = cache.get("form_1", PROFILE, FEATURE_COLUMNS)
+    assert rebuilt is not first
+
+
+# ----------------------------------------------------------
+# TC_PF6 - Form edited elsewhere → new profile version rebuilds the block
+# ----------------------------------------------------------
+def test_stale_block_rebuilt_on_new_version():
+    cache = ProfileFeatureCache()
+    first = cache.get("form_1", dict(PROFILE, version="v1"), FEATURE_COLUMNS)
+
+    # no invalidate() call reached this process
+    changed = dict(PROFILE, min_safe_blink_bpm=15, version="v2")
+    rebuilt = cache.get("form_1", changed, FEATURE_COLUMNS)
+
+    assert rebuilt is not first
+    assert rebuilt.min_safe_blink == 15
+    assert cache.get("form_1", changed, FEATURE_COLUMNS) is rebuilt
+
+    # unversioned profiles are compared by value
+    plain = cache.get("form_2", PROFILE, FEATURE_COLUMNS)
+    assert cache.get("form_2", dict(PROFILE, max_safe_blue=300), FEATURE_COLUMNS) is not plain
+
+
+# ----------------------------------------------------------
+# TC_PF3 - LRU bound
+# ----------------------------------------------------------
+def test_cache_is_bounded():
+    cache = ProfileFeatureCache(max_size=2)
+    cache.get("a", PROFILE, FEATURE_COLUMNS)
+    cache.get("b", PROFILE, FEATURE_COLUMNS)
+    cache.get("a", PROFILE, FEATURE_COLUMNS)
+    cache.get("c", PROFILE, FEATURE_COLUMNS)
+
+    assert len(cache) == 2
+    assert cache.peek("b") is None
+    assert cache.peek("a") is not None
+
+
+# ----------------------------------------------------------
+# TC_PF4 - Each thread gets its own row buffer
+# ----------------------------------------------------------
+def test_buffer_per_thread():
+    block = ProfileFeatureCache().get("form_1", PROFILE, FEATURE_COLUMNS)
+    rows = {}
+
+    def worker(name):
+        rows[name] = block.fill(SENSOR)
+
+    t = threading.Thread(target=worker, args=("t1",))
+    t.start()
+    t.join()
+    worker("main")
+
+    assert rows["t1"] is not rows["main"]
+
+
+# ----------------------------------------------------------
+# TC_PF5 - Cached path gives the same flags
+# ----------------------------------------------------------
+def test_predict_alerts_for_form():
+    invalidate_profile_features("form_x")
+
+    assert predict_alerts_for_form("form_x", SENSOR, PROFILE) == predict_alerts(SENSOR, PROFILE)
+    assert PROFILE_FEATURE_CACHE.peek("form_x") is not None
@@ -0,0 +1,103 @@
+# ==========================================================
+# test_rate_limit.py
+# Per-device token-bucket admission control for readings ingestion
+# ==========================================================
+
+import importlib
+import sys
+import types
+
+import pytest
+
+from monitoring.rate_limit import TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# ----------------------------------------------------------
+# TC_RL1 - Burst is admitted, then readings are shed until refill
+# ----------------------------------------------------------
+def test_burst_then_refill():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate=2, burst=3, clock=clock)
+
+    assert [limiter.acquire("DEV_1") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("DEV_1") == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert limiter.acquire("DEV_1") == 0.0
+
+    clock.now += 100           # refill is capped at the burst size
+    assert sum(limiter.acquire("DEV_1") == 0.0 for _ in range(5)) == 3
+
+
+# ----------------------------------------------------------
+# TC_RL2 - One flooding device does not affect the others
+# ----------------------------------------------------------
+def test_devices_are_isolated():
+    limiter = TokenBucketLimiter(rate=1, burst=2, clock=FakeClock())
+
+    for _ in range(50):
+        limiter.acquire("LOOPING")
+
+    assert limiter.acquire("DEV_OK") == 0.0
+    stats = limiter.stats()
+    assert stats["rejected"] == 48 and stats["allowed"] == 3
+    assert stats["top_rejected_devices"] == [{"deviceId": "LOOPING", "rejected": 48}]
+
+
+# ----------------------------------------------------------
+# TC_RL3 - Tracked devices are bounded (LRU), disabled limiter admits all
+# ----------------------------------------------------------
+def test_bounded_and_disabled():
+    limiter = TokenBucketLimiter(rate=1, burst=1, max_devices=2, clock=FakeClock())
+    for device_id in ("A", "B", "C"):
+        limiter.acquire(device_id)
+    assert len(limiter) == 2
+
+    disabled = TokenBucketLimiter(rate=1, burst=1, enabled=False)
+    assert all(disabled.acquire("A") == 0.0 for _ in range(10))
+
+
+# ----------------------------------------------------------
+# TC_RL4 - create_reading answers 429 + Retry-After before any DB call
+# ----------------------------------------------------------
+async def test_create_reading_429(mocker):
+    mocker.patch.dict(sys.modules, {"database": types.SimpleNamespace(db={"raw_readings": mocker.MagicMock()})})
+    sys.modules.pop("Controllers.readings_controller", None)
+    module = importlib.import_module("Controllers.readings_controller")
+
+    clock = FakeClock()
+    mocker.patch.object(module, "READINGS_RATE_LIMITER", TokenBucketLimiter(rate=0.5, burst=0, clock=clock))
+    lookup = mocker.patch.object(module.DEVICE_REGISTRY, "get", mocker.AsyncMock())
+
+    try:
+        with pytest.raises(module.HTTPException) as exc:
+            await module.create_reading(module.ReadingModel(deviceId="DEV_1", data={}))
+
+        assert exc.value.status_code == 429
+        assert exc.value.headers == {"Retry-After": "2"}
+        lookup.assert_not_called()
+    finally:
+        sys.modules.pop("Controllers.readings_controller", None)
+
+
+# ----------------------------------------------------------
+# TC_RL5 - A batch takes one token per reading, the excess is shed
+# ----------------------------------------------------------
+def test_acquire_many():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate=2, burst=5, clock=clock)
+
+    assert limiter.acquire_many("A", 8) == (5, 0.5)        # larger than the burst: still drains
+    assert limiter.acquire_many("A", 1) == (0, 0.5)
+
+    clock.now += 1.5
+    assert limiter.acquire_many("A", 4) == (3, 0.5)
+    assert limiter.stats()["allowed"] == 8 and limiter.stats()["rejected"] == 5
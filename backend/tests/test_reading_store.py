@@ -0,0 +1,251 @@
+# ==========================================================
+# test_reading_store.py
+# Raw readings storage: per-sample documents vs per-minute buckets
+# ==========================================================
+
+from datetime import datetime
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from monitoring.partitions import partition_of
+from monitoring.reading_store import (
+    bucket_id,
+    change_stream_match,
+    find_readings,
+    readings_from_change,
+    store_readings,
+)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field])
+        return self
+
+    def __aiter__(self):
+        async def gen():
+            for doc in self.docs:
+                yield doc
+        return gen()
+
+
+def _doc(device_id, second, minute=0, **extra):
+    return {
+        "deviceId": device_id,
+        "user_id": "u1",
+        "form_id": "f1",
+        "timestamp": datetime(2025, 3, 1, 12, minute, second),
+        "data": {"ir": {"rawValue": 1}},
+        **extra,
+    }
+
+
+@pytest.fixture
+def db(mocker):
+    collection = mocker.MagicMock()
+    collection.bulk_write = mocker.AsyncMock()
+    collection.insert_many = mocker.AsyncMock()
+    return {"raw_readings": collection, "raw_reading_buckets": collection}, collection
+
+
+# ----------------------------------------------------------
+# TC_RS1 - One upsert per device per minute
+# ----------------------------------------------------------
+async def test_buckets_group_by_device_and_minute(db):
+    fake_db, collection = db
+    docs = [_doc("DEV_1", 5), _doc("DEV_1", 40), _doc("DEV_2", 7), _doc("DEV_1", 2, minute=1)]
+
+    failed = await store_readings(fake_db, docs, storage="buckets")
+
+    assert failed == {}
+    operations = collection.bulk_write.await_args.args[0]
+    assert collection.bulk_write.await_args.kwargs["ordered"] is False
+    assert len(operations) == 3
+
+    first = operations[0]._doc
+    assert operations[0]._filter == {
+        "_id": bucket_id("DEV_1", datetime(2025, 3, 1, 12, 0)),
+        "samples._id": {"$ne": docs[0]["_id"]},
+    }
+    assert [s["timestamp"].second for s in first["$push"]["samples"]["$each"]] == [5, 40]
+    assert first["$inc"] == {"count": 2}
+    assert first["$setOnInsert"]["partition"] == partition_of("DEV_1")
+    assert all("_id" in doc for doc in docs)     # ids assigned for the API response
+
+
+# ----------------------------------------------------------
+# TC_RS2 - A failed bucket write fails all of its readings
+# ----------------------------------------------------------
+async def test_bucket_errors_map_to_readings(db):
+    fake_db, collection = db
+    collection.bulk_write.side_effect = BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "too large"}]})
+
+    failed = await store_readings(fake_db, [_doc("DEV_1", 1), _doc("DEV_2", 1), _doc("DEV_2", 2)], storage="buckets")
+
+    assert failed == {1: "too large", 2: "too large"}
+
+
+# ----------------------------------------------------------
+# TC_RS8 - Retried bucket write: samples already pushed are not pushed again
+# ----------------------------------------------------------
+async def test_bucket_retry_is_idempotent(db):
+    fake_db, collection = db
+    duplicate = {"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}
+    collection.bulk_write.side_effect = [
+        BulkWriteError({"writeErrors": [duplicate, {"index": 1, "errmsg": "too large"}]}),
+        BulkWriteError({"writeErrors": [duplicate]}),
+    ]
+
+    failed = await store_readings(fake_db, [_doc("DEV_1", 1), _doc("DEV_2", 1)], storage="buckets", retry=True)
+
+    # DEV_1's push already in its bucket → stored, not failed, not pushed twice
+    assert failed == {1: "too large"}
+    second = collection.bulk_write.await_args_list[1].args[0]
+    assert len(second) == 1
+    assert second[0] is collection.bulk_write.await_args_list[0].args[0][0]
+
+
+# ----------------------------------------------------------
+# TC_RS3 - Documents mode keeps one insert per sample
+# ----------------------------------------------------------
+async def test_documents_mode(db):
+    fake_db, collection = db
+
+    await store_readings(fake_db, [_doc("DEV_1", 1), _doc("DEV_1", 2)], storage="documents")
+
+    assert len(collection.insert_many.await_args.args[0]) == 2
+    collection.bulk_write.assert_not_called()
+
+
+# ----------------------------------------------------------
+# TC_RS4 - Bucket change events give only the new readings
+# ----------------------------------------------------------
+def test_readings_from_bucket_changes():
+    key = bucket_id("DEV_1", datetime(2025, 3, 1, 12, 0))
+    s1 = {"_id": 1, "timestamp": datetime(2025, 3, 1, 12, 0, 1), "data": {"n": 1}}
+    s2 = {"_id": 2, "timestamp": datetime(2025, 3, 1, 12, 0, 2), "data": {"n": 2}}
+    s3 = {"_id": 3, "timestamp": datetime(2025, 3, 1, 12, 0, 3), "data": {"n": 3}, "direct": True}
+
+    inserted = readings_from_change(
+        {"operationType": "insert", "documentKey": {"_id": key}, "fullDocument": {"_id": key, "deviceId": "DEV_1", "samples": [s1]}},
+        storage="buckets",
+    )
+    assert [doc["data"] for doc in inserted] == [{"n": 1}]
+
+    updated = readings_from_change(
+        {
+            "operationType": "update",
+            "documentKey": {"_id": key},
+            "updateDescription": {"updatedFields": {"samples.2": s3, "samples.1": s2, "count": 3, "last_push": 2}},
+        },
+        storage="buckets",
+    )
+    assert [(doc["deviceId"], doc["data"]) for doc in updated] == [("DEV_1", {"n": 2}), ("DEV_1", {"n": 3})]
+    # direct flag kept → the watcher checks it against the direct pipeline
+    assert updated[1]["direct"] is True
+
+    whole = readings_from_change(
+        {
+            "operationType": "update",
+            "documentKey": {"_id": key},
+            "updateDescription": {"updatedFields": {"samples": [s1, s2], "last_push": 1}},
+        },
+        storage="buckets",
+    )
+    assert [doc["_id"] for doc in whole] == [2]
+
+
+# ----------------------------------------------------------
+# TC_RS5 - find_readings unpacks buckets in time order and range
+# ----------------------------------------------------------
+async def test_find_readings_unpacks_buckets(mocker):
+    collection = mocker.MagicMock()
+    start0, start1 = datetime(2025, 3, 1, 12, 0), datetime(2025, 3, 1, 12, 1)
+    buckets = [
+        {"_id": bucket_id("DEV_1", start1), "deviceId": "DEV_1", "start": start1, "samples": [
+            {"_id": 3, "timestamp": datetime(2025, 3, 1, 12, 1, 30), "data": {}},
+        ]},
+        {"_id": bucket_id("DEV_1", start0), "deviceId": "DEV_1", "start": start0, "samples": [
+            {"_id": 2, "timestamp": datetime(2025, 3, 1, 12, 0, 50), "data": {}},
+            {"_id": 1, "timestamp": datetime(2025, 3, 1, 12, 0, 10), "data": {}},
+            {"_id": 2, "timestamp": datetime(2025, 3, 1, 12, 0, 50), "data": {}},   # retried push
+        ]},
+    ]
+    collection.find.return_value = FakeCursor(buckets)
+
+    docs = [
+        doc async for doc in find_readings(
+            {"raw_reading_buckets": collection}, "DEV_1",
+            start=datetime(2025, 3, 1, 12, 0, 20), storage="buckets",
+        )
+    ]
+
+    assert [doc["_id"] for doc in docs] == [2, 3]
+    assert collection.find.call_args.args[0] == {"deviceId": "DEV_1", "start": {"$gte": start0}}
+
+
+# ----------------------------------------------------------
+# TC_RS6 - Bucket change-stream filter uses the partition in _id
+# ----------------------------------------------------------
+def test_bucket_stream_match():
+    match = change_stream_match({3, 1}, storage="buckets")["$match"]
+
+    assert match["documentKey._id.p"] == {"$in": [1, 3]}
+    assert match["operationType"] == {"$in": ["insert", "update"]}
+
+
+# ----------------------------------------------------------
+# TC_RS7 - Old readings are deleted in bounded batches
+# ----------------------------------------------------------
+async def test_delete_in_batches(mocker):
+    from monitoring.reading_store import delete_readings
+
+    collection = mocker.MagicMock()
+    pages = [[{"_id": 1}, {"_id": 2}], [{"_id": 3}]]
+
+    def find(query, projection):
+        cursor = mocker.MagicMock()
+        cursor.limit.return_value = FakeCursor(pages.pop(0) if pages else [])
+        return cursor
+
+    collection.find.side_effect = find
+    collection.delete_many = mocker.AsyncMock(side_effect=lambda q: mocker.MagicMock(deleted_count=len(q["_id"]["$in"])))
+
+    deleted = await delete_readings({"raw_readings": collection}, "DEV_1", datetime(2025, 3, 1), batch_size=2, storage="documents")
+
+    assert deleted == 3
+    assert collection.delete_many.await_count == 2
+    assert collection.find.call_args.args[0] == {"deviceId": "DEV_1", "timestamp": {"$lt": datetime(2025, 3, 1)}}
+
+
+# ----------------------------------------------------------
+# TC_RS9 - Delete bounded by ingest: newer readings and samples are kept
+# ----------------------------------------------------------
+async def test_delete_up_to_max_id(mocker):
+    from monitoring.reading_store import delete_readings
+
+    collection = mocker.MagicMock()
+    collection.find.side_effect = lambda query, projection: mocker.MagicMock(limit=lambda n: FakeCursor([{"_id": 1}]))
+    collection.delete_many = mocker.AsyncMock(return_value=mocker.MagicMock(deleted_count=1))
+    collection.update_many = mocker.AsyncMock()
+    before = datetime(2025, 3, 1)
+
+    await delete_readings({"raw_readings": collection}, "DEV_1", before, storage="documents", max_id=10)
+    assert collection.find.call_args.args[0]["_id"] == {"$lt": 10}
+    assert collection.delete_many.await_args.args[0]["_id"] == {"$lt": 10, "$in": [1]}
+    collection.update_many.assert_not_called()
+
+    await delete_readings({"raw_reading_buckets": collection}, "DEV_1", before, storage="buckets", max_id=10)
+    # older samples pulled out of mixed buckets, only fully old buckets deleted
+    pulled, pipeline = collection.update_many.await_args.args
+    assert pulled["samples._id"] == {"$gte": 10}
+    assert pipeline[1]["$set"]["last_push"] == 0
+    assert collection.find.call_args.args[0]["samples"] == {"$not": {"$elemMatch": {"_id": {"$gte": 10}}}}
+
+    # the pull is not reported to the watcher as new readings
+    change = {"operationType": "update", "documentKey": {"_id": bucket_id("DEV_1", before)}, "updateDescription": {"updatedFields": {"samples": [{"_id": 11}], "last_push": 0}}}
+    assert readings_from_change(change, storage="buckets") == []
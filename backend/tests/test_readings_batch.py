@@ -0,0 +1,213 @@
+# ==========================================================
+# test_readings_batch.py
+# POST /api/readings/batch controller (per-item results)
+# ==========================================================
+
+import importlib
+import sys
+import types
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from monitoring.rate_limit import TokenBucketLimiter
+
+
+@pytest.fixture
+def controller(mocker):
+    """
+    readings_controller with a fake `database` module (no MongoDB connection).
+    """
+    collection = mocker.MagicMock()
+    fake_db = {"raw_readings": collection}
+    mocker.patch.dict(sys.modules, {"database": types.SimpleNamespace(db=fake_db)})
+    sys.modules.pop("Controllers.readings_controller", None)
+
+    module = importlib.import_module("Controllers.readings_controller")
+    # fresh buckets per test (the process-wide limiter outlives the module)
+    mocker.patch.object(module, "READINGS_RATE_LIMITER", TokenBucketLimiter())
+
+    devices = {
+        "DEV_1": {"deviceId": "DEV_1", "is_linked": True, "power": True, "user_id": "u1", "form_id": "f1"},
+        "DEV_OFF": {"deviceId": "DEV_OFF", "is_linked": True, "power": False, "user_id": "u2", "form_id": "f2"},
+    }
+    get_many = mocker.patch.object(
+        module.DEVICE_REGISTRY,
+        "get_many",
+        mocker.AsyncMock(side_effect=lambda ids: {i: devices.get(i) for i in ids}),
+    )
+
+    def insert_many(docs, ordered=True):
+        for n, doc in enumerate(docs):
+            doc["_id"] = f"oid_{n}"
+        return mocker.MagicMock()
+
+    collection.insert_many = mocker.AsyncMock(side_effect=insert_many)
+
+    yield module, collection, get_many
+    sys.modules.pop("Controllers.readings_controller", None)
+
+
+def _reading(device_id="DEV_1", **extra):
+    return {"deviceId": device_id, "data": {"ir": {"rawValue": 1}}, **extra}
+
+
+# ----------------------------------------------------------
+# TC_RB1 - Valid readings: one device query, one unordered insert
+# ----------------------------------------------------------
+async def test_batch_inserts_in_one_call(controller, mocker):
+    module, collection, get_many = controller
+    mocker.patch("monitoring.sampling.SAMPLING_ADAPTIVE_ENABLED", True)
+
+    result = await module.create_readings_batch([_reading(), _reading(), _reading()])
+
+    assert result["success"] is True
+    assert result["inserted"] == 3
+    assert [r["inserted_id"] for r in result["results"]] == ["oid_0", "oid_1", "oid_2"]
+
+    get_many.assert_awaited_once()
+    assert get_many.await_args.args[0] == ["DEV_1"]
+
+    docs = collection.insert_many.await_args.args[0]
+    assert collection.insert_many.await_args.kwargs["ordered"] is False
+    assert all(doc["user_id"] == "u1" and doc["timestamp"] is not None for doc in docs)
+
+    # next sampling / upload interval per device
+    assert result["sampling"]["DEV_1"]["interval_ms"] > 0
+
+
+# ----------------------------------------------------------
+# TC_RB2 - Invalid / inactive items are reported, the rest inserted
+# ----------------------------------------------------------
+async def test_per_item_errors(controller):
+    module, collection, _ = controller
+
+    result = await module.create_readings_batch([
+        _reading(),
+        {"deviceId": "DEV_1"},              # no data → invalid
+        _reading("DEV_OFF"),                # device off
+        _reading("DEV_UNKNOWN"),
+        _reading(timestamp="2026-01-01T10:00:00"),
+    ])
+
+    assert result["inserted"] == 2
+    assert result["rejected"] == 3
+    assert [r["success"] for r in result["results"]] == [True, False, False, False, True]
+    assert "Invalid reading" in result["results"][1]["error"]
+    assert len(collection.insert_many.await_args.args[0]) == 2
+
+
+# ----------------------------------------------------------
+# TC_RB3 - Insert errors map back to the right items
+# ----------------------------------------------------------
+async def test_insert_errors_map_to_items(controller):
+    module, collection, _ = controller
+
+    def insert_many(docs, ordered=True):
+        for n, doc in enumerate(docs):
+            doc["_id"] = f"oid_{n}"
+        raise BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "duplicate key"}], "nInserted": 2})
+
+    collection.insert_many.side_effect = insert_many
+
+    result = await module.create_readings_batch([_reading("DEV_OFF"), _reading(), _reading(), _reading()])
+
+    assert [r["success"] for r in result["results"]] == [False, True, False, True]
+    assert result["results"][2]["error"] == "duplicate key"
+
+
+# ----------------------------------------------------------
+# TC_RB4 - Oversized batch is refused
+# ----------------------------------------------------------
+async def test_batch_too_large(controller):
+    module, _, _ = controller
+    module.READINGS_BATCH_MAX = 2
+
+    with pytest.raises(module.HTTPException) as exc:
+        await module.create_readings_batch([_reading()] * 3)
+
+    assert exc.value.status_code == 413
+
+
+# ----------------------------------------------------------
+# TC_RB5 - msgpack body goes through the same per-item path
+# ----------------------------------------------------------
+async def test_binary_batch(controller):
+    module, collection, _ = controller
+    from Models.readings_codec import encode_reading, pack_readings
+
+    payload = pack_readings([
+        encode_reading("DEV_1", None, 1, 10, 20, 30, 400),
+        encode_reading("DEV_1", None, 1.5, 10, 20, 30, 400),   # ir not an integer
+    ])
+
+    result = await module.create_readings_binary(payload)
+
+    assert [r["success"] for r in result["results"]] == [True, False]
+    assert collection.insert_many.await_args.args[0][0]["data"]["rgb"]["clear"] == 400
+
+    with pytest.raises(module.HTTPException) as exc:
+        await module.create_readings_binary(b"\xc1")
+    assert exc.value.status_code == 400
+
+
+# ----------------------------------------------------------
+# TC_RB6 - Batch is charged per device: readings over the limit are shed per item
+# ----------------------------------------------------------
+async def test_batch_rate_limited(controller, mocker):
+    module, collection, get_many = controller
+    mocker.patch.object(module, "READINGS_RATE_LIMITER", TokenBucketLimiter(rate=0.5, burst=2))
+
+    result = await module.create_readings_batch([_reading(), _reading(), _reading(), _reading("DEV_OFF")])
+
+    assert [r["success"] for r in result["results"]] == [True, True, False, False]
+    assert result["results"][2] == {"index": 2, "success": False, "error": "Too many readings from this device", "retry_after": 2}
+    assert "retry_after" not in result["results"][3]        # DEV_OFF has its own bucket
+    assert len(collection.insert_many.await_args.args[0]) == 2
+
+    # whole batch over the limit → 429 before any DB call
+    get_many.reset_mock()
+    with pytest.raises(module.HTTPException) as exc:
+        await module.create_readings_batch([_reading(), _reading()])
+    assert exc.value.status_code == 429 and exc.value.headers == {"Retry-After": "2"}
+    get_many.assert_not_called()
+
+
+# ----------------------------------------------------------
+# TC_RB7 - msgpack batches are charged the same way
+# ----------------------------------------------------------
+async def test_binary_rate_limited(controller, mocker):
+    module, collection, _ = controller
+    from Models.readings_codec import encode_reading, pack_readings
+    limiter = mocker.patch.object(module, "READINGS_RATE_LIMITER", TokenBucketLimiter(rate=1, burst=1))
+
+    payload = pack_readings([encode_reading("DEV_1", None, 1, 10, 20, 30, 400)] * 3)
+    result = await module.create_readings_binary(payload)
+
+    assert [r["success"] for r in result["results"]] == [True, False, False]
+    assert result["results"][1]["retry_after"] == 1
+    assert limiter.stats()["rejected"] == 2
+
+    with pytest.raises(module.HTTPException) as exc:
+        await module.create_readings_binary(payload)
+    assert exc.value.status_code == 429
+
+
+# ----------------------------------------------------------
+# TC_RB8 - "Z" / offset timestamps are stored (and run direct) as naive UTC
+# ----------------------------------------------------------
+async def test_timestamps_naive_utc(controller):
+    from datetime import datetime
+
+    module, collection, _ = controller
+
+    await module.create_readings_batch([
+        _reading(timestamp="2025-03-01T12:00:05Z"),
+        _reading(timestamp="2025-03-01T14:00:05+02:00"),
+        _reading(timestamp="2025-03-01T12:00:05"),
+    ])
+
+    docs = collection.insert_many.await_args.args[0]
+    assert [doc["timestamp"] for doc in docs] == [datetime(2025, 3, 1, 12, 0, 5)] * 3
+    # comparable with the naive times of snapshots / change events
+    assert docs[0]["timestamp"] - datetime(2025, 3, 1, 12, 0) == docs[1]["timestamp"] - datetime(2025, 3, 1, 12, 0)
@@ -0,0 +1,110 @@
+# ==========================================================
+# test_readings_codec.py
+# Compact msgpack reading format (Models/readings_codec.py)
+# ==========================================================
+
+from datetime import datetime
+
+import msgpack
+import pytest
+
+from Models.readings_codec import (
+    ReadingDecodeError,
+    decode_reading,
+    decode_readings,
+    encode_reading,
+    pack_readings,
+)
+from Models.readings_model import ReadingModel
+
+
+# ----------------------------------------------------------
+# TC_RC1 - Round trip gives the same fields as the JSON reading
+# ----------------------------------------------------------
+def test_round_trip_matches_json_model():
+    ts = datetime(2025, 3, 1, 12, 30, 15, 250000)
+    payload = msgpack.packb(encode_reading("DEV_1", ts, 1, 120, 80, 40, 900, humidity=45.5, temperature=31))
+
+    [reading] = decode_readings(payload)
+    expected = ReadingModel(
+        deviceId="DEV_1",
+        timestamp=ts,
+        data={"ir": {"rawValue": 1}, "rgb": {"r": 120, "g": 80, "b": 40, "clear": 900}, "humidity": 45.5, "temperature": 31},
+    )
+
+    assert reading.dict() == expected.dict()
+
+
+# ----------------------------------------------------------
+# TC_RC2 - Binary payload is much smaller than JSON
+# ----------------------------------------------------------
+def test_payload_smaller_than_json():
+    import json
+
+    ts = datetime(2025, 3, 1, 12, 30, 15)
+    binary = msgpack.packb(encode_reading("DEV_1", ts, 1, 120, 80, 40, 900, 45.5, 31.2))
+    text = json.dumps({
+        "deviceId": "DEV_1",
+        "timestamp": ts.isoformat(),
+        "data": {"ir": {"rawValue": 1}, "rgb": {"r": 120, "g": 80, "b": 40, "clear": 900}, "humidity": 45.5, "temperature": 31.2},
+    })
+
+    assert len(binary) * 2 < len(text)
+
+
+# ----------------------------------------------------------
+# TC_RC3 - Bad records are rejected one by one
+# ----------------------------------------------------------
+def test_bad_records():
+    good = encode_reading("DEV_1", None, 0, 1, 2, 3, 4)
+
+    results = decode_readings(pack_readings([
+        good,
+        [2] + good[1:],                       # unknown version
+        good[:5],                             # too short
+        good[:3] + ["1"] + good[4:],          # ir as string
+        good[:1] + [None] + good[2:],         # no deviceId
+        good[:2] + [2 ** 62] + good[3:],      # timestamp out of range
+        good[:2] + [-(2 ** 62)] + good[3:],
+    ]))
+
+    assert isinstance(results[0], ReadingModel)
+    assert all(isinstance(r, ReadingDecodeError) for r in results[1:])
+    assert "version" in str(results[1])
+    assert "out of range" in str(results[5])
+
+
+# ----------------------------------------------------------
+# TC_RC4 - Bound device id wins, unreadable payload raises
+# ----------------------------------------------------------
+def test_bound_device_and_invalid_payload():
+    reading = decode_reading(encode_reading("OTHER", None, 0, 1, 2, 3, 4), device_id="DEV_1")
+    assert reading.deviceId == "DEV_1"
+
+    with pytest.raises(ReadingDecodeError):
+        decode_readings(b"\x93\x01")           # truncated array
+    with pytest.raises(ReadingDecodeError):
+        decode_readings(msgpack.packb({"deviceId": "DEV_1"}))
+
+
+# ----------------------------------------------------------
+# TC_RC5 - Values BSON can't store are per-record errors, not a failed insert
+# ----------------------------------------------------------
+def test_unstorable_values_rejected():
+    good = encode_reading("DEV_1", None, 0, 1, 2, 3, 4)
+
+    results = decode_readings(pack_readings([
+        good[:3] + [2 ** 64 - 1] + good[4:],          # uint64
+        good[:8] + [float("nan"), None],
+        good[:9] + [float("inf")],
+        good[:8] + [2 ** 63, None],                   # humidity as uint64
+        good[:3] + [2 ** 63 - 1] + good[4:],          # int64 max is fine
+    ]))
+
+    assert all(isinstance(r, ReadingDecodeError) for r in results[:4])
+    assert "out of range" in str(results[0]) and "finite" in str(results[1])
+    assert isinstance(results[4], ReadingModel)
+
+    # below int64 can't come through msgpack, still refused if handed a record
+    with pytest.raises(ReadingDecodeError, match="out of range"):
+        decode_reading(good[:7] + [-(2 ** 63) - 1] + good[8:])
@@ -0,0 +1,344 @@
+# ==========================================================
+# test_readings_stream.py
+# WebSocket reading stream (hello, batching, credits, acks, pushes)
+# ==========================================================
+
+import asyncio
+import importlib
+import json
+import sys
+import types
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from Models.readings_codec import encode_reading, pack_readings
+from monitoring.live_channels import LiveChannels, notification_push
+from monitoring.rate_limit import TokenBucketLimiter
+
+DISCONNECT = object()
+
+
+class FakeWebSocket:
+    def __init__(self, messages=()):
+        self.incoming = asyncio.Queue()
+        for message in messages:
+            self.incoming.put_nowait(message)
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        message = await self.incoming.get()
+        if message is DISCONNECT:
+            return {"type": "websocket.disconnect", "code": 1000}
+        if isinstance(message, bytes):
+            return {"type": "websocket.receive", "bytes": message}
+        return {"type": "websocket.receive", "text": json.dumps(message)}
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=None):
+        self.closed = code
+
+    def of_type(self, kind):
+        return [m for m in self.sent if m["type"] == kind]
+
+
+@pytest.fixture
+def stream(mocker):
+    """
+    readings_stream_controller with a fake `database` module (no MongoDB connection).
+    """
+    collection = mocker.MagicMock()
+    fake_db = {"raw_readings": collection}
+    mocker.patch.dict(sys.modules, {"database": types.SimpleNamespace(db=fake_db)})
+    sys.modules.pop("Controllers.readings_controller", None)
+    sys.modules.pop("Controllers.readings_stream_controller", None)
+
+    module = importlib.import_module("Controllers.readings_stream_controller")
+
+    devices = {
+        "DEV_1": {"deviceId": "DEV_1", "is_linked": True, "power": True, "user_id": "u1", "form_id": "f1"},
+        "DEV_OFF": {"deviceId": "DEV_OFF", "is_linked": True, "power": False, "user_id": "u2", "form_id": "f2"},
+    }
+    mocker.patch.object(
+        module.DEVICE_REGISTRY, "get", mocker.AsyncMock(side_effect=lambda device_id: devices.get(device_id))
+    )
+    mocker.patch.object(module, "LIVE_CHANNELS", LiveChannels())
+    mocker.patch.object(module, "READINGS_RATE_LIMITER", TokenBucketLimiter())
+
+    def insert_many(docs, ordered=True):
+        for n, doc in enumerate(docs):
+            doc["_id"] = f"oid_{n}"
+        return mocker.MagicMock()
+
+    collection.insert_many = mocker.AsyncMock(side_effect=insert_many)
+
+    yield module, collection, devices
+    sys.modules.pop("Controllers.readings_controller", None)
+    sys.modules.pop("Controllers.readings_stream_controller", None)
+
+
+def _hello(device_id="DEV_1"):
+    return {"type": "hello", "deviceId": device_id}
+
+
+def _reading(seq, **extra):
+    return {"type": "reading", "seq": seq, "data": {"ir": {"rawValue": seq}}, **extra}
+
+
+# ----------------------------------------------------------
+# TC_WS1 - Unknown / inactive device is refused at hello
+# ----------------------------------------------------------
+async def test_hello_rejects_inactive_device(stream):
+    module, collection, _ = stream
+    websocket = FakeWebSocket([_hello("DEV_OFF")])
+
+    await module.handle_reading_stream(websocket)
+
+    assert websocket.closed == module.WS_CLOSE_DEVICE_INACTIVE
+    assert websocket.of_type("ready") == []
+    collection.insert_many.assert_not_called()
+
+
+# ----------------------------------------------------------
+# TC_WS2 - Readings are written in batches and acked by seq
+# ----------------------------------------------------------
+async def test_readings_batched_and_acked(stream):
+    module, collection, _ = stream
+    websocket = FakeWebSocket([_hello()] + [_reading(n) for n in range(1, 6)] + [DISCONNECT])
+    session = module.ReadingStreamSession(websocket, credits=10, batch_size=2, flush_ms=10_000)
+
+    with pytest.raises(WebSocketDisconnect):
+        await session.run()
+    await session.close()
+
+    assert websocket.of_type("ready")[0]["credits"] == 10
+    acks = websocket.of_type("ack")
+    assert [ack["seqs"] for ack in acks] == [[1, 2], [3, 4]]
+    assert all(ack["grant"] == 2 for ack in acks)
+
+    # 2 full batches; reading 5 was never acked → the client resends it, not stored here
+    assert collection.insert_many.await_count == 2
+    assert session.pending == []
+    docs = collection.insert_many.await_args_list[0].args[0]
+    assert all(doc["deviceId"] == "DEV_1" and doc["user_id"] == "u1" for doc in docs)
+
+
+# ----------------------------------------------------------
+# TC_WS3 - Partial batch is flushed after flush_ms
+# ----------------------------------------------------------
+async def test_partial_batch_flushed_on_timeout(stream):
+    module, collection, _ = stream
+    websocket = FakeWebSocket([_hello(), _reading(1)])
+    session = module.ReadingStreamSession(websocket, credits=10, batch_size=50, flush_ms=20)
+
+    task = asyncio.create_task(session.run())
+    await asyncio.sleep(0.1)
+
+    assert [ack["seqs"] for ack in websocket.of_type("ack")] == [[1]]
+    collection.insert_many.assert_awaited_once()
+
+    websocket.incoming.put_nowait(DISCONNECT)
+    with pytest.raises(WebSocketDisconnect):
+        await task
+
+
+# ----------------------------------------------------------
+# TC_WS4 - No credits left → reading refused until an ack
+# ----------------------------------------------------------
+async def test_credits_enforced(stream):
+    module, collection, _ = stream
+    websocket = FakeWebSocket([_hello(), _reading(1), _reading(2), _reading(3), DISCONNECT])
+    session = module.ReadingStreamSession(websocket, credits=2, batch_size=50, flush_ms=10_000)
+
+    with pytest.raises(WebSocketDisconnect):
+        await session.run()
+
+    errors = websocket.of_type("error")
+    assert [e["seq"] for e in errors] == [3]
+    assert [seq for seq, _ in session.pending] == [1, 2]
+
+
+# ----------------------------------------------------------
+# TC_WS5 - Device powered off mid-stream → batch refused, socket closed
+# ----------------------------------------------------------
+async def test_flush_rechecks_device(stream):
+    module, collection, devices = stream
+    websocket = FakeWebSocket([_hello(), _reading(1)])
+    session = module.ReadingStreamSession(websocket, credits=10, batch_size=2, flush_ms=10_000)
+
+    await session.bind(await session.receive())
+    await session.handle(await session.receive())
+    devices["DEV_1"] = dict(devices["DEV_1"], power=False)
+    await session.handle(_reading(2))
+
+    ack = websocket.of_type("ack")[0]
+    assert ack["seqs"] == [] and [f["seq"] for f in ack["failed"]] == [1, 2]
+    assert websocket.closed == module.WS_CLOSE_DEVICE_INACTIVE
+    collection.insert_many.assert_not_called()
+
+
+# ----------------------------------------------------------
+# TC_WS6 - Binary (msgpack) frames: seqs from first_seq, bound deviceId wins
+# ----------------------------------------------------------
+async def test_binary_frame(stream):
+    module, collection, _ = stream
+    frame = pack_readings([
+        10,
+        [
+            encode_reading("SPOOFED", None, 1, 10, 20, 30, 400, humidity=41.5),
+            [1, None, "bad"],
+            encode_reading(None, None, 0, 11, 21, 31, 401),
+        ],
+    ])
+    websocket = FakeWebSocket([_hello(), frame, DISCONNECT])
+    session = module.ReadingStreamSession(websocket, credits=10, batch_size=2, flush_ms=10_000)
+
+    with pytest.raises(WebSocketDisconnect):
+        await session.run()
+
+    acks = websocket.of_type("ack")
+    assert [f["seq"] for f in acks[0]["failed"]] == [11]
+    assert acks[1]["seqs"] == [10, 12]
+
+    docs = collection.insert_many.await_args.args[0]
+    assert all(doc["deviceId"] == "DEV_1" for doc in docs)
+    assert docs[0]["data"] == {"ir": {"rawValue": 1}, "rgb": {"r": 10, "g": 20, "b": 30, "clear": 400}, "humidity": 41.5}
+
+
+# ----------------------------------------------------------
+# TC_WS7 - Alerts are pushed on the device's open connection
+# ----------------------------------------------------------
+async def test_live_channel_push(stream):
+    module, _, _ = stream
+    websocket = FakeWebSocket([_hello()])
+    session = module.ReadingStreamSession(websocket)
+
+    await session.bind(await session.receive())
+    delivered = await module.LIVE_CHANNELS.publish(
+        "DEV_1", notification_push({"id": "n1", "title": "Dry eye", "message": "Blink more", "type": "rule"})
+    )
+    await asyncio.sleep(0)      # written by the session's sender task
+
+    assert delivered == 1
+    push = websocket.of_type("notification")[0]
+    assert push["id"] == "n1" and push["title"] == "Dry eye"
+
+    await session.close()
+    assert not module.LIVE_CHANNELS.is_connected("DEV_1")
+
+
+# ----------------------------------------------------------
+# TC_WS8 - A failing connection is dropped from the channels
+# ----------------------------------------------------------
+async def test_failed_send_unregisters():
+    channels = LiveChannels()
+
+    async def broken(message):
+        raise RuntimeError("socket closed")
+
+    channels.register("DEV_1", broken)
+
+    assert await channels.publish("DEV_1", {"type": "notification"}) == 0
+    assert not channels.is_connected("DEV_1")
+
+    # a send that hangs is dropped after the timeout
+    channels = LiveChannels(send_timeout=0.01)
+
+    async def stalled(message):
+        await asyncio.sleep(3600)
+
+    channels.register("DEV_1", stalled)
+    assert await channels.publish("DEV_1", {"type": "notification"}) == 0
+    assert not channels.is_connected("DEV_1")
+
+
+# ----------------------------------------------------------
+# TC_WS9 - Failed batch write → every seq nacked, credits granted back
+# ----------------------------------------------------------
+async def test_failed_write_nacks_batch(stream):
+    module, collection, _ = stream
+    collection.insert_many.side_effect = RuntimeError("primary stepped down")
+    websocket = FakeWebSocket([_hello()] + [_reading(n) for n in range(1, 3)] + [DISCONNECT])
+    session = module.ReadingStreamSession(websocket, credits=2, batch_size=2, flush_ms=10_000)
+
+    with pytest.raises(WebSocketDisconnect):
+        await session.run()
+
+    ack = websocket.of_type("ack")[0]
+    assert ack["seqs"] == []
+    assert [item["seq"] for item in ack["failed"]] == [1, 2]
+    assert ack["grant"] == 2
+    assert session.credits == 2
+
+
+# ----------------------------------------------------------
+# TC_WS10 - READINGS_WS_TOKEN set → hello must carry it
+# ----------------------------------------------------------
+async def test_hello_requires_token(stream):
+    module, collection, _ = stream
+
+    refused = FakeWebSocket([dict(_hello(), token="wrong")])
+    await module.ReadingStreamSession(refused, token="s3cret").run()
+    assert refused.closed == module.WS_CLOSE_UNAUTHORIZED
+    assert refused.of_type("ready") == []
+
+    accepted = FakeWebSocket([dict(_hello(), token="s3cret"), DISCONNECT])
+    session = module.ReadingStreamSession(accepted, token="s3cret")
+    with pytest.raises(WebSocketDisconnect):
+        await session.run()
+    await session.close()
+    assert accepted.of_type("ready")[0]["deviceId"] == "DEV_1"
+
+
+# ----------------------------------------------------------
+# TC_WS11 - Flush is charged to the device's bucket, the excess is nacked
+# ----------------------------------------------------------
+async def test_flush_rate_limited(stream, mocker):
+    module, collection, _ = stream
+    mocker.patch.object(module, "READINGS_RATE_LIMITER", TokenBucketLimiter(rate=2, burst=2))
+    websocket = FakeWebSocket([_hello()] + [_reading(n) for n in range(1, 4)] + [DISCONNECT])
+    session = module.ReadingStreamSession(websocket, credits=3, batch_size=3, flush_ms=10_000)
+
+    with pytest.raises(WebSocketDisconnect):
+        await session.run()
+
+    ack = websocket.of_type("ack")[0]
+    assert ack["seqs"] == [1, 2]
+    assert ack["failed"] == [{"seq": 3, "error": "Too many readings from this device", "retry_after": 1}]
+    assert ack["grant"] == 3 and session.credits == 3
+    assert len(collection.insert_many.await_args.args[0]) == 2
+
+
+# ----------------------------------------------------------
+# TC_WS12 - A client that stops reading fills its outbox and is dropped, the publisher never waits
+# ----------------------------------------------------------
+async def test_slow_client_dropped(stream):
+    module, _, _ = stream
+    websocket = FakeWebSocket([_hello()])
+    session = module.ReadingStreamSession(websocket, outbox_size=1)
+    await session.bind(await session.receive())
+
+    stalled = asyncio.Event()
+
+    async def send_json(message):
+        await stalled.wait()            # socket buffer full, client not reading
+
+    websocket.send_json = send_json
+    results = []
+    for n in range(3):
+        results.append(await asyncio.wait_for(module.LIVE_CHANNELS.publish("DEV_1", {"type": "notification", "n": n}), 1))
+        await asyncio.sleep(0)
+
+    # 1st taken by the sender (stuck), 2nd queued, 3rd overflows
+    assert results == [1, 1, 0]
+    assert not module.LIVE_CHANNELS.is_connected("DEV_1")
+    await asyncio.sleep(0)
+    assert websocket.closed == module.WS_CLOSE_TOO_SLOW
+
+    await session.close()
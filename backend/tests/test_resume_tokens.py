@@ -0,0 +1,68 @@
+# ==========================================================
+# test_resume_tokens.py
+# Throttled persistence of change-stream resume tokens
+# ==========================================================
+
+from monitoring.resume_tokens import ResumeTokenStore
+
+
+def _collection(mocker, stored=None):
+    collection = mocker.MagicMock()
+    collection.find_one = mocker.AsyncMock(return_value=stored)
+    collection.update_one = mocker.AsyncMock()
+    collection.delete_one = mocker.AsyncMock()
+    return collection
+
+
+# ----------------------------------------------------------
+# TC_RT1 - Load returns the stored token (or None)
+# ----------------------------------------------------------
+async def test_load(mocker):
+    store = ResumeTokenStore(_collection(mocker, {"_id": "raw_readings", "resume_token": {"_data": "82AB"}}), "raw_readings")
+    assert await store.load() == {"_data": "82AB"}
+
+    empty = ResumeTokenStore(_collection(mocker), "raw_readings")
+    assert await empty.load() is None
+
+
+# ----------------------------------------------------------
+# TC_RT2 - Saved every N events, not per event
+# ----------------------------------------------------------
+async def test_saved_every_n_events(mocker):
+    mocker.patch("monitoring.resume_tokens.time.monotonic", return_value=0)
+    collection = _collection(mocker)
+    store = ResumeTokenStore(collection, "raw_readings", every_n=100, every_s=60)
+
+    assert not await store.advance({"_data": "01"}, events=60)
+    assert await store.advance({"_data": "02"}, events=60)
+
+    collection.update_one.assert_awaited_once()
+    assert collection.update_one.await_args.args[1]["$set"]["resume_token"] == {"_data": "02"}
+
+
+# ----------------------------------------------------------
+# TC_RT3 - Saved after T seconds even with few events
+# ----------------------------------------------------------
+async def test_saved_after_interval(mocker):
+    clock = mocker.patch("monitoring.resume_tokens.time.monotonic", return_value=0)
+    collection = _collection(mocker)
+    store = ResumeTokenStore(collection, "raw_readings", every_n=1000, every_s=5)
+
+    assert not await store.advance({"_data": "01"})
+    clock.return_value = 6
+    assert await store.advance({"_data": "02"})
+
+
+# ----------------------------------------------------------
+# TC_RT4 - Final save only writes when something is unsaved
+# ----------------------------------------------------------
+async def test_final_save(mocker):
+    mocker.patch("monitoring.resume_tokens.time.monotonic", return_value=0)
+    collection = _collection(mocker)
+    store = ResumeTokenStore(collection, "raw_readings", every_n=1000, every_s=60)
+
+    assert not await store.save()
+    await store.advance({"_data": "01"})
+    assert await store.save()
+    assert not await store.save()
+    assert collection.update_one.await_count == 1
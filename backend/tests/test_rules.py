@@ -216,4 +216,31 @@ async def test_blue_and_dark(mocker):
 
     mock_notify.assert_called_once()
     assert get_metric_name(mock_notify) == "blue_and_dark"
-# ==========================================================
\ No newline at end of file
+# ==========================================================
+
+
+# ----------------------------------------------------------
+# TC_R10 - Alert zone uses the same conditions as the rules
+# ----------------------------------------------------------
+def test_in_alert_zone():
+    from monitoring.rules import in_alert_zone
+
+    calm = {"ibi": 5, "blink_rate": 15, "lux": 300, "blue_ratio": 0.1, "session_time": 10}
+    assert not in_alert_zone(calm)
+    assert not in_alert_zone(dict(calm, ibi=None))
+
+    assert in_alert_zone(dict(calm, ibi=2))
+    assert in_alert_zone(dict(calm, ibi=13))
+    assert in_alert_zone(dict(calm, ibi=9))                 # fatigue (concentration) band
+    assert in_alert_zone(dict(calm, blink_rate=3))          # low blink rate
+    assert in_alert_zone(dict(calm, lux=900))
+    assert in_alert_zone(dict(calm, blue_ratio=0.5))
+
+
+# ----------------------------------------------------------
+# TC_R11 - No blink rate → no low-blink alert zone
+# ----------------------------------------------------------
+def test_alert_zone_without_blink_rate():
+    from monitoring.rules import in_alert_zone
+
+    assert not in_alert_zone({"ibi": 5, "lux": 300, "blue_ratio": 0.1, "session_time": 10})
@@ -0,0 +1,93 @@
+# ==========================================================
+# test_sampling.py
+# Server-driven adaptive sampling interval per device
+# ==========================================================
+
+from monitoring.sampling import (
+    DEFAULT_ADVICE,
+    SamplingState,
+    blink_rate_scale,
+    make_advice,
+    sampling_advice,
+    sampling_levels,
+)
+
+
+def _metrics(blink_rate=15.0, lux=300.0, ibi=4.0, blue_ratio=0.2):
+    return {"blink_rate": blink_rate, "lux": lux, "ibi": ibi, "blue_ratio": blue_ratio}
+
+
+# ----------------------------------------------------------
+# TC_SP1 - Stable metrics slow the device down step by step
+# ----------------------------------------------------------
+def test_stable_device_backs_off():
+    state = SamplingState(levels=[1000, 2000, 4000, 8000], stable_readings=5)
+
+    changes = [state.update(_metrics()) for _ in range(40)]
+    intervals = [advice["interval_ms"] for advice in changes if advice is not None]
+
+    assert intervals == [1000, 2000, 4000, 8000]
+    assert state.advice["reason"] == "stable"
+    assert state.advice["upload_interval_ms"] > state.advice["interval_ms"]
+
+
+# ----------------------------------------------------------
+# TC_SP2 - Changing light or blink rate → fastest interval at once
+# ----------------------------------------------------------
+def test_instability_resets_to_fastest():
+    state = SamplingState(levels=[1000, 2000, 4000], stable_readings=2)
+    for _ in range(10):
+        state.update(_metrics())
+    assert state.advice["interval_ms"] == 4000
+
+    advice = state.update(_metrics(lux=600))
+    assert advice["interval_ms"] == 1000 and advice["reason"] == "light_changing"
+
+    for _ in range(10):
+        state.update(_metrics(lux=600))
+    advice = state.update(_metrics(blink_rate=40, lux=600))
+    assert advice["interval_ms"] == 1000 and advice["reason"] == "blink_rate_unstable"
+
+
+# ----------------------------------------------------------
+# TC_SP3 - Alert zone keeps the device fast, no advice when unchanged
+# ----------------------------------------------------------
+def test_alert_keeps_device_fast():
+    state = SamplingState(levels=[1000, 2000], stable_readings=1)
+
+    first = state.update(_metrics(lux=100), alert_active=True)
+    assert first["interval_ms"] == 1000 and first["reason"] == "alert"
+
+    assert all(
+        state.update(_metrics(lux=100), alert_active=True) is None
+        for _ in range(10)
+    )
+
+
+# ----------------------------------------------------------
+# TC_SP4 - Blink rate scaled back to the fastest interval
+# ----------------------------------------------------------
+def test_blink_rate_scale(mocker):
+    slow = {"sampling": {"interval_ms": 4000, "upload_interval_ms": 16000, "reason": "stable"}}
+    assert blink_rate_scale(slow, min_ms=1000) == 1.0           # adaptive sampling off (default)
+
+    mocker.patch("monitoring.sampling.SAMPLING_ADAPTIVE_ENABLED", True)
+    assert blink_rate_scale(slow, min_ms=1000) == 4.0
+    assert blink_rate_scale({"deviceId": "DEV_1"}, min_ms=1000) == 1.0
+
+
+# ----------------------------------------------------------
+# TC_SP5 - Levels / upload cap / response default
+# ----------------------------------------------------------
+def test_levels_and_defaults(mocker):
+    levels = sampling_levels(1000, 8000)
+    assert levels == [1000, 2000, 4000, 8000]
+    assert make_advice(3, levels, "stable", max_upload_ms=30000)["upload_interval_ms"] == 30000
+    assert make_advice(0, levels, "alert")["upload_interval_ms"] == 1000
+
+    stored = {"interval_ms": 4000, "upload_interval_ms": 16000, "reason": "stable"}
+    assert sampling_advice({"sampling": stored}) is None         # off by default
+
+    mocker.patch("monitoring.sampling.SAMPLING_ADAPTIVE_ENABLED", True)
+    assert sampling_advice({"sampling": stored}) == stored
+    assert sampling_advice({"deviceId": "DEV_1"}) == DEFAULT_ADVICE
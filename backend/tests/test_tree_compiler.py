@@ -0,0 +1,61 @@
+# ==========================================================
+# test_tree_compiler.py
+# Compiled decision trees must predict exactly like sklearn
+# ==========================================================
+
+import numpy as np
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from inference import load_model
+from synthetic_data import generate_dataset, FEATURE_COLUMNS, LABEL_COLUMNS
+from tree_compiler import check_equivalence, compile_model, _float32_safe_threshold
+
+META = {"feature_columns": FEATURE_COLUMNS, "label_columns": LABEL_COLUMNS}
+
+
+def _assert_no_mismatch(report):
+    for label, r in report.items():
+        assert r["row_mismatches"] == 0, label
+        assert r["matrix_mismatches"] == 0, label
+
+
+# ----------------------------------------------------------
+# TC_TC1 - Saved dt_alerts model
+# ----------------------------------------------------------
+def test_saved_model_equivalence():
+    model, meta = load_model()
+    X, _ = generate_dataset(n_profiles=20, windows_per_profile=50)
+
+    _assert_no_mismatch(check_equivalence(model, meta, X))
+
+
+# ----------------------------------------------------------
+# TC_TC2 - Deeper tree (depth 5, many leaves)
+# ----------------------------------------------------------
+def test_deep_tree_equivalence():
+    X, Y = generate_dataset(n_profiles=20, windows_per_profile=50)
+
+    # flip some labels so the trees cannot stop after one clean split
+    rng = np.random.default_rng(3)
+    Y_noisy = Y ^ (rng.random(Y.shape) < 0.2)
+
+    model = MultiOutputClassifier(DecisionTreeClassifier(max_depth=5, random_state=7))
+    model.fit(X, Y_noisy)
+
+    compiled = compile_model(model, META)
+    assert any(t.max_depth == 5 for t in compiled.trees)
+
+    X_test, _ = generate_dataset(n_profiles=15, windows_per_profile=40, seed_profiles=1, seed_sensors=2)
+    _assert_no_mismatch(check_equivalence(model, META, X_test))
+
+
+# ----------------------------------------------------------
+# TC_TC3 - Threshold matches sklearn's float32 comparison
+# ----------------------------------------------------------
+def test_float32_safe_threshold():
+    for t in [0.5, -0.0124266, 12.34567, 1e-7, 499.99997]:
+        t64 = _float32_safe_threshold(t)
+        for x in np.linspace(t - 1e-4, t + 1e-4, 2001):
+            # sklearn: float32 X promoted back to double, compared with the double threshold
+            assert (x <= t64) == (float(np.float32(x)) <= t)
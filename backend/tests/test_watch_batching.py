@@ -0,0 +1,49 @@
+# ==========================================================
+# test_watch_batching.py
+# Micro-batching of change-stream events
+# ==========================================================
+
+from monitoring.batching import next_batch
+
+
+class FakeStream:
+    """
+    next() blocks for the first event, try_next() returns None when empty.
+    """
+
+    def __init__(self, events):
+        self.events = list(events)
+
+    async def next(self):
+        if not self.events:
+            raise StopAsyncIteration
+        return self.events.pop(0)
+
+    async def try_next(self):
+        return self.events.pop(0) if self.events else None
+
+
+# ----------------------------------------------------------
+# TC_WB1 - Batch stops at max_size
+# ----------------------------------------------------------
+async def test_batch_limited_by_size():
+    stream = FakeStream(range(10))
+
+    assert await next_batch(stream, max_size=4, max_wait_ms=1000) == [0, 1, 2, 3]
+    assert await next_batch(stream, max_size=4, max_wait_ms=1000) == [4, 5, 6, 7]
+
+
+# ----------------------------------------------------------
+# TC_WB2 - Quiet stream → partial batch right away
+# ----------------------------------------------------------
+async def test_partial_batch_when_stream_is_quiet():
+    stream = FakeStream([1, 2])
+
+    assert await next_batch(stream, max_size=100, max_wait_ms=1000) == [1, 2]
+
+
+# ----------------------------------------------------------
+# TC_WB3 - Closed stream → empty batch
+# ----------------------------------------------------------
+async def test_closed_stream():
+    assert await next_batch(FakeStream([]), max_size=10, max_wait_ms=10) == []
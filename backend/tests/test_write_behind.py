@@ -0,0 +1,139 @@
+# ==========================================================
+# test_write_behind.py
+# Write-behind ingestion queue (batched raw_readings writes)
+# ==========================================================
+
+import asyncio
+import importlib
+import sys
+import types
+
+import pytest
+
+from monitoring.write_behind import WriteBehindQueue
+
+
+class RecordingWriter:
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.retry_flags = []
+        self.fail_times = fail_times
+
+    async def __call__(self, pending, retry=False):
+        self.retry_flags.append(retry)
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("mongo unavailable")
+        self.batches.append([doc["n"] for doc, _ in pending])
+        return {}
+
+
+# ----------------------------------------------------------
+# TC_WB1 - Full batches are written without waiting for the age limit
+# ----------------------------------------------------------
+async def test_flush_by_size():
+    writer = RecordingWriter()
+    queue = WriteBehindQueue(max_queue=100, batch_size=3, max_age_ms=10_000)
+    queue.start(writer)
+
+    for n in range(6):
+        await queue.submit({"n": n}, None)
+    await asyncio.sleep(0.05)
+
+    assert writer.batches == [[0, 1, 2], [3, 4, 5]]
+    await queue.stop()
+
+
+# ----------------------------------------------------------
+# TC_WB2 - A partial batch is written once its oldest reading is max_age_ms old
+# ----------------------------------------------------------
+async def test_flush_by_age():
+    writer = RecordingWriter()
+    queue = WriteBehindQueue(max_queue=100, batch_size=100, max_age_ms=30)
+    queue.start(writer)
+
+    await queue.submit({"n": 1}, None)
+    await asyncio.sleep(0.01)
+    assert writer.batches == []
+
+    await asyncio.sleep(0.08)
+    assert writer.batches == [[1]]
+
+    stats = queue.stats()
+    assert stats["written"] == 1 and stats["queue_depth"] == 0
+    assert stats["batch_age_ms_last"] >= 25
+    await queue.stop()
+
+
+# ----------------------------------------------------------
+# TC_WB3 - stop() writes everything still queued
+# ----------------------------------------------------------
+async def test_stop_flushes_queue():
+    writer = RecordingWriter()
+    queue = WriteBehindQueue(max_queue=100, batch_size=4, max_age_ms=10_000)
+    queue.start(writer)
+
+    for n in range(10):
+        await queue.submit({"n": n}, None)
+    await queue.stop(timeout=1)
+
+    assert sum(writer.batches, []) == list(range(10))
+    assert not queue.running
+
+
+# ----------------------------------------------------------
+# TC_WB4 - Failed batch is retried with retry=True
+# ----------------------------------------------------------
+async def test_retry_after_error(mocker):
+    mocker.patch("monitoring.write_behind.asyncio.sleep", mocker.AsyncMock())
+    writer = RecordingWriter(fail_times=1)
+    queue = WriteBehindQueue(max_queue=10, batch_size=2, max_age_ms=10_000, retries=2)
+    queue.writer = writer
+
+    failed = await queue._write([({"n": 1}, None, 0.0), ({"n": 2}, None, 0.0)])
+
+    assert failed == {}
+    assert writer.retry_flags == [False, True]
+    assert writer.batches == [[1, 2]]
+
+
+# ----------------------------------------------------------
+# TC_WB5 - Full queue blocks the producer (bounded memory)
+# ----------------------------------------------------------
+async def test_bounded_queue():
+    queue = WriteBehindQueue(max_queue=2, batch_size=10, max_age_ms=10_000)
+    queue._queue = asyncio.Queue(queue.max_queue)   # no writer running
+
+    await queue.submit({"n": 1}, None)
+    await queue.submit({"n": 2}, None)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(queue.submit({"n": 3}, None), 0.05)
+    assert queue.qsize() == 2
+
+
+# ----------------------------------------------------------
+# TC_WB6 - create_reading answers 202 with the pre-assigned id
+# ----------------------------------------------------------
+async def test_create_reading_accepted(mocker):
+    collection = mocker.MagicMock()
+    mocker.patch.dict(sys.modules, {"database": types.SimpleNamespace(db={"raw_readings": collection})})
+    sys.modules.pop("Controllers.readings_controller", None)
+    module = importlib.import_module("Controllers.readings_controller")
+
+    device = {"deviceId": "DEV_1", "is_linked": True, "power": True, "user_id": "u1", "form_id": "f1"}
+    mocker.patch.object(module.DEVICE_REGISTRY, "get", mocker.AsyncMock(return_value=device))
+    writer = RecordingWriter()
+    queue = WriteBehindQueue(max_queue=10, batch_size=10, max_age_ms=10_000)
+    mocker.patch.object(module, "WRITE_BEHIND", queue)
+    queue.start(mocker.AsyncMock(return_value={}))
+
+    try:
+        response = await module.create_reading(module.ReadingModel(deviceId="DEV_1", data={"ir": {"rawValue": 1}}))
+
+        assert response.status_code == 202
+        assert queue.qsize() == 1
+        collection.insert_many.assert_not_called()
+    finally:
+        await queue.stop(timeout=1)
+        sys.modules.pop("Controllers.readings_controller", None)